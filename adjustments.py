@@ -0,0 +1,340 @@
+import re
+import sqlite3
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db_writer import connect, bump_write_counter, notify_write, DB_PATH
+from trading_calendar import TradingCalendar
+
+# Splits, bonuses and consolidations are read from the subjects NSE attaches to the
+# ex-date row (the CA field, stored in corporate_actions), e.g. "Bonus 1:2" or "Face Value
+# Split (Sub-Division) - From Rs 10/- Per Share To Re 1/- Per Share". NSE does not restate
+# CH_PREVIOUS_CLS_PRICE on those days, so the subject is the only reliable signal.
+BONUS_PATTERN = re.compile(r"bonus\s*-?\s*(\d+)\s*:\s*(\d+)", re.IGNORECASE)
+FACE_VALUE_PATTERN = re.compile(
+    r"(?:split|splt|consolidat\w*)\b.*?\bfro?m\s*R[es]\.?\s*(\d+(?:\.\d+)?).*?\bto\s*R[es]\.?\s*(\d+(?:\.\d+)?)",
+    re.IGNORECASE)
+
+# A day without a corporate action is still an event when the reported previous close
+# differs from the stored prior close by more than this fraction (a restated close).
+EVENT_TOLERANCE = 0.005
+
+# Price ratios (new / old) of the splits, bonuses and consolidations NSE actually sees:
+# splits 1:2, 1:4, 1:5, 2:5, 1:10; bonuses 1:1, 2:1, 1:2, 2:3; consolidations 2:1, 5:1, 10:1.
+# A restated previous close within SNAP_TOLERANCE of one of them is snapped to it, which
+# removes the rounding of the restated price. A price gap alone is never an event.
+SNAP_TOLERANCE = 0.02
+SPLIT_BONUS_RATIOS = np.array(sorted({1 / 10, 1 / 5, 1 / 4, 1 / 3, 2 / 5, 1 / 2, 3 / 5, 2 / 3, 2.0, 5.0, 10.0}))
+
+ADJUSTED_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS stock_company_price_adjusted (
+        CH_SYMBOL TEXT,
+        date_key TEXT,
+        adj_factor REAL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        PRIMARY KEY (CH_SYMBOL, date_key)
+    ) WITHOUT ROWID
+"""
+
+ADJUSTMENT_STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS adjustment_state (
+        CH_SYMBOL TEXT PRIMARY KEY,
+        last_date_key TEXT,
+        row_count INTEGER,
+        action_count INTEGER
+    )
+"""
+
+# Symbols that gained raw rows or corporate actions on or before their last adjusted date
+# (a backfill) since they were adjusted; their distinct stored dates no longer match the
+# adjusted row count, or their actions up to that date the recorded action count.
+BACKFILLED_QUERY = """
+    SELECT c.CH_SYMBOL
+    FROM stock_company_price_daily c
+    JOIN adjustment_state s USING (CH_SYMBOL)
+    WHERE c.CH_TIMESTAMP <= s.last_date_key
+    GROUP BY c.CH_SYMBOL, s.row_count
+    HAVING s.row_count IS NULL OR COUNT(DISTINCT c.CH_TIMESTAMP) != s.row_count
+    UNION
+    SELECT a.CH_SYMBOL
+    FROM corporate_actions a
+    JOIN adjustment_state s USING (CH_SYMBOL)
+    WHERE a.ex_date <= s.last_date_key
+    GROUP BY a.CH_SYMBOL, s.action_count
+    HAVING s.action_count IS NULL OR COUNT(*) != s.action_count
+"""
+
+STATE_UPSERT_SQL = """
+    INSERT OR REPLACE INTO adjustment_state (CH_SYMBOL, last_date_key, row_count, action_count)
+    SELECT t.CH_SYMBOL, t.last_date_key, t.row_count,
+           (SELECT COUNT(*) FROM corporate_actions a WHERE a.CH_SYMBOL = t.CH_SYMBOL AND a.ex_date <= t.last_date_key)
+    FROM (
+        SELECT CH_SYMBOL, MAX(date_key) AS last_date_key, COUNT(*) AS row_count
+        FROM stock_company_price_adjusted WHERE CH_SYMBOL = ?
+    ) t
+"""
+
+RAW_COLUMNS = """
+    CH_SYMBOL, CH_TIMESTAMP AS date_key, CH_PREVIOUS_CLS_PRICE AS prev_close,
+    CH_OPENING_PRICE AS open, CH_TRADE_HIGH_PRICE AS high, CH_TRADE_LOW_PRICE AS low,
+    CH_CLOSING_PRICE AS close, CH_TOT_TRADED_QTY AS volume
+"""
+
+
+def action_ratio(subject):
+    """
+    Returns the price ratio (new / old) a corporate action implies, 1.0 when it does not
+    change the number of shares (dividends, meetings, buybacks, rights, demergers).
+
+    "Bonus a:b" issues a new shares for every b held, so the price becomes b / (a + b);
+    a face value change from F to f scales it by f / F. A subject may list several.
+    """
+    ratio = 1.0
+    for new, held in BONUS_PATTERN.findall(subject):
+        if int(new) and int(held):
+            ratio *= int(held) / (int(new) + int(held))
+    for old, new in FACE_VALUE_PATTERN.findall(subject):
+        if float(old) and float(new):
+            ratio *= float(new) / float(old)
+    return ratio
+
+
+def action_ratios(conn, symbols=None):
+    """
+    Reads corporate_actions and combines the actions of each (symbol, ex-date).
+
+    Args:
+        conn (sqlite3.Connection): Open database connection.
+        symbols (list, optional): Only these symbols.
+
+    Returns:
+        pandas.DataFrame: CH_SYMBOL, date_key and ca_ratio for every ex-date whose actions
+        change the share count.
+    """
+    query = "SELECT CH_SYMBOL, ex_date AS date_key, subject FROM corporate_actions"
+    params = ()
+    if symbols is not None:
+        query += f" WHERE CH_SYMBOL IN ({', '.join('?' * len(symbols))})"
+        params = tuple(symbols)
+    actions = pd.read_sql_query(query, conn, params=params)
+    actions['ca_ratio'] = [action_ratio(subject) for subject in actions['subject']]
+    ratios = actions.groupby(['CH_SYMBOL', 'date_key'], as_index=False)['ca_ratio'].prod()
+    return ratios[ratios['ca_ratio'] != 1.0].reset_index(drop=True)
+
+
+def with_action_ratios(df, ratios):
+    """Adds the ca_ratio of `ratios` (see `action_ratios`) to raw rows; 1.0 where there is none."""
+    df = df.drop(columns='ca_ratio', errors='ignore').merge(ratios, on=['CH_SYMBOL', 'date_key'], how='left')
+    df['ca_ratio'] = df['ca_ratio'].fillna(1.0)
+    return df
+
+
+def _prepare(df):
+    """Sorts raw rows by (symbol, date) and drops copies stored under several indices or series."""
+    df = df.drop_duplicates(subset=['CH_SYMBOL', 'date_key'], keep='first')
+    return df.sort_values(['CH_SYMBOL', 'date_key'], ignore_index=True)
+
+
+def event_ratios(df, sessions):
+    """
+    Computes the per-row corporate-action ratio (new price / old price), vectorized.
+
+    A row's ca_ratio (see `with_action_ratios`), when present and not 1, is the ratio: the
+    action applies to every earlier price of the symbol however far back its prior row
+    is. Otherwise a row whose reported previous close differs from the stored prior close
+    is an event with ratio prev_close / prior close, snapped to a known split or bonus
+    ratio when close to one; that is only trusted when the prior stored row is the
+    immediately preceding trading session, or a gap in the data would masquerade as an
+    event. A price gap alone is never an event. Non-events get 1.0.
+
+    Args:
+        df (pandas.DataFrame): Output of `_prepare`, optionally with a ca_ratio column.
+        sessions (numpy.ndarray): Sorted datetime64[D] trading sessions.
+
+    Returns:
+        numpy.ndarray: float ratios aligned with `df`.
+    """
+    symbols = df['CH_SYMBOL'].to_numpy()
+    dates = pd.to_datetime(df['date_key']).to_numpy().astype('datetime64[D]')
+    close = df['close'].to_numpy(dtype=float)
+    prev_close = df['prev_close'].to_numpy(dtype=float)
+    ca_ratio = df['ca_ratio'].to_numpy(dtype=float) if 'ca_ratio' in df else np.ones(len(df))
+
+    same_symbol = np.zeros(len(df), dtype=bool)
+    same_symbol[1:] = symbols[1:] == symbols[:-1]
+    position = np.searchsorted(sessions, dates)
+    consecutive = np.zeros(len(df), dtype=bool)
+    consecutive[1:] = (position[1:] - position[:-1]) == 1
+
+    prior_close = np.empty(len(df))
+    prior_close[0] = np.nan
+    prior_close[1:] = close[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        restated = prev_close / prior_close
+    is_restated = np.isfinite(restated) & (np.abs(restated - 1.0) > EVENT_TOLERANCE)
+
+    nearest = np.clip(np.searchsorted(SPLIT_BONUS_RATIOS, np.nan_to_num(restated, nan=1.0)), 1, len(SPLIT_BONUS_RATIOS) - 1)
+    below, above = SPLIT_BONUS_RATIOS[nearest - 1], SPLIT_BONUS_RATIOS[nearest]
+    snapped = np.where(np.abs(restated - below) <= np.abs(above - restated), below, above)
+    restated = np.where(np.abs(restated / snapped - 1.0) <= SNAP_TOLERANCE, snapped, restated)
+
+    has_action = np.isfinite(ca_ratio) & (ca_ratio > 0) & (ca_ratio != 1.0)
+    ratio = np.where(has_action, ca_ratio, np.where(is_restated & consecutive, restated, 1.0))
+    return np.where(same_symbol, ratio, 1.0)
+
+
+def cumulative_factors(symbols, ratios):
+    """
+    Returns the backward cumulative adjustment factor for each row: the product of the
+    event ratios of all later rows of the same symbol.
+    """
+    log_ratio = pd.Series(np.log(ratios))
+    # Reverse cumulative sum per symbol, excluding the row itself.
+    reversed_sum = log_ratio[::-1].groupby(pd.Series(symbols)[::-1].to_numpy()).cumsum()[::-1].to_numpy()
+    return np.exp(reversed_sum - log_ratio.to_numpy())
+
+
+def adjust(df, sessions):
+    """
+    Computes adjusted OHLC and volume for complete per-symbol histories (with their
+    ca_ratio column, see `with_action_ratios`).
+
+    Returns:
+        pandas.DataFrame with the stock_company_price_adjusted columns.
+    """
+    df = _prepare(df)
+    factors = cumulative_factors(df['CH_SYMBOL'].to_numpy(), event_ratios(df, sessions))
+    out = pd.DataFrame({'CH_SYMBOL': df['CH_SYMBOL'], 'date_key': df['date_key'], 'adj_factor': factors})
+    for column in ('open', 'high', 'low', 'close'):
+        out[column] = df[column].to_numpy(dtype=float) * factors
+    out['volume'] = df['volume'].to_numpy(dtype=float) / factors
+    return out
+
+
+def _write(conn, adjusted, replace_symbols=()):
+    """Replaces the given symbols' adjusted history and upserts `adjusted`."""
+    with conn:
+        if len(replace_symbols):
+            conn.executemany("DELETE FROM stock_company_price_adjusted WHERE CH_SYMBOL = ?", [(s,) for s in replace_symbols])
+        conn.executemany(
+            "INSERT OR REPLACE INTO stock_company_price_adjusted VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            adjusted.astype(object).where(adjusted.notna(), None).itertuples(index=False, name=None),
+        )
+        symbols = [(symbol,) for symbol in adjusted['CH_SYMBOL'].unique()]
+        conn.executemany(STATE_UPSERT_SQL, symbols)
+
+
+def refresh_adjustments(db_path=DB_PATH, rebuild=False):
+    """
+    Brings stock_company_price_adjusted up to date with stock_company_price_daily.
+
+    Only rows after each symbol's last adjusted date are read. Symbols whose new rows
+    contain a corporate-action event, that have never been adjusted, or that gained rows
+    or corporate actions on or before their last adjusted date (a backfill) are
+    recomputed over their full history; all others simply get their new rows appended
+    with a factor of 1, since no later event exists to scale them.
+
+    Args:
+        db_path (str): Path to the SQLite database.
+        rebuild (bool): Recompute every symbol from scratch.
+
+    Returns:
+        dict: Counts of recomputed symbols, appended symbols and written rows.
+    """
+    start_time = datetime.now()
+    conn = None
+    try:
+        conn = connect(db_path)
+        conn.execute(ADJUSTED_TABLE_DDL)
+        conn.execute(ADJUSTMENT_STATE_DDL)
+        if "row_count" not in {row[1] for row in conn.execute("PRAGMA table_info(adjustment_state)")}:
+            # State written before row counts were kept: every symbol is recomputed once.
+            with conn:
+                conn.execute("ALTER TABLE adjustment_state ADD COLUMN row_count INTEGER")
+        if "action_count" not in {row[1] for row in conn.execute("PRAGMA table_info(adjustment_state)")}:
+            # Likewise for action counts: symbols with stored corporate actions are recomputed once.
+            with conn:
+                conn.execute("ALTER TABLE adjustment_state ADD COLUMN action_count INTEGER")
+        if rebuild:
+            with conn:
+                conn.execute("DELETE FROM stock_company_price_adjusted")
+                conn.execute("DELETE FROM adjustment_state")
+
+        # The tail includes each symbol's last adjusted row as the anchor for the first new ratio.
+        tail = pd.read_sql_query(f"""
+            SELECT {RAW_COLUMNS}, s.last_date_key
+            FROM stock_company_price_daily c
+            LEFT JOIN adjustment_state s USING (CH_SYMBOL)
+            WHERE s.last_date_key IS NULL OR c.CH_TIMESTAMP >= s.last_date_key
+        """, conn)
+        backfilled = set(pd.read_sql_query(BACKFILLED_QUERY, conn)['CH_SYMBOL'])
+        if tail.empty and not backfilled:
+            print("Adjusted prices are up to date.")
+            return {"recomputed": 0, "appended": 0, "rows": 0}
+
+        known_actions = action_ratios(conn)
+        tail = _prepare(with_action_ratios(tail, known_actions))
+        recompute = set(backfilled)
+        if not tail.empty:
+            sessions = TradingCalendar.from_db(db_path).sessions(tail['date_key'].min(), tail['date_key'].max())
+            sessions = sessions.values.astype('datetime64[D]')
+            ratios = event_ratios(tail, sessions)
+
+            never_adjusted = tail['last_date_key'].isna()
+            has_event = pd.Series(ratios != 1.0).groupby(tail['CH_SYMBOL']).transform('any')
+            recompute |= set(tail.loc[never_adjusted | has_event, 'CH_SYMBOL'])
+        recompute = sorted(recompute)
+
+        appended = tail[~tail['CH_SYMBOL'].isin(recompute) & (tail['date_key'] > tail['last_date_key'])]
+        appended_out = pd.DataFrame({'CH_SYMBOL': appended['CH_SYMBOL'], 'date_key': appended['date_key'], 'adj_factor': 1.0})
+        for column in ('open', 'high', 'low', 'close', 'volume'):
+            appended_out[column] = appended[column].to_numpy(dtype=float)
+
+        recomputed_out = appended_out.iloc[0:0]
+        if recompute:
+            placeholders = ', '.join('?' * len(recompute))
+            history = pd.read_sql_query(
+                f"SELECT {RAW_COLUMNS} FROM stock_company_price_daily WHERE CH_SYMBOL IN ({placeholders})",
+                conn, params=recompute)
+            full_sessions = TradingCalendar.from_db(db_path).sessions(history['date_key'].min(), history['date_key'].max())
+            recomputed_out = adjust(with_action_ratios(history, known_actions), full_sessions.values.astype('datetime64[D]'))
+
+        if len(recomputed_out):
+            _write(conn, recomputed_out, replace_symbols=recompute)
+        if len(appended_out):
+            _write(conn, appended_out)
+
+        rows = len(recomputed_out) + len(appended_out)
+        if rows:
+            with conn:
+                counter = bump_write_counter(conn)
+            notify_write(db_path, counter, {
+                "stock_company_price_adjusted": set(recompute) | set(appended_out['CH_SYMBOL']),
+            })
+        appended_symbols = appended_out['CH_SYMBOL'].nunique()
+        print(f"Adjusted prices refreshed in {datetime.now() - start_time}: {len(recompute)} symbols recomputed, "
+              f"{appended_symbols} appended, {rows} rows written.")
+        return {"recomputed": len(recompute), "appended": appended_symbols, "rows": rows}
+
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        print(f"Database error while refreshing adjusted prices: {e}")
+        return {"recomputed": 0, "appended": 0, "rows": 0}
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain corporate-action adjusted equity prices.")
+    parser.add_argument("--db", type=str, default=DB_PATH, help="Path to the SQLite database.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every symbol from scratch.")
+    args = parser.parse_args()
+
+    refresh_adjustments(args.db, args.rebuild)
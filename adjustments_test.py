@@ -0,0 +1,132 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from adjustments import action_ratio, event_ratios, adjust, refresh_adjustments
+from db_writer import BulkWriter, company_rows, corporate_action_rows
+
+
+def raw_frame(closes, prev_closes, start="2024-01-01"):
+    dates = pd.bdate_range(start, periods=len(closes))
+    return pd.DataFrame({
+        'CH_SYMBOL': 'INFY', 'date_key': dates.strftime('%Y-%m-%d'), 'prev_close': prev_closes,
+        'open': closes, 'high': closes, 'low': closes, 'close': closes, 'volume': 100.0,
+    }), dates.values.astype('datetime64[D]')
+
+
+def test_restated_split_is_snapped_to_its_ratio():
+    df, sessions = raw_frame([100.0, 100.0, 50.5, 51.0], [100.0, 100.0, 50.1, 50.5])
+    ratios = event_ratios(df, sessions)
+    assert list(ratios) == [1.0, 1.0, 0.5, 1.0]
+    adjusted = adjust(df, sessions)
+    assert list(adjusted['close']) == [50.0, 50.0, 50.5, 51.0]
+    assert list(adjusted['volume']) == [200.0, 200.0, 100.0, 100.0]
+
+
+def test_crash_without_restated_close_is_not_an_event():
+    df, sessions = raw_frame([100.0, 50.0, 30.0], [100.0, 100.0, 50.0])
+    assert list(event_ratios(df, sessions)) == [1.0, 1.0, 1.0]
+
+
+def test_unusual_restated_ratio_is_kept_as_reported():
+    # e.g. a rights issue: the previous close is restated by an odd ratio.
+    df, sessions = raw_frame([100.0, 97.0], [100.0, 97.0])
+    assert np.isclose(event_ratios(df, sessions)[1], 0.97)
+
+
+def stage(db_path, days):
+    records = [{'CH_SYMBOL': 'INFY', 'CH_SERIES': 'EQ', 'CH_TIMESTAMP': day.strftime('%Y-%m-%d'),
+                'CH_PREVIOUS_CLS_PRICE': 10.0, 'CH_OPENING_PRICE': 10.0, 'CH_TRADE_HIGH_PRICE': 10.0,
+                'CH_TRADE_LOW_PRICE': 10.0, 'CH_CLOSING_PRICE': 10.0, 'CH_TOT_TRADED_QTY': 5} for day in days]
+    with BulkWriter(db_path) as writer:
+        writer.stage_company_rows(company_rows(records, 'NIFTY IT'))
+
+
+def adjusted_range(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*), MIN(date_key) FROM stock_company_price_adjusted").fetchone()
+    finally:
+        conn.close()
+
+
+def test_backfilled_rows_are_adjusted(tmp_path):
+    db_path = str(tmp_path / "stock.db")
+    days = pd.bdate_range("2024-01-01", "2024-03-29")
+    stage(db_path, days[20:])
+    assert refresh_adjustments(db_path)["recomputed"] == 1
+    assert adjusted_range(db_path) == (len(days) - 20, days[20].strftime('%Y-%m-%d'))
+
+    assert refresh_adjustments(db_path) == {"recomputed": 0, "appended": 0, "rows": 0}
+
+    stage(db_path, days[:20])
+    assert refresh_adjustments(db_path)["recomputed"] == 1
+    assert adjusted_range(db_path) == (len(days), "2024-01-01")
+
+
+def test_action_ratio_reads_bonus_and_face_value_subjects():
+    assert action_ratio("Bonus 1:1") == 0.5
+    assert action_ratio(" Bonus 1 : 2") == 2 / 3
+    assert action_ratio("Face Value Split (Sub-Division) - From Rs 10/- Per Share To Re 1/- Per Share") == 0.1
+    assert action_ratio(" Fv Splt Frm Rs 10 To Re 1") == 0.1
+    assert action_ratio("Bonus 1:1 / Face Value Split - From Rs 10/- Per Share To Rs 5/- Per Share") == 0.25
+    assert action_ratio("Annual General Meeting/Dividend - Rs 2.50 Per Share") == 1.0
+    assert action_ratio(" Scheme Of Arangement- Bonus - 1 Debenture For 1 Equity Share Held") == 1.0
+
+
+# TATASTEEL around its 1:10 split, as the equity API returned it: the ex-date row carries
+# the action in CA but reports the unadjusted 959.4 as its previous close.
+TATASTEEL_SPLIT = "[{'symbol': 'TATASTEEL', 'series': 'EQ', 'ind': '-', 'faceVal': '1', " \
+    "'subject': 'Face Value Split (Sub-Division) - From Rs 10/- Per Share To Re 1/- Per Share', " \
+    "'exDate': '28-Jul-2022', 'recDate': '29-Jul-2022', 'comp': 'Tata Steel Limited', 'caBroadcastDate': None}]"
+TATASTEEL_ROWS = [
+    # date, previous close, open, high, low, close, volume, CA
+    ('2022-07-26', 960.7, 972.0, 976.7, 946.05, 949.5, 12626469, None),
+    ('2022-07-27', 949.5, 951.0, 961.55, 943.6, 959.4, 5255902, None),
+    ('2022-07-28', 959.4, 98.1, 102.0, 97.15, 100.35, 137156107, TATASTEEL_SPLIT),
+    ('2022-07-29', 100.35, 103.0, 109.3, 102.15, 107.6, 166959934, None),
+]
+
+
+def tatasteel_records():
+    return [{'CH_SYMBOL': 'TATASTEEL', 'CH_SERIES': 'EQ', 'CH_TIMESTAMP': day, 'CH_PREVIOUS_CLS_PRICE': prev,
+             'CH_OPENING_PRICE': open_, 'CH_TRADE_HIGH_PRICE': high, 'CH_TRADE_LOW_PRICE': low,
+             'CH_CLOSING_PRICE': close, 'CH_TOT_TRADED_QTY': volume, 'CA': ca}
+            for day, prev, open_, high, low, close, volume, ca in TATASTEEL_ROWS]
+
+
+def adjusted_closes(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT date_key, adj_factor, close FROM stock_company_price_adjusted ORDER BY date_key").fetchall()
+    finally:
+        conn.close()
+
+
+def test_unrestated_split_is_adjusted_from_its_corporate_action(tmp_path):
+    db_path = str(tmp_path / "stock.db")
+    records = tatasteel_records()
+    with BulkWriter(db_path) as writer:
+        writer.record_corporate_actions(corporate_action_rows(records))
+        writer.stage_company_rows(company_rows(records, 'NIFTY METAL'))
+    assert refresh_adjustments(db_path)["recomputed"] == 1
+
+    rows = adjusted_closes(db_path)
+    assert np.allclose([factor for _, factor, _ in rows], [0.1, 0.1, 1.0, 1.0])
+    assert np.allclose([close for _, _, close in rows], [94.95, 95.94, 100.35, 107.6])
+
+
+def test_corporate_actions_loaded_after_adjusting_trigger_a_recompute(tmp_path):
+    db_path = str(tmp_path / "stock.db")
+    records = tatasteel_records()
+    with BulkWriter(db_path) as writer:
+        writer.stage_company_rows(company_rows(records, 'NIFTY METAL'))
+    refresh_adjustments(db_path)
+    assert [factor for _, factor, _ in adjusted_closes(db_path)] == [1.0] * 4
+
+    with BulkWriter(db_path) as writer:
+        writer.record_corporate_actions(corporate_action_rows(records))
+    assert refresh_adjustments(db_path)["recomputed"] == 1
+    assert np.allclose([factor for _, factor, _ in adjusted_closes(db_path)], [0.1, 0.1, 1.0, 1.0])
+    assert refresh_adjustments(db_path) == {"recomputed": 0, "appended": 0, "rows": 0}
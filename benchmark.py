@@ -0,0 +1,294 @@
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import resource
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime
+
+import numpy as np
+
+import db_writer
+import download_nse_index_data
+from create_db import create_tables
+from download_nse_data import download_windows
+from metrics import METRICS, DOWNLOAD, INSERT
+from mock_nse import MockData, MockServer
+from nsedata import QueryClient
+from scheduler import RequestScheduler
+from schema_v2 import migrate
+from storage import read_frame
+
+BASELINE_DIR = "benchmarks"
+# Relative change beyond which a metric counts as a regression.
+TOLERANCE = 0.15
+QUERY_REPEATS = 20
+
+
+def percentiles(samples):
+    """p50/p90/p99/max in milliseconds of a list of durations in seconds."""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000.0
+    return {"count": len(ms), "p50": float(np.percentile(ms, 50)), "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)), "max": float(ms.max())}
+
+
+def _stage_ms(stages, stage):
+    """A stage summary from the metrics report, converted to milliseconds."""
+    stats = stages.get(stage, {"count": 0})
+    return {key: value if key == "count" else value * 1000.0 for key, value in stats.items() if key not in ("sum", "mean")}
+
+
+def run_pipeline(config):
+    """
+    Runs index ingest, equity ingest and dashboard queries against the mock server.
+
+    Called in a fresh interpreter (see `run_benchmark`) whose environment points the
+    downloaders at the mock server before they are imported, and whose working directory
+    is a scratch directory, so file sinks never touch the repository's data/ and peak RSS
+    covers only this run.
+    """
+    METRICS.reset()
+    db_path = os.path.abspath("bench.db")
+    report = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        create_tables(db_path)
+
+        start = time.perf_counter()
+        result = download_nse_index_data.refresh_indices(config["indices"], max_workers=config["workers"], db_path=db_path, export=None,
+                                                         scheduler=RequestScheduler(retries=config["retries"], backoff=0.1))
+        elapsed = time.perf_counter() - start
+        report["index_ingest"] = {"rows": result["inserted"], "seconds": elapsed,
+                                  "rows_per_sec": result["inserted"] / elapsed if elapsed else 0.0}
+
+        windows = [(index, symbol, f"01-01-{year}", f"31-12-{year}")
+                   for index, symbol in config["symbols"] for year in config["years"]]
+        start = time.perf_counter()
+        inserted, _ = download_windows(windows, max_workers=config["workers"], sessions=config["workers"],
+                                       per_host=config["workers"], db_path=db_path, file_format="parquet")
+        elapsed = time.perf_counter() - start
+        report["equity_ingest"] = {"rows": inserted, "seconds": elapsed, "rows_per_sec": inserted / elapsed if elapsed else 0.0}
+
+    run = METRICS.report()
+    report["http_ms"] = _stage_ms(run["stages"], DOWNLOAD)
+    report["insert_ms"] = _stage_ms(run["stages"], INSERT)
+    report["stage_seconds"] = {stage: stats["sum"] for stage, stats in run["stages"].items()}
+    report["http_bytes"] = METRICS.counter_value("nse_http_bytes_total")
+
+    # What the dashboard runs on every page load, plus the index chart cold and warm.
+    summary = []
+    for _ in range(QUERY_REPEATS):
+        start = time.perf_counter()
+        read_frame(db_path, db_writer.INDEX_OVERVIEW_QUERY)
+        read_frame(db_path, db_writer.EQUITY_OVERVIEW_QUERY)
+        summary.append(time.perf_counter() - start)
+    chart_cold, chart_warm = [], []
+    for name in config["indices"]:
+        client = QueryClient(db_path)
+        chart_cold.append(_measure(client.get_index, name))
+        chart_warm.extend(_measure(client.get_index, name) for _ in range(QUERY_REPEATS))
+        client.close()
+    report["query_ms"] = {"summary": percentiles(summary), "chart_cold": percentiles(chart_cold),
+                          "chart_warm": percentiles(chart_warm)}
+    report["range_ms"] = range_queries(db_path, config)
+    report["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return report
+
+
+def range_queries(db_path, config):
+    """
+    Times the readers' date-range queries on `db_path` and on a migrated copy of it.
+
+    One symbol's last year, one index's last year and every row of the last month: the
+    migrated schema answers them through the v1 views, which must not be slower.
+    """
+    last = read_frame(db_path, "SELECT MAX(CH_TIMESTAMP) AS day FROM stock_company_price_daily")['day'].iloc[0]
+    if last is None:
+        return {}
+    year, month = f"{int(last[:4]) - 1}{last[4:]}", f"{last[:8]}01"
+    queries = {
+        "symbol": ("SELECT CH_TIMESTAMP, CH_CLOSING_PRICE FROM stock_company_price_daily "
+                   "WHERE CH_SYMBOL = ? AND CH_TIMESTAMP BETWEEN ? AND ?", (config["symbols"][0][1], year, last)),
+        "index": ("SELECT * FROM stock_index_price_daily WHERE index_name = ? AND date_key BETWEEN ? AND ?",
+                  (config["indices"][0], year, last)),
+        "month": ("SELECT CH_SYMBOL, CH_CLOSING_PRICE FROM stock_company_price_daily WHERE CH_TIMESTAMP BETWEEN ? AND ?",
+                  (month, last)),
+    }
+    migrated = os.path.abspath("bench_v2.db")
+    shutil.copyfile(db_path, migrated)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        migrate(migrated)
+    report = {}
+    for label, path in (("v1", db_path), ("migrated", migrated)):
+        conn = sqlite3.connect(path)
+        for name, (query, params) in queries.items():
+            conn.execute(query, params).fetchall()
+            report[f"{name}_{label}"] = percentiles([_measure(lambda: conn.execute(query, params).fetchall())
+                                                     for _ in range(QUERY_REPEATS)])
+        conn.close()
+    return report
+
+
+def _measure(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def run_benchmark(data_dir="data", latency=0.0, error_rate=0.0, rate_limit=None, workers=8,
+                  max_symbols=None, years=None, retries=3):
+    """
+    Starts the mock server, runs the pipeline in a child process and returns its report.
+
+    Args:
+        data_dir (str): CSV tree the mock payloads are generated from.
+        latency (float): Mean mock response delay in seconds.
+        error_rate (float): Fraction of mock API requests failed with 503.
+        rate_limit (float, optional): Mock requests per second per client.
+        workers (int): Download workers (and sessions / per-host slots).
+        max_symbols (int, optional): Cap on the number of symbols downloaded.
+        years (list, optional): Calendar years to request. Defaults to every year in the data.
+        retries (int): Retries per index window.
+
+    Returns:
+        dict: The report (see `run_pipeline`) plus the configuration and mock status counts.
+    """
+    data = MockData(data_dir)
+    symbols = [(index, symbol) for index, members in sorted(data.constituents.items()) for symbol in sorted(members)]
+    symbols = symbols[:max_symbols] if max_symbols else symbols
+    if years is None:
+        first = min(dates[0] for dates, _ in data.equity.values()).astype('datetime64[Y]').astype(int) + 1970
+        last = max(dates[-1] for dates, _ in data.equity.values()).astype('datetime64[Y]').astype(int) + 1970
+        years = list(range(int(first), int(last) + 1))
+    config = {"indices": sorted(data.index), "symbols": symbols, "years": years, "workers": workers, "retries": retries}
+
+    server = MockServer(data, port=0, latency=latency, error_rate=error_rate, rate_limit=rate_limit).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="nse-bench-") as workdir:
+            with open(os.path.join(workdir, "config.json"), "w") as f:
+                json.dump(config, f)
+            env = dict(os.environ, NSE_BASE_URL=server.url, NIFTYINDICES_BASE_URL=server.url)
+            subprocess.run([sys.executable, os.path.abspath(__file__), "child", "config.json", "report.json"],
+                           cwd=workdir, env=env, check=True)
+            with open(os.path.join(workdir, "report.json")) as f:
+                report = json.load(f)
+    finally:
+        server.stop()
+
+    report["config"] = {"latency_ms": latency * 1000, "error_rate": error_rate, "rate_limit": rate_limit,
+                        "workers": workers, "symbols": len(symbols), "years": len(years), "indices": len(config["indices"])}
+    report["mock_status_counts"] = {str(status): count for status, count in sorted(server.counts.items())}
+    report["created"] = datetime.now().isoformat(timespec="seconds")
+    return report
+
+
+def _flatten(report, prefix=""):
+    flat = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def _direction(metric):
+    """+1 when higher is better, -1 when lower is better, 0 for metrics that are not compared."""
+    if metric.endswith("rows_per_sec"):
+        return 1
+    if metric == "peak_rss_mb" or (metric.split(".")[0].endswith("_ms") and not metric.endswith(".count")):
+        return -1
+    return 0
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """
+    Compares a report with a baseline.
+
+    Returns:
+        list: (metric, baseline value, current value, relative change) for every metric
+        that got worse by more than `tolerance`.
+    """
+    current, previous = _flatten(report), _flatten(baseline)
+    regressions = []
+    for metric, old in sorted(previous.items()):
+        direction = _direction(metric)
+        new = current.get(metric)
+        if not direction or new is None or not old:
+            continue
+        change = (new - old) / old
+        if change * direction < -tolerance:
+            regressions.append((metric, old, new, change))
+    return regressions
+
+
+def baseline_path(name, baseline_dir=BASELINE_DIR):
+    return os.path.join(baseline_dir, f"{name}.json")
+
+
+def print_report(report):
+    for section in ("index_ingest", "equity_ingest"):
+        stats = report[section]
+        print(f"{section}: {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_sec']:.0f} rows/s)")
+    for section in ("http_ms", "insert_ms"):
+        stats = report[section]
+        if stats["count"]:
+            print(f"{section}: n={stats['count']} p50={stats['p50']:.1f} p90={stats['p90']:.1f} "
+                  f"p99={stats['p99']:.1f} max={stats['max']:.1f}")
+    for name, stats in report["query_ms"].items():
+        print(f"query {name}: p50={stats['p50']:.2f}ms p99={stats['p99']:.2f}ms")
+    for name, stats in report.get("range_ms", {}).items():
+        print(f"range {name}: p50={stats['p50']:.2f}ms p99={stats['p99']:.2f}ms")
+    print(f"peak RSS: {report['peak_rss_mb']:.0f} MB; mock responses: {report['mock_status_counts']}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "child":
+        with open(sys.argv[2]) as f:
+            child_report = run_pipeline(json.load(f))
+        with open(sys.argv[3], "w") as f:
+            json.dump(child_report, f)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Offline ingest and query benchmark against a mock NSE/niftyindices server.")
+    parser.add_argument("--data-dir", type=str, default="data", help="CSV tree the mock payloads are generated from.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean mock response delay in milliseconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock requests failed with 503.")
+    parser.add_argument("--rate-limit", type=float, help="Mock requests per second per client before 429s.")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent download workers.")
+    parser.add_argument("--symbols", type=int, help="Benchmark only the first N symbols.")
+    parser.add_argument("--years", type=int, nargs="+", help="Calendar years to request. Defaults to all.")
+    parser.add_argument("--save-baseline", type=str, metavar="NAME", help="Save the report as a named baseline.")
+    parser.add_argument("--compare", type=str, metavar="NAME", help="Compare against a saved baseline; exits 1 on regressions.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed relative slowdown before a regression is reported.")
+    parser.add_argument("--output", type=str, help="Also write the JSON report to this file.")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.data_dir, args.latency_ms / 1000, args.error_rate, args.rate_limit,
+                           args.workers, args.symbols, args.years)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(args.save_baseline), "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline {baseline_path(args.save_baseline)}.")
+    if args.compare:
+        with open(baseline_path(args.compare)) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"Warning: baseline was recorded with a different configuration: {baseline.get('config')}")
+        regressions = compare(report, baseline, args.tolerance)
+        for metric, old, new, change in regressions:
+            print(f"REGRESSION {metric}: {old:.2f} -> {new:.2f} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%}).")
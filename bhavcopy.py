@@ -0,0 +1,347 @@
+import io
+import os
+import glob
+import zipfile
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import requests
+
+import metrics
+import scheduler
+import registry
+from metrics import METRICS, DOWNLOAD
+from db_writer import COMPANY_COLUMNS, DB_PATH
+from bulk_load import _to_sql_rows
+from storage import open_writer, is_postgres
+from nse_client import SessionPool, record_response
+from scheduler import RequestScheduler, FailureBudgetExceeded, scheduler_from_args
+from trading_calendar import TradingCalendar
+from adjustments import refresh_adjustments
+
+# NSE_ARCHIVES_URL points `fetch` at another server.
+ARCHIVES_URL = os.environ.get("NSE_ARCHIVES_URL", "https://nsearchives.nseindia.com")
+# Daily files are published in the UDiFF layout from this session on.
+UDIFF_START = datetime(2024, 7, 8)
+BHAVCOPY_DIR = os.path.join("data", "BHAVCOPY")
+# Files parsed per worker task; amortises process start-up and result pickling.
+FILES_PER_TASK = 25
+
+# Source column -> stock_company_price_daily column for each bhavcopy layout. "date" is
+# the trading day; VWAP is derived from value / quantity where the file lacks it.
+LAYOUTS = {
+    # cm01JAN2020bhav.csv(.zip): the classic CM bhavcopy.
+    "cm": {
+        "SYMBOL": "CH_SYMBOL", "SERIES": "CH_SERIES", "TIMESTAMP": "date",
+        "PREVCLOSE": "CH_PREVIOUS_CLS_PRICE", "OPEN": "CH_OPENING_PRICE", "HIGH": "CH_TRADE_HIGH_PRICE",
+        "LOW": "CH_TRADE_LOW_PRICE", "LAST": "CH_LAST_TRADED_PRICE", "CLOSE": "CH_CLOSING_PRICE",
+        "TOTTRDQTY": "CH_TOT_TRADED_QTY", "TOTTRDVAL": "CH_TOT_TRADED_VAL", "TOTALTRADES": "CH_TOTAL_TRADES",
+    },
+    # sec_bhavdata_full_01012020.csv: adds the average price and delivery figures.
+    "full": {
+        "SYMBOL": "CH_SYMBOL", "SERIES": "CH_SERIES", "DATE1": "date",
+        "PREV_CLOSE": "CH_PREVIOUS_CLS_PRICE", "OPEN_PRICE": "CH_OPENING_PRICE", "HIGH_PRICE": "CH_TRADE_HIGH_PRICE",
+        "LOW_PRICE": "CH_TRADE_LOW_PRICE", "LAST_PRICE": "CH_LAST_TRADED_PRICE", "CLOSE_PRICE": "CH_CLOSING_PRICE",
+        "AVG_PRICE": "VWAP", "TTL_TRD_QNTY": "CH_TOT_TRADED_QTY", "TURNOVER_LACS": "CH_TOT_TRADED_VAL",
+        "NO_OF_TRADES": "CH_TOTAL_TRADES",
+    },
+    # BhavCopy_NSE_CM_0_0_0_20240708_F_0000.csv(.zip): the UDiFF layout.
+    "udiff": {
+        "TckrSymb": "CH_SYMBOL", "SctySrs": "CH_SERIES", "TradDt": "date",
+        "PrvsClsgPric": "CH_PREVIOUS_CLS_PRICE", "OpnPric": "CH_OPENING_PRICE", "HghPric": "CH_TRADE_HIGH_PRICE",
+        "LwPric": "CH_TRADE_LOW_PRICE", "LastPric": "CH_LAST_TRADED_PRICE", "ClsPric": "CH_CLOSING_PRICE",
+        "TtlTradgVol": "CH_TOT_TRADED_QTY", "TtlTrfVal": "CH_TOT_TRADED_VAL", "TtlNbOfTxsExctd": "CH_TOTAL_TRADES",
+    },
+}
+DATE_FORMATS = {"cm": "%d-%b-%Y", "full": "%d-%b-%Y", "udiff": "%Y-%m-%d"}
+# sec_bhavdata_full reports turnover in lakhs of rupees; the API stores rupees.
+VALUE_SCALE = {"full": 1e5}
+
+
+def detect_layout(header):
+    """Returns the layout key for a bhavcopy header line, or None if it is not a bhavcopy."""
+    columns = {column.strip() for column in header.split(",")}
+    for layout, mapping in LAYOUTS.items():
+        if set(mapping) <= columns:
+            return layout
+    return None
+
+
+def find_files(paths):
+    """Expands files and directories (searched recursively) into bhavcopy .csv/.zip paths."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ("*.csv", "*.zip"):
+                files.extend(glob.glob(os.path.join(path, "**", pattern), recursive=True))
+        else:
+            files.append(path)
+    return sorted(set(files))
+
+
+def _members(path):
+    """Yields (name, text) for a CSV file or every CSV inside a zip archive."""
+    if path.lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if name.lower().endswith(".csv"):
+                    yield f"{path}:{name}", archive.read(name).decode("utf-8", errors="replace")
+    else:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield path, f.read()
+
+
+def read_bhavcopy(name, text, series=("EQ",), symbols=None):
+    """
+    Parses bhavcopy text into a frame with the stock_company_price_daily columns (minus
+    index_type and index_name), keeping only rows of the given series and symbols.
+
+    `text` may hold several days of the same layout under a single header, which is how
+    `parse_files` amortises the parser and conversion overhead over many files.
+    """
+    layout = detect_layout(text.partition("\n")[0])
+    if layout is None:
+        raise ValueError(f"{name} is not a recognised bhavcopy layout.")
+    mapping = LAYOUTS[layout]
+    df = pd.read_csv(io.StringIO(text), skipinitialspace=True, dtype=str,
+                     usecols=lambda column: column.strip() in mapping)
+    df.columns = [mapping[column.strip()] for column in df.columns]
+    df['CH_SYMBOL'] = df['CH_SYMBOL'].str.strip()
+    df['CH_SERIES'] = df['CH_SERIES'].str.strip()
+    if series:
+        df = df[df['CH_SERIES'].isin(series)]
+    if symbols is not None:
+        df = df[df['CH_SYMBOL'].isin(symbols)]
+
+    out = pd.DataFrame(index=df.index)
+    for column in COMPANY_COLUMNS[:-2]:
+        if column in df:
+            out[column] = df[column]
+    for column in out.columns.drop(['CH_SYMBOL', 'CH_SERIES']):
+        # Placeholders such as "-" become NaN.
+        out[column] = pd.to_numeric(df[column], errors="coerce")
+    if layout in VALUE_SCALE:
+        out['CH_TOT_TRADED_VAL'] *= VALUE_SCALE[layout]
+    if 'VWAP' not in out:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out['VWAP'] = (out['CH_TOT_TRADED_VAL'] / out['CH_TOT_TRADED_QTY']).round(2)
+    out['VWAP'] = out['VWAP'].replace([np.inf, -np.inf], np.nan)
+
+    dates = pd.to_datetime(df['date'].str.strip(), format=DATE_FORMATS[layout], errors="coerce")
+    out['CH_TIMESTAMP'] = dates.dt.strftime('%Y-%m-%d')
+    # The API's TIMESTAMP is IST midnight of the trading day in UTC, e.g. 2015-12-30T18:30:00.000Z.
+    out['TIMESTAMP'] = (dates - pd.Timedelta(hours=5, minutes=30)).dt.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    out['mTIMESTAMP'] = dates.dt.strftime('%d-%b-%Y')
+    return out[dates.notna()].reindex(columns=COMPANY_COLUMNS[:-2])
+
+
+def parse_files(paths, universe, series=("EQ",), index_type='sectoral'):
+    """
+    Process-pool entry point: parses a batch of bhavcopies into stock_company_price_daily
+    tuples for the symbols in `universe`.
+
+    Args:
+        paths (list): Bhavcopy .csv or .zip files.
+        universe (dict): Symbol -> list of index names the symbol is stored under.
+        series (tuple): Series to keep, e.g. ("EQ",).
+
+    Returns:
+        tuple: (rows, files parsed, errors) where errors lists (path, message).
+    """
+    bodies, errors, parsed = {}, [], 0
+    for path in paths:
+        try:
+            for name, text in _members(path):
+                header, _, body = text.partition("\n")
+                if detect_layout(header) is None:
+                    raise ValueError(f"{name} is not a recognised bhavcopy layout.")
+                if body and not body.endswith("\n"):
+                    body += "\n"
+                # Files with identical headers are parsed together, as in bulk_load._read_csvs.
+                bodies.setdefault(header.strip(), []).append(body)
+                parsed += 1
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            errors.append((path, str(e)))
+    frames = [read_bhavcopy(header, header + "\n" + "".join(chunks), series, list(universe))
+              for header, chunks in bodies.items()]
+    if not frames:
+        return [], parsed, errors
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    # One row per (symbol, index) membership: the table is keyed by index_name too.
+    members = pd.DataFrame([(symbol, index_name) for symbol, names in universe.items() for index_name in names],
+                           columns=['CH_SYMBOL', 'index_name'])
+    df = df.merge(members, on='CH_SYMBOL', how='inner')
+    df['index_type'] = index_type
+    return _to_sql_rows(df[COMPANY_COLUMNS]), parsed, errors
+
+
+def load_universe(indexes=None, universe_file=None):
+    """
+    Builds the symbol universe to keep from the bhavcopies.
+
+    Args:
+        indexes (list, optional): Registry index keys, e.g. ["NIFTY_METAL"]; None means
+            every index with constituents (see registry.py).
+        universe_file (str, optional): CSV with `index` and `symbol` columns, used instead.
+
+    Returns:
+        dict: Symbol -> list of index names (e.g. "NIFTY METAL").
+    """
+    if universe_file:
+        df = pd.read_csv(universe_file, dtype=str)
+        pairs = zip(df['index'].str.strip(), df['symbol'].str.strip())
+    else:
+        pairs = [(index, symbol) for index, symbols in registry.constituents().items()
+                 if indexes is None or index in indexes for symbol in symbols]
+    universe = {}
+    for index, symbol in pairs:
+        names = universe.setdefault(symbol.upper(), [])
+        index_name = index.replace("_", " ")
+        if index_name not in names:
+            names.append(index_name)
+    return universe
+
+
+def load_bhavcopies(paths, universe, db_path=DB_PATH, series=("EQ",), workers=None, files_per_task=FILES_PER_TASK):
+    """
+    Bulk-upserts bhavcopies into stock_company_price_daily.
+
+    Files are parsed in a process pool, FILES_PER_TASK per task, with one vectorized
+    pandas pass per file; only `universe` symbols are kept and funnelled to a single
+    BulkWriter, so existing rows are skipped rather than duplicated.
+
+    Args:
+        paths (list): Bhavcopy files (.csv or .zip, any of the three layouts) or directories.
+        universe (dict): Symbol -> index names, see `load_universe`.
+        db_path (str): Path to the SQLite database or a PostgreSQL URL.
+        series (tuple): Series to keep.
+        workers (int, optional): Number of parser processes. Defaults to the CPU count.
+
+    Returns:
+        tuple: (inserted, skipped) counts.
+    """
+    start_time = datetime.now()
+    files = find_files(paths)
+    batches = [files[i:i + files_per_task] for i in range(0, len(files), files_per_task)]
+    print(f"Loading {len(files)} bhavcopy files for {len(universe)} symbols with {len(batches)} tasks.")
+
+    parsed = 0
+    with open_writer(db_path, batch_size=200000) as writer:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(parse_files, batch, universe, series) for batch in batches]
+            for future in as_completed(futures):
+                rows, count, errors = future.result()
+                parsed += count
+                for path, message in errors:
+                    print(f"Skipping {path}: {message}")
+                writer.stage_company_rows(rows)
+
+    elapsed = (datetime.now() - start_time).total_seconds()
+    print(f"Parsed {parsed} daily files in {elapsed:.2f}s: inserted {writer.inserted} rows, "
+          f"skipped {writer.skipped} already present.")
+    return writer.inserted, writer.skipped
+
+
+def bhavcopy_url(day):
+    """Archive URL of the full-market bhavcopy of one trading day."""
+    if day >= UDIFF_START:
+        return f"{ARCHIVES_URL}/content/cm/BhavCopy_NSE_CM_0_0_0_{day:%Y%m%d}_F_0000.csv.zip"
+    month = day.strftime("%b").upper()
+    return f"{ARCHIVES_URL}/content/historical/EQUITIES/{day:%Y}/{month}/cm{day:%d}{month}{day:%Y}bhav.csv.zip"
+
+
+def fetch_bhavcopies(start, end, dest_dir=BHAVCOPY_DIR, request_scheduler=None, db_path=DB_PATH):
+    """
+    Downloads the bhavcopy of every trading session in [start, end] into `dest_dir`.
+
+    Files already present are skipped, so an interrupted fetch simply resumes. Days
+    the archive has no file for (unlisted holidays) are reported and skipped.
+
+    Args:
+        start, end (str): DD-MM-YYYY bounds.
+        request_scheduler (RequestScheduler, optional): Retry and pacing policy.
+
+    Returns:
+        list: Paths of the files downloaded by this call.
+    """
+    request_scheduler = request_scheduler or RequestScheduler()
+    sessions = TradingCalendar.from_db(db_path).sessions(datetime.strptime(start, "%d-%m-%Y"),
+                                                         datetime.strptime(end, "%d-%m-%Y"))
+    os.makedirs(dest_dir, exist_ok=True)
+    pool = SessionPool(size=1)
+    downloaded = []
+
+    def get(url):
+        with pool.session() as session:
+            with request_scheduler.limiter.slot(url), METRICS.timer(DOWNLOAD):
+                response = session.get(url, timeout=60)
+            record_response(response)
+            response.raise_for_status()
+            return response.content
+
+    try:
+        for day in sessions:
+            url = bhavcopy_url(day.to_pydatetime())
+            path = os.path.join(dest_dir, url.rsplit("/", 1)[1])
+            if os.path.exists(path):
+                continue
+            try:
+                body = request_scheduler.call(get, url, url=url, source="bhavcopy")
+            except requests.exceptions.HTTPError as e:
+                if getattr(e.response, "status_code", None) == 404:
+                    print(f"No bhavcopy published for {day:%d-%m-%Y}.")
+                    continue
+                print(f"Failed to fetch the bhavcopy for {day:%d-%m-%Y}: {e}")
+                continue
+            except requests.exceptions.RequestException as e:
+                print(f"Failed to fetch the bhavcopy for {day:%d-%m-%Y}: {e}")
+                continue
+            except FailureBudgetExceeded as e:
+                print(f"Stopping at {day:%d-%m-%Y}: {e}")
+                break
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+            downloaded.append(path)
+    finally:
+        pool.close()
+    print(f"Downloaded {len(downloaded)} bhavcopy files into {dest_dir}.")
+    return downloaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load NSE full-market daily bhavcopies into stock_company_price_daily.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("load", help="Parse local bhavcopy files (.csv or .zip; CM, sec_bhavdata_full or UDiFF).")
+    load.add_argument("paths", nargs="*", default=[BHAVCOPY_DIR], help="Files or directories to load.")
+    load.add_argument("--index", type=str, nargs="+", help="Keep constituents of these indices (default: every known index).")
+    load.add_argument("--universe-file", type=str, help="CSV with index,symbol columns defining the symbols to keep.")
+    load.add_argument("--series", type=str, nargs="+", default=["EQ"], help="Series to keep.")
+    load.add_argument("--workers", type=int, default=None, help="Number of parser processes.")
+    load.add_argument("--db", type=str, default=DB_PATH, help="Path to the SQLite database or a PostgreSQL URL.")
+    metrics.add_arguments(load)
+
+    fetch = commands.add_parser("fetch", help="Download the daily bhavcopies of a date range from the NSE archives.")
+    fetch.add_argument("--start", type=str, required=True, help="First day (DD-MM-YYYY).")
+    fetch.add_argument("--end", type=str, default=datetime.now().strftime("%d-%m-%Y"), help="Last day (DD-MM-YYYY).")
+    fetch.add_argument("--dest", type=str, default=BHAVCOPY_DIR, help="Directory the archives are saved to.")
+    fetch.add_argument("--db", type=str, default=DB_PATH, help="Database whose index history supplies the trading calendar.")
+    scheduler.add_arguments(fetch)
+    metrics.add_arguments(fetch)
+    args = parser.parse_args()
+    metrics.start_from_args(args)
+
+    if args.command == "fetch":
+        fetch_bhavcopies(args.start, args.end, args.dest, scheduler_from_args(args, per_host=1), args.db)
+    else:
+        universe = load_universe(args.index, args.universe_file)
+        load_bhavcopies(args.paths, universe, args.db, tuple(args.series), args.workers)
+        # The derived tables are maintained in SQLite only.
+        if not is_postgres(args.db):
+            refresh_adjustments(args.db)
+    metrics.finish_from_args(args)
@@ -0,0 +1,202 @@
+import io
+import os
+import glob
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from db_writer import COMPANY_COLUMNS, COMPANY_NUMERIC_COLUMNS, DB_PATH, corporate_action_rows
+from storage import open_writer, is_postgres
+from adjustments import refresh_adjustments
+from registry import FOLDER_ALIASES
+
+INDEX_DATA_DIR = "INDEX_DATA"
+
+
+def discover_files(data_dir="data"):
+    """
+    Finds the CSV files of both layouts under `data_dir`.
+
+    - data/INDEX_DATA/<INDEX NAME>/*.csv holds index history.
+    - data/<INDEX>/<SYMBOL>/*.csv (e.g. data/NIFTY_AUTO/MARUTI/...) holds equity history.
+      The index is named after its folder as the downloaders name it ("NIFTY AUTO"), with
+      older folders first mapped to their registry key (see registry.FOLDER_ALIASES).
+
+    Returns:
+        list: (kind, path, index_name) tuples where kind is "index" or "equity".
+    """
+    files = []
+    for path in sorted(glob.glob(os.path.join(data_dir, INDEX_DATA_DIR, "*", "*.csv"))):
+        files.append(("index", path, os.path.basename(os.path.dirname(path)).upper()))
+
+    for path in sorted(glob.glob(os.path.join(data_dir, "**", "*.csv"), recursive=True)):
+        parts = os.path.relpath(path, data_dir).split(os.sep)
+        if parts[0] == INDEX_DATA_DIR or len(parts) < 3:
+            continue
+        # Everything between data/ and the symbol folder is the index, e.g.
+        # NIFTY_FINANCIAL_SERVICES_25/50 -> NIFTY_FINANCIAL_SERVICES -> "NIFTY FINANCIAL SERVICES".
+        folder = "/".join(parts[:-2])
+        index_name = FOLDER_ALIASES.get(folder, folder).replace("_", " ")
+        files.append(("equity", path, index_name))
+    return files
+
+
+def _to_sql_rows(df):
+    """Turns a DataFrame into tuples with NaN/NaT replaced by None."""
+    values = df.to_numpy(dtype=object)
+    values[pd.isna(values)] = None
+    return list(map(tuple, values))
+
+
+def _read_csvs(paths, **kwargs):
+    """
+    Reads many small CSVs with one parser call per distinct header.
+
+    Files with the same header are concatenated as text first, which avoids paying
+    pandas' per-call overhead for every tiny per-year file.
+    """
+    bodies = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            header = f.readline()
+            body = f.read()
+        if body and not body.endswith("\n"):
+            body += "\n"
+        bodies.setdefault(header, []).append(body)
+    frames = [pd.read_csv(io.StringIO(header + "".join(chunks)), **kwargs) for header, chunks in bodies.items()]
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def parse_index_files(paths, index_name, index_type='sectoral'):
+    """
+    Parses index CSVs into stock_index_price_daily tuples with vectorized conversions.
+
+    Accepts both the exported layout (date_key, open, high, low, close) and the
+    niftyindices download layout (Index Name, Date, Open, High, Low, Close).
+    """
+    df = _read_csvs(paths)
+    if 'date_key' in df:
+        dates = pd.to_datetime(df['date_key'], format="%Y-%m-%d", errors="coerce")
+        prices = df[['open', 'high', 'low', 'close']]
+    else:
+        dates = pd.to_datetime(df['Date'], format="%d %b %Y", errors="coerce")
+        prices = df[['Open', 'High', 'Low', 'Close']]
+        prices.columns = ['open', 'high', 'low', 'close']
+
+    out = prices.apply(pd.to_numeric, errors="coerce")
+    out.insert(0, 'index_name', index_name)
+    out['date_key'] = dates.dt.strftime('%Y-%m-%d')
+    out['index_type'] = index_type
+    bad = dates.isna().sum()
+    if bad:
+        print(f"Skipping {bad} rows with unparseable dates for {index_name}.")
+    return _to_sql_rows(out[dates.notna()])
+
+
+def parse_equity_files(paths, index_name, index_type='sectoral'):
+    """
+    Parses per-symbol equity CSVs with vectorized conversions.
+
+    Returns:
+        tuple: (rows, actions) where rows are stock_company_price_daily tuples and actions
+        the (CH_SYMBOL, ex_date, subject) tuples of the files' CA column.
+    """
+    wanted = set(COMPANY_COLUMNS[:-2]) | {'CA'}
+    text_columns = {column: str for column in wanted - set(COMPANY_NUMERIC_COLUMNS)}
+    # Only the stored columns are parsed; numeric ones are typed by the C parser directly.
+    df = _read_csvs(paths, usecols=lambda column: column in wanted, dtype=text_columns)
+    # Few rows carry a corporate action, so only those are turned into records.
+    with_ca = df.reindex(columns=['CH_SYMBOL', 'CH_TIMESTAMP', 'CA']).dropna()
+    actions = corporate_action_rows(with_ca.to_dict('records'))
+    out = df.reindex(columns=COMPANY_COLUMNS[:-2])
+    for column in COMPANY_NUMERIC_COLUMNS:
+        if not pd.api.types.is_numeric_dtype(out[column]):
+            out[column] = pd.to_numeric(out[column], errors="coerce")
+    dates = pd.to_datetime(out['CH_TIMESTAMP'], format="%Y-%m-%d", errors="coerce")
+    out['CH_TIMESTAMP'] = dates.dt.strftime('%Y-%m-%d')
+    out['index_type'] = index_type
+    out['index_name'] = index_name
+    return _to_sql_rows(out[dates.notna()]), actions
+
+
+def group_files(files):
+    """
+    Groups discovered files by folder so each parser task converts a whole symbol (or
+    index) at once, amortising the per-DataFrame overhead over many small CSVs.
+
+    Returns:
+        list: (kind, paths, index_name) tuples.
+    """
+    groups = {}
+    for kind, path, index_name in files:
+        groups.setdefault((kind, os.path.dirname(path), index_name), []).append(path)
+    return [(kind, paths, index_name) for (kind, _, index_name), paths in groups.items()]
+
+
+def parse_files(kind, paths, index_name):
+    """Process-pool entry point: returns (kind, rows, actions) for one group of files."""
+    if kind == "index":
+        return kind, parse_index_files(paths, index_name), []
+    return (kind, *parse_equity_files(paths, index_name))
+
+
+def load_directory(data_dir="data", db_path=DB_PATH, workers=None, kinds=("index", "equity")):
+    """
+    Rebuilds the database from the CSV tree without dropping anything.
+
+    Files are parsed in a process pool and the parsed batches are funnelled to a single
+    BulkWriter that upserts into stock_index_price_daily and stock_company_price_daily.
+    In SQLite, stock_company_price_adjusted is then brought up to date as well.
+
+    Args:
+        data_dir (str): Root of the CSV tree.
+        db_path (str): Path to the SQLite database or a PostgreSQL URL.
+        workers (int, optional): Number of parser processes. Defaults to the CPU count.
+        kinds (tuple): Which layouts to load ("index", "equity").
+
+    Returns:
+        tuple: (inserted, skipped) counts.
+    """
+    start_time = datetime.now()
+    files = [f for f in discover_files(data_dir) if f[0] in kinds]
+    groups = group_files(files)
+    print(f"Discovered {len(files)} files in {len(groups)} folders under {data_dir}.")
+
+    with open_writer(db_path, batch_size=200000) as writer:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(parse_files, *group): os.path.dirname(group[1][0]) for group in groups}
+            for future in as_completed(futures):
+                try:
+                    kind, rows, actions = future.result()
+                except Exception as e:
+                    print(f"An error occurred while processing {futures[future]}: {e}")
+                    continue
+                if kind == "index":
+                    writer.stage_index_rows(rows)
+                else:
+                    if actions:
+                        writer.record_corporate_actions(actions)
+                    writer.stage_company_rows(rows)
+
+    elapsed = (datetime.now() - start_time).total_seconds()
+    total = writer.inserted + writer.skipped
+    print(f"Loaded {total} rows ({writer.inserted} inserted, {writer.skipped} already present) "
+          f"in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/s).")
+    # The derived tables are maintained in SQLite only.
+    if "equity" in kinds and not is_postgres(db_path):
+        refresh_adjustments(db_path)
+    return writer.inserted, writer.skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load the CSV tree under data/ into the SQLite database.")
+    parser.add_argument("--data-dir", type=str, default="data", help="Root of the CSV tree.")
+    parser.add_argument("--db", type=str, default=DB_PATH, help="Path to the SQLite database or a PostgreSQL URL.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of parser processes.")
+    parser.add_argument("--only", type=str, choices=["index", "equity"], help="Load only one layout.")
+    args = parser.parse_args()
+
+    kinds = (args.only,) if args.only else ("index", "equity")
+    load_directory(args.data_dir, args.db, args.workers, kinds)
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from bulk_load import discover_files, load_directory
+from db_writer import connect
+from validation_test import hdfcbank_records
+
+
+def write_symbol(data_dir, index_folder, records, year):
+    folder = os.path.join(data_dir, index_folder, records[0]['CH_SYMBOL'])
+    os.makedirs(folder, exist_ok=True)
+    pd.DataFrame(records).to_csv(os.path.join(folder, f"{year}.csv"), index=False)
+
+
+def test_older_folders_load_under_the_registry_index_name(tmp_path):
+    data_dir = str(tmp_path / "data")
+    records = hdfcbank_records()
+    # The 25/50 folder predates the downloaders, which write the same symbols to NIFTY_FINANCIAL_SERVICES.
+    write_symbol(data_dir, os.path.join("NIFTY_FINANCIAL_SERVICES_25", "50"), records[:2], 2019)
+    write_symbol(data_dir, "NIFTY_FINANCIAL_SERVICES", records[2:], 2019)
+    assert {index_name for _, _, index_name in discover_files(data_dir)} == {"NIFTY FINANCIAL SERVICES"}
+
+    db_path = str(tmp_path / "stock.db")
+    assert load_directory(data_dir, db_path, workers=1) == (4, 0)
+    conn = connect(db_path)
+    try:
+        names = conn.execute("SELECT DISTINCT index_name FROM stock_company_price_daily").fetchall()
+        # The split's CA was loaded and the adjusted table refreshed in the same run.
+        factors = [row[0] for row in conn.execute(
+            "SELECT adj_factor FROM stock_company_price_adjusted WHERE CH_SYMBOL = 'HDFCBANK' ORDER BY date_key")]
+    finally:
+        conn.close()
+    assert names == [("NIFTY FINANCIAL SERVICES",)]
+    assert np.allclose(factors, [0.5, 0.5, 1, 1])
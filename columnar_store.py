@@ -0,0 +1,298 @@
+import os
+import glob
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; partitions are then only locked in-process.
+    fcntl = None
+
+STORE_DIR = os.path.join("data", "columnar")
+EQUITY_DATASET = "equity"
+INDEX_DATASET = "index"
+PARTITION_FILE = "part-0.parquet"
+
+# API column -> typed column kept in the columnar store. `_id`, `createdAt`, `updatedAt`,
+# `__v`, `CH_MARKET_TYPE` and the two redundant copies of the timestamp are dropped.
+EQUITY_COLUMNS = {
+    'CH_SERIES': 'series',
+    'CH_PREVIOUS_CLS_PRICE': 'prev_close',
+    'CH_OPENING_PRICE': 'open',
+    'CH_TRADE_HIGH_PRICE': 'high',
+    'CH_TRADE_LOW_PRICE': 'low',
+    'CH_LAST_TRADED_PRICE': 'last',
+    'CH_CLOSING_PRICE': 'close',
+    'VWAP': 'vwap',
+    'CH_TOT_TRADED_QTY': 'volume',
+    'CH_TOT_TRADED_VAL': 'traded_value',
+    'CH_TOTAL_TRADES': 'trades',
+    'CH_52WEEK_HIGH_PRICE': 'high_52w',
+    'CH_52WEEK_LOW_PRICE': 'low_52w',
+    'SLBMH_TOT_VAL': 'slbm_value',
+    'CH_ISIN': 'isin',
+    'CA': 'ca',
+}
+
+EQUITY_SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('series', pa.dictionary(pa.int8(), pa.string())),
+    ('prev_close', pa.float64()),
+    ('open', pa.float64()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('last', pa.float64()),
+    ('close', pa.float64()),
+    ('vwap', pa.float64()),
+    ('volume', pa.int64()),
+    ('traded_value', pa.float64()),
+    ('trades', pa.int64()),
+    ('high_52w', pa.float64()),
+    ('low_52w', pa.float64()),
+    ('slbm_value', pa.float64()),
+    ('isin', pa.dictionary(pa.int8(), pa.string())),
+    ('ca', pa.string()),
+])
+
+INDEX_SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('open', pa.float64()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close', pa.float64()),
+])
+
+# Concurrent writers (download workers, or several processes sharing a backfill journal)
+# may touch the same partition: threads serialise on an in-process lock and processes on
+# an flock of `.<partition>.lock`.
+_partition_locks = {}
+_partition_locks_guard = threading.Lock()
+
+PARTITIONING = {
+    EQUITY_DATASET: ds.partitioning(pa.schema([('index', pa.string()), ('symbol', pa.string()), ('year', pa.int16())]), flavor="hive"),
+    INDEX_DATASET: ds.partitioning(pa.schema([('index_name', pa.string()), ('year', pa.int16())]), flavor="hive"),
+}
+
+
+def equity_frame(data):
+    """
+    Converts NSE equity API rows (records or a DataFrame) into the typed columnar layout.
+
+    Returns:
+        pandas.DataFrame: One row per (symbol, date) with a `symbol` column and the
+        EQUITY_SCHEMA columns.
+    """
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    out = pd.DataFrame({
+        'symbol': df['CH_SYMBOL'].astype(str).str.upper(),
+        'date': pd.to_datetime(df['CH_TIMESTAMP'], format="%Y-%m-%d", errors="coerce").dt.date,
+    })
+    for source, target in EQUITY_COLUMNS.items():
+        column = df[source] if source in df else pd.Series(None, index=df.index, dtype=object)
+        target_type = EQUITY_SCHEMA.field(target).type
+        if pa.types.is_floating(target_type) or pa.types.is_integer(target_type):
+            column = pd.to_numeric(column.replace('', None), errors="coerce")
+            if pa.types.is_integer(target_type):
+                column = column.astype("Int64")
+        else:
+            column = column.astype(object).where(column.notna() & (column != ''), None)
+        out[target] = column
+    return out.dropna(subset=['date'])
+
+
+def index_frame(df):
+    """Converts index rows with date_key/open/high/low/close columns into the typed layout."""
+    return pd.DataFrame({
+        'index_name': df['index_name'],
+        'date': pd.to_datetime(df['date_key'], format="%Y-%m-%d", errors="coerce").dt.date,
+        'open': pd.to_numeric(df['open'], errors="coerce"),
+        'high': pd.to_numeric(df['high'], errors="coerce"),
+        'low': pd.to_numeric(df['low'], errors="coerce"),
+        'close': pd.to_numeric(df['close'], errors="coerce"),
+    }).dropna(subset=['date'])
+
+
+def _partition_dir(store_dir, dataset, keys):
+    return os.path.join(store_dir, dataset, *(f"{name}={value}" for name, value in keys))
+
+
+def _hidden(path, suffix):
+    """Sibling of `path` that dataset discovery skips (it ignores names starting with '.')."""
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{suffix}")
+
+
+@contextmanager
+def _file_lock(path):
+    """Holds an exclusive flock on `path` (a no-op where fcntl is unavailable)."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _merge_partition(path, df, schema):
+    """Merges `df` into the parquet file at `path`, keeping the newest row per date and series."""
+    with _partition_locks_guard:
+        lock = _partition_locks.setdefault(path, threading.Lock())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with lock, _file_lock(_hidden(path, "lock")):
+        return _merge_partition_locked(path, df, schema)
+
+
+def _merge_partition_locked(path, df, schema):
+    if os.path.exists(path):
+        existing = pq.read_table(path).to_pandas()
+        df = pd.concat([existing, df], ignore_index=True)
+    key = [name for name in ('date', 'series') if name in schema.names]
+    df = df.drop_duplicates(subset=key, keep='last').sort_values(key)
+    table = pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+    tmp_path = _hidden(path, f"{os.getpid()}.{threading.get_ident()}.tmp")
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+    return len(df)
+
+
+def write_equity(df, index, store_dir=STORE_DIR):
+    """
+    Writes typed equity rows (see `equity_frame`) into index/symbol/year partitions.
+
+    Existing partitions are merged rather than overwritten, so writes are idempotent.
+
+    Args:
+        df (pandas.DataFrame): Output of `equity_frame`.
+        index (str): The index folder name (e.g., "NIFTY_AUTO").
+        store_dir (str): Root directory of the columnar store.
+    """
+    if df.empty:
+        return
+    years = pd.to_datetime(df['date']).dt.year
+    for (symbol, year), part in df.groupby([df['symbol'], years]):
+        path = os.path.join(_partition_dir(store_dir, EQUITY_DATASET, [('index', index), ('symbol', symbol), ('year', year)]), PARTITION_FILE)
+        _merge_partition(path, part.drop(columns=['symbol']), EQUITY_SCHEMA)
+
+
+def write_index(df, store_dir=STORE_DIR):
+    """Writes typed index rows (see `index_frame`) into index_name/year partitions."""
+    if df.empty:
+        return
+    years = pd.to_datetime(df['date']).dt.year
+    for (index_name, year), part in df.groupby([df['index_name'], years]):
+        path = os.path.join(_partition_dir(store_dir, INDEX_DATASET, [('index_name', index_name), ('year', year)]), PARTITION_FILE)
+        _merge_partition(path, part.drop(columns=['index_name']), INDEX_SCHEMA)
+
+
+def _dataset(dataset, store_dir, subdir=None):
+    root = os.path.join(store_dir, dataset)
+    # Discovering a single index's subtree avoids listing every partition in the store.
+    path = os.path.join(root, subdir) if subdir else root
+    return ds.dataset(path, format="parquet", partitioning=PARTITIONING[dataset], partition_base_dir=root)
+
+
+def _date_filter(start, end):
+    expression = None
+    if start is not None:
+        start = pd.Timestamp(start)
+        expression = (ds.field('year') >= start.year) & (ds.field('date') >= pa.scalar(start.date(), pa.date32()))
+    if end is not None:
+        end = pd.Timestamp(end)
+        clause = (ds.field('year') <= end.year) & (ds.field('date') <= pa.scalar(end.date(), pa.date32()))
+        expression = clause if expression is None else expression & clause
+    return expression
+
+
+def _and(left, right):
+    return right if left is None else (left if right is None else left & right)
+
+
+def read_equity(index=None, symbols=None, start=None, end=None, columns=None, store_dir=STORE_DIR):
+    """
+    Reads equity rows with partition and column pushdown.
+
+    Args:
+        index (str, optional): Index folder name (e.g., "NIFTY_METAL").
+        symbols (list, optional): Restrict to these symbols.
+        start, end (optional): Inclusive date bounds (anything pandas can parse).
+        columns (list, optional): Columns to load; `symbol` and `date` are always included.
+        store_dir (str): Root directory of the columnar store.
+
+    Returns:
+        pandas.DataFrame sorted by symbol and date.
+    """
+    expression = _date_filter(start, end)
+    if index is not None:
+        expression = _and(expression, ds.field('index') == index)
+    if symbols:
+        expression = _and(expression, ds.field('symbol').isin([s.upper() for s in symbols]))
+    if columns is not None:
+        columns = ['symbol', 'date'] + [c for c in columns if c not in ('symbol', 'date')]
+    subdir = f"index={index}" if index is not None else None
+    table = _dataset(EQUITY_DATASET, store_dir, subdir).to_table(columns=columns, filter=expression)
+    return table.to_pandas().sort_values(['symbol', 'date'], ignore_index=True)
+
+
+def read_index(names=None, start=None, end=None, columns=None, store_dir=STORE_DIR):
+    """Reads index rows with partition and column pushdown; see `read_equity`."""
+    expression = _date_filter(start, end)
+    if names:
+        expression = _and(expression, ds.field('index_name').isin(list(names)))
+    if columns is not None:
+        columns = ['index_name', 'date'] + [c for c in columns if c not in ('index_name', 'date')]
+    table = _dataset(INDEX_DATASET, store_dir).to_table(columns=columns, filter=expression)
+    return table.to_pandas().sort_values(['index_name', 'date'], ignore_index=True)
+
+
+def convert_data_tree(data_dir="data", store_dir=STORE_DIR):
+    """
+    One-shot conversion of the legacy CSV tree into the columnar store.
+
+    Reads `data/<INDEX>/<SYMBOL>/*.csv` (equity) and `data/INDEX_DATA/<NAME>/*.csv` (index).
+    """
+    start_time = datetime.now()
+    equity_rows = 0
+    for index_dir in sorted(glob.glob(os.path.join(data_dir, "NIFTY*"))):
+        index = os.path.basename(index_dir)
+        files = glob.glob(os.path.join(index_dir, "**", "*.csv"), recursive=True)
+        if not files:
+            continue
+        frames = [pd.read_csv(path, dtype=str, keep_default_na=False) for path in files]
+        df = equity_frame(pd.concat(frames, ignore_index=True))
+        write_equity(df, index, store_dir)
+        equity_rows += len(df)
+        print(f"Converted {len(files)} files ({len(df)} rows) for {index}.")
+
+    index_rows = 0
+    for index_dir in sorted(glob.glob(os.path.join(data_dir, "INDEX_DATA", "*"))):
+        files = glob.glob(os.path.join(index_dir, "*.csv"))
+        if not files:
+            continue
+        df = pd.concat([pd.read_csv(path) for path in files], ignore_index=True)
+        df['index_name'] = os.path.basename(index_dir)
+        df = index_frame(df)
+        write_index(df, store_dir)
+        index_rows += len(df)
+        print(f"Converted {len(files)} files ({len(df)} rows) for index {os.path.basename(index_dir)}.")
+
+    print(f"Converted {equity_rows} equity rows and {index_rows} index rows in {datetime.now() - start_time}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar (Parquet) store for NSE data.")
+    parser.add_argument("command", choices=["convert"], help="'convert' migrates the CSV tree under --data-dir.")
+    parser.add_argument("--data-dir", type=str, default="data", help="Root of the legacy CSV tree.")
+    parser.add_argument("--store-dir", type=str, default=STORE_DIR, help="Root of the columnar store.")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert_data_tree(args.data_dir, args.store_dir)
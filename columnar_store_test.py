@@ -0,0 +1,21 @@
+import os
+import glob
+
+from columnar_store import equity_frame, write_equity, read_equity
+
+
+def record(day, series, close):
+    return {'CH_SYMBOL': 'infy', 'CH_TIMESTAMP': day, 'CH_SERIES': series, 'CH_CLOSING_PRICE': close}
+
+
+def test_write_equity_merges_and_keeps_each_series(tmp_path):
+    store = str(tmp_path)
+    write_equity(equity_frame([record('2024-01-01', 'EQ', 1), record('2024-01-02', 'EQ', 2)]), 'NIFTY_IT', store)
+    write_equity(equity_frame([record('2024-01-02', 'EQ', 3), record('2024-01-02', 'BE', 4)]), 'NIFTY_IT', store)
+
+    df = read_equity(index='NIFTY_IT', store_dir=store)
+    assert sorted(zip(df['date'].astype(str), df['series'].astype(str), df['close'])) == [
+        ('2024-01-01', 'EQ', 1.0), ('2024-01-02', 'BE', 4.0), ('2024-01-02', 'EQ', 3.0),
+    ]
+    partition = os.path.join(store, 'equity', 'index=NIFTY_IT', 'symbol=INFY', 'year=2024')
+    assert not glob.glob(os.path.join(partition, '*.tmp')) and not glob.glob(os.path.join(partition, '.*.tmp'))
@@ -0,0 +1,453 @@
+import ast
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+from create_db import INDEX_TABLE_DDL, COMPANY_TABLE_DDL
+from schema_v2 import SCHEMA_VERSION, schema_version, upgrade, write_company_rows, write_index_rows
+from metrics import METRICS, INSERT
+
+DB_PATH = "stock.db"
+
+# WAL lets readers (e.g. the dashboard) keep working during a backfill, and
+# synchronous=NORMAL is durable across application crashes in WAL mode.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+
+COMPANY_COLUMNS = [
+    'CH_SYMBOL', 'CH_SERIES', 'CH_TIMESTAMP', 'TIMESTAMP', 'mTIMESTAMP',
+    'CH_PREVIOUS_CLS_PRICE', 'CH_OPENING_PRICE', 'CH_TRADE_HIGH_PRICE',
+    'CH_TRADE_LOW_PRICE', 'CH_LAST_TRADED_PRICE', 'CH_CLOSING_PRICE', 'VWAP',
+    'CH_TOT_TRADED_QTY', 'CH_TOT_TRADED_VAL', 'CH_TOTAL_TRADES',
+    'CH_52WEEK_HIGH_PRICE', 'CH_52WEEK_LOW_PRICE', 'SLBMH_TOT_VAL', 'index_type', 'index_name'
+]
+
+COMPANY_NUMERIC_COLUMNS = [
+    'CH_PREVIOUS_CLS_PRICE', 'CH_OPENING_PRICE', 'CH_TRADE_HIGH_PRICE', 'CH_TRADE_LOW_PRICE',
+    'CH_LAST_TRADED_PRICE', 'CH_CLOSING_PRICE', 'VWAP', 'CH_TOT_TRADED_QTY', 'CH_TOT_TRADED_VAL',
+    'CH_TOTAL_TRADES', 'CH_52WEEK_HIGH_PRICE', 'CH_52WEEK_LOW_PRICE', 'SLBMH_TOT_VAL'
+]
+
+INDEX_COLUMNS = ['index_name', 'open', 'high', 'low', 'close', 'date_key', 'index_type']
+
+COMPANY_INSERT_SQL = f"""
+    INSERT INTO stock_company_price_daily ({', '.join(COMPANY_COLUMNS)})
+    VALUES ({', '.join('?' * len(COMPANY_COLUMNS))})
+    ON CONFLICT DO NOTHING
+"""
+
+# Per-index and per-(index, symbol) row counts and date ranges, maintained by BulkWriter
+# so summaries never need a GROUP BY over the fact tables. CH_SYMBOL is '' for index rows.
+SUMMARY_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS data_summary (
+        table_name TEXT,
+        index_name TEXT,
+        CH_SYMBOL TEXT,
+        record_count INTEGER,
+        from_date TEXT,
+        to_date TEXT,
+        PRIMARY KEY (table_name, index_name, CH_SYMBOL)
+    ) WITHOUT ROWID
+"""
+
+# Key/value bookkeeping; `write_counter` is bumped by every write that inserts rows, so
+# readers can cache anything derived from the fact tables until it changes.
+DB_META_DDL = """
+    CREATE TABLE IF NOT EXISTS db_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER
+    )
+"""
+
+# Historical windows the equity API answered with no rows (suspensions, pre-listing
+# ranges, holidays the calendar does not know), so the planner stops asking for them.
+EMPTY_WINDOWS_DDL = """
+    CREATE TABLE IF NOT EXISTS empty_windows (
+        CH_SYMBOL TEXT,
+        index_name TEXT,
+        from_date TEXT,
+        to_date TEXT,
+        PRIMARY KEY (CH_SYMBOL, index_name, from_date, to_date)
+    ) WITHOUT ROWID
+"""
+
+EMPTY_WINDOWS_INSERT_SQL = """
+    INSERT INTO empty_windows (CH_SYMBOL, index_name, from_date, to_date)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+
+# Corporate actions NSE attaches to equity rows (the CA field), one row per action and
+# ex-date; adjustments.py derives split, bonus and consolidation ratios from the subject.
+CORPORATE_ACTIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS corporate_actions (
+        CH_SYMBOL TEXT,
+        ex_date TEXT,
+        subject TEXT,
+        PRIMARY KEY (CH_SYMBOL, ex_date, subject)
+    ) WITHOUT ROWID
+"""
+
+CORPORATE_ACTIONS_INSERT_SQL = """
+    INSERT INTO corporate_actions (CH_SYMBOL, ex_date, subject)
+    VALUES (?, ?, ?)
+    ON CONFLICT DO NOTHING
+"""
+
+INDEX_SUMMARY_SQL = """
+    INSERT OR REPLACE INTO data_summary
+    SELECT 'stock_index_price_daily', index_name, '', COUNT(*), MIN(date_key), MAX(date_key)
+    FROM stock_index_price_daily {where} GROUP BY index_name
+"""
+
+COMPANY_SUMMARY_SQL = """
+    INSERT OR REPLACE INTO data_summary
+    SELECT 'stock_company_price_daily', index_name, CH_SYMBOL, COUNT(*), MIN(CH_TIMESTAMP), MAX(CH_TIMESTAMP)
+    FROM stock_company_price_daily {where} GROUP BY index_name, CH_SYMBOL
+"""
+
+# The dashboard's overview queries; they read only data_summary.
+INDEX_OVERVIEW_QUERY = """
+    SELECT index_name, record_count, from_date, to_date
+    FROM data_summary
+    WHERE table_name = 'stock_index_price_daily'
+    ORDER BY index_name;
+"""
+
+EQUITY_OVERVIEW_QUERY = """
+    SELECT index_name, COUNT(*) AS symbol_count, SUM(record_count) AS record_count,
+           MIN(from_date) AS from_date, MAX(to_date) AS to_date
+    FROM data_summary
+    WHERE table_name = 'stock_company_price_daily'
+    GROUP BY index_name
+    ORDER BY index_name;
+"""
+
+INDEX_INSERT_SQL = f"""
+    INSERT INTO stock_index_price_daily ({', '.join(INDEX_COLUMNS)})
+    VALUES ({', '.join('?' * len(INDEX_COLUMNS))})
+    ON CONFLICT DO NOTHING
+"""
+
+
+def connect(db_path=DB_PATH, check_same_thread=True):
+    """Opens a SQLite connection with the bulk-load pragmas applied and the tables ensured."""
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=check_same_thread)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.execute(INDEX_TABLE_DDL)
+    conn.execute(COMPANY_TABLE_DDL)
+    conn.execute(SUMMARY_TABLE_DDL)
+    conn.execute(DB_META_DDL)
+    conn.execute(EMPTY_WINDOWS_DDL)
+    conn.execute(CORPORATE_ACTIONS_DDL)
+    conn.commit()
+    # Databases written before the summary existed get it built once.
+    if not conn.execute("SELECT EXISTS (SELECT 1 FROM data_summary)").fetchone()[0]:
+        with conn:
+            refresh_summary(conn)
+    return conn
+
+
+def refresh_summary(conn, index_names=None, company_keys=None):
+    """
+    Recomputes data_summary rows from the fact tables.
+
+    With no keys the whole summary is rebuilt; otherwise only the given indices and
+    (CH_SYMBOL, index_name) pairs are recomputed, each through its primary-key prefix.
+    The caller owns the transaction.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection.
+        index_names (iterable, optional): index_name values of stock_index_price_daily.
+        company_keys (iterable, optional): (CH_SYMBOL, index_name) pairs of stock_company_price_daily.
+    """
+    if index_names is None and company_keys is None:
+        conn.execute("DELETE FROM data_summary")
+        conn.execute(INDEX_SUMMARY_SQL.format(where=""))
+        conn.execute(COMPANY_SUMMARY_SQL.format(where=""))
+        return
+    if index_names:
+        conn.executemany(INDEX_SUMMARY_SQL.format(where="WHERE index_name = ?"), [(name,) for name in index_names])
+    if company_keys:
+        conn.executemany(COMPANY_SUMMARY_SQL.format(where="WHERE CH_SYMBOL = ? AND index_name = ?"), list(company_keys))
+
+
+def bump_write_counter(conn):
+    """
+    Increments db_meta.write_counter; call inside the transaction that wrote the rows.
+
+    Returns:
+        int: The new counter value.
+    """
+    conn.execute("""
+        INSERT INTO db_meta (key, value) VALUES ('write_counter', 1)
+        ON CONFLICT (key) DO UPDATE SET value = value + 1
+    """)
+    return conn.execute("SELECT value FROM db_meta WHERE key = 'write_counter'").fetchone()[0]
+
+
+def write_counter(conn):
+    """Returns the current write counter (0 for a database that has never been written)."""
+    try:
+        row = conn.execute("SELECT value FROM db_meta WHERE key = 'write_counter'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+# In-process write notifications: callback(db_path, counter, touched) runs after every
+# committed write, where `touched` maps a table name to the instruments (index names or
+# symbols) that received rows.
+_write_listeners = []
+_write_listeners_lock = threading.Lock()
+
+
+def add_write_listener(callback):
+    """Registers `callback(db_path, counter, touched)` to run after every committed write."""
+    with _write_listeners_lock:
+        _write_listeners.append(callback)
+
+
+def remove_write_listener(callback):
+    with _write_listeners_lock:
+        if callback in _write_listeners:
+            _write_listeners.remove(callback)
+
+
+def notify_write(db_path, counter, touched):
+    """
+    Tells the registered listeners that rows were committed.
+
+    Args:
+        db_path (str): Database the rows went to (SQLite path or PostgreSQL URL).
+        counter (int): Write counter after the write (see `bump_write_counter`).
+        touched (dict): Table name -> set of index names or symbols written.
+    """
+    with _write_listeners_lock:
+        listeners = list(_write_listeners)
+    for callback in listeners:
+        callback(db_path, counter, touched)
+
+
+def iter_company_rows(data, index_name, index_type='sectoral'):
+    """
+    Converts NSE equity API records into stock_company_price_daily tuples one at a time.
+
+    Args:
+        data (iterable): Dictionaries, one per row of API data; may be a generator.
+        index_name (str): The index the symbol is tracked under (e.g., "NIFTY METAL").
+        index_type (str, optional): Defaults to 'sectoral'.
+    """
+    for row in data:
+        values = []
+        for key in COMPANY_COLUMNS[:-2]:
+            value = row.get(key)
+            # Handle empty strings for numeric fields
+            if value == '' and key in COMPANY_NUMERIC_COLUMNS:
+                value = None
+            values.append(value)
+        values.append(index_type)
+        values.append(index_name)
+        yield tuple(values)
+
+
+def company_rows(data, index_name, index_type='sectoral'):
+    """Like `iter_company_rows`, but returns the tuples as a list."""
+    return list(iter_company_rows(data, index_name, index_type))
+
+
+def parse_ca(value):
+    """
+    Returns the actions of one CA field as a list of dicts.
+
+    The API sends a list of dicts (or nothing); CSVs written from API records hold its
+    Python repr, and other tools may have stored it as JSON.
+    """
+    if not value or not isinstance(value, (str, list)):
+        return []
+    if isinstance(value, list):
+        return value
+    try:
+        actions = json.loads(value)
+    except ValueError:
+        try:
+            actions = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return []
+    return actions if isinstance(actions, list) else []
+
+
+def corporate_action_rows(data):
+    """
+    Extracts (CH_SYMBOL, ex_date, subject) tuples from the CA field of NSE equity records.
+
+    The ex-date is the date of the row that carries the action, which is how NSE reports
+    it; records without a CA field yield nothing.
+
+    Args:
+        data (iterable): Dictionaries, one per row of API data.
+    """
+    rows = set()
+    for record in data:
+        for action in parse_ca(record.get('CA')):
+            subject = action.get('subject') if isinstance(action, dict) else None
+            if subject and record.get('CH_SYMBOL') and record.get('CH_TIMESTAMP'):
+                rows.add((record['CH_SYMBOL'], record['CH_TIMESTAMP'], subject.strip()))
+    return sorted(rows)
+
+
+def index_rows(data, index_type='sectoral'):
+    """
+    Converts niftyindices historical records into stock_index_price_daily tuples.
+
+    Args:
+        data (list): Records with INDEX_NAME, OPEN, HIGH, LOW, CLOSE and HistoricalDate keys.
+        index_type (str, optional): Defaults to 'sectoral'.
+    """
+    rows = []
+    for record in data:
+        # Transform date format
+        try:
+            date_key = datetime.strptime(record['HistoricalDate'], '%d %b %Y').strftime('%Y-%m-%d')
+        except ValueError:
+            print(f"Could not parse date: {record['HistoricalDate']}. Skipping row.")
+            continue
+
+        rows.append((
+            record['INDEX_NAME'].upper(),
+            float(record['OPEN']),
+            float(record['HIGH']),
+            float(record['LOW']),
+            float(record['CLOSE']),
+            date_key,
+            index_type
+        ))
+    return rows
+
+
+class BulkWriter:
+    """
+    Stages rows in memory and writes them with executemany + ON CONFLICT DO NOTHING.
+
+    Many chunks are grouped into one transaction; a flush happens whenever `batch_size`
+    rows are staged, on `flush()`, and on `close()`. The writer is thread-safe so several
+    download workers can share one instance.
+    """
+
+    def __init__(self, db_path=DB_PATH, batch_size=50000):
+        """
+        Args:
+            db_path (str): Path to the SQLite database.
+            batch_size (int): Number of staged rows that triggers a flush.
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.inserted = 0
+        self.skipped = 0
+        self._staged = {COMPANY_INSERT_SQL: [], INDEX_INSERT_SQL: []}
+        self._staged_count = 0
+        self._lock = threading.RLock()
+        self._conn = connect(db_path, check_same_thread=False)
+        # Migrated databases (schema v2+) expose the original tables as read-only views.
+        version = schema_version(self._conn)
+        if 2 <= version < SCHEMA_VERSION:
+            upgrade(self._conn)
+        self._v2 = version >= 2
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _stage(self, sql, rows):
+        with self._lock:
+            self._staged[sql].extend(rows)
+            self._staged_count += len(rows)
+            if self._staged_count >= self.batch_size:
+                self.flush()
+
+    def stage_company_rows(self, rows):
+        """Stages stock_company_price_daily tuples (see `company_rows`)."""
+        self._stage(COMPANY_INSERT_SQL, rows)
+
+    def stage_index_rows(self, rows):
+        """Stages stock_index_price_daily tuples in INDEX_COLUMNS order."""
+        self._stage(INDEX_INSERT_SQL, rows)
+
+    def record_empty_windows(self, windows):
+        """
+        Records (CH_SYMBOL, index_name, from_date, to_date) windows that returned no rows.
+
+        Dates are 'YYYY-MM-DD'. They are written at once rather than staged; empty windows
+        are rare and the planner should see them even if the run dies before a flush.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(EMPTY_WINDOWS_INSERT_SQL, windows)
+
+    def record_corporate_actions(self, actions):
+        """Records (CH_SYMBOL, ex_date, subject) tuples (see `corporate_action_rows`) at once."""
+        with self._lock, self._conn:
+            self._conn.executemany(CORPORATE_ACTIONS_INSERT_SQL, actions)
+
+    def flush(self):
+        """
+        Writes all staged rows in a single transaction.
+
+        Returns:
+            tuple: (inserted, skipped) counts for this flush.
+        """
+        with self._lock:
+            if not self._staged_count:
+                return 0, 0
+            staged_count = self._staged_count
+            counter = None
+            with METRICS.timer(INSERT), self._conn:
+                if self._v2:
+                    inserted = (write_company_rows(self._conn, self._staged[COMPANY_INSERT_SQL])
+                                + write_index_rows(self._conn, self._staged[INDEX_INSERT_SQL]))
+                else:
+                    before = self._conn.total_changes
+                    for sql, rows in self._staged.items():
+                        if rows:
+                            self._conn.executemany(sql, rows)
+                    inserted = self._conn.total_changes - before
+                if inserted:
+                    # Keep the summary and write counter in the same transaction as the rows.
+                    refresh_summary(
+                        self._conn,
+                        index_names={row[0] for row in self._staged[INDEX_INSERT_SQL]},
+                        company_keys={(row[0], row[-1]) for row in self._staged[COMPANY_INSERT_SQL]},
+                    )
+                    counter = bump_write_counter(self._conn)
+            if counter is not None:
+                notify_write(self.db_path, counter, {
+                    "stock_company_price_daily": {row[0] for row in self._staged[COMPANY_INSERT_SQL]},
+                    "stock_index_price_daily": {row[0] for row in self._staged[INDEX_INSERT_SQL]},
+                })
+            skipped = staged_count - inserted
+            METRICS.inc("nse_rows_inserted_total", inserted, backend="sqlite")
+            METRICS.inc("nse_rows_skipped_total", skipped, backend="sqlite")
+            self.inserted += inserted
+            self.skipped += skipped
+            for rows in self._staged.values():
+                rows.clear()
+            self._staged_count = 0
+            return inserted, skipped
+
+    def close(self):
+        """Flushes any staged rows and closes the connection."""
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self.flush()
+            finally:
+                self._conn.close()
+                self._conn = None
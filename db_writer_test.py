@@ -0,0 +1,59 @@
+from db_writer import BulkWriter, connect, company_rows, index_rows, write_counter
+
+
+def equity_record(day, close=100.0):
+    return {
+        'CH_SYMBOL': 'INFY', 'CH_SERIES': 'EQ', 'CH_TIMESTAMP': day,
+        'CH_PREVIOUS_CLS_PRICE': close, 'CH_OPENING_PRICE': close, 'CH_TRADE_HIGH_PRICE': close,
+        'CH_TRADE_LOW_PRICE': close, 'CH_LAST_TRADED_PRICE': close, 'CH_CLOSING_PRICE': close,
+        'CH_TOT_TRADED_QTY': '',
+    }
+
+
+def index_record(day):
+    return {'INDEX_NAME': 'Nifty 50', 'OPEN': '1', 'HIGH': '2', 'LOW': '0.5', 'CLOSE': '1.5', 'HistoricalDate': day}
+
+
+def test_company_rows_blank_numeric_becomes_null():
+    row = company_rows([equity_record('2024-01-01')], 'NIFTY IT')[0]
+    assert row[0] == 'INFY'
+    assert row[-2:] == ('sectoral', 'NIFTY IT')
+    assert row[12] is None  # CH_TOT_TRADED_QTY
+
+
+def test_index_rows_skips_unparseable_dates():
+    rows = index_rows([index_record('01 Jan 2024'), index_record('2024-01-02')])
+    assert rows == [('NIFTY 50', 1.0, 2.0, 0.5, 1.5, '2024-01-01', 'sectoral')]
+
+
+def test_bulk_writer_is_idempotent(tmp_path):
+    db_path = str(tmp_path / "stock.db")
+    rows = company_rows([equity_record('2024-01-01'), equity_record('2024-01-02')], 'NIFTY IT')
+    with BulkWriter(db_path) as writer:
+        writer.stage_company_rows(rows)
+        writer.stage_index_rows(index_rows([index_record('01 Jan 2024')]))
+    assert (writer.inserted, writer.skipped) == (3, 0)
+
+    with BulkWriter(db_path) as writer:
+        writer.stage_company_rows(rows)
+    assert (writer.inserted, writer.skipped) == (0, 2)
+
+    conn = connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM stock_company_price_daily").fetchone()[0] == 2
+    # A write that inserts nothing leaves the counter alone.
+    assert write_counter(conn) == 1
+    conn.close()
+
+
+def test_bulk_writer_maintains_summary(tmp_path):
+    db_path = str(tmp_path / "stock.db")
+    with BulkWriter(db_path, batch_size=1) as writer:
+        writer.stage_company_rows(company_rows([equity_record('2024-01-02')], 'NIFTY IT'))
+        writer.stage_company_rows(company_rows([equity_record('2024-01-01')], 'NIFTY IT'))
+    conn = connect(db_path)
+    summary = conn.execute(
+        "SELECT record_count, from_date, to_date FROM data_summary WHERE CH_SYMBOL = 'INFY'"
+    ).fetchone()
+    assert summary == (2, '2024-01-01', '2024-01-02')
+    assert write_counter(conn) == 2
+    conn.close()
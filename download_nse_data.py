@@ -1,70 +1,162 @@
-import requests
-import pandas as pd
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
 import sqlite3
 import os
 
-def insert_data_to_db(data, index_name):
+from nse_client import SessionPool, HostLimiter, fetch_equity_chunk, EQUITY_API_URL
+from db_writer import company_rows, corporate_action_rows
+from streaming import ExternalSorter, CsvAppendWriter
+from storage import open_writer, is_postgres
+from response_cache import ResponseCache, OfflineCacheMiss, CACHE_DIR, is_historical
+from planner import plan_requests
+from scheduler import RequestScheduler, scheduler_from_args
+from journal import Journal, run_units, print_status, JOURNAL_PATH
+import scheduler
+import columnar_store
+import registry
+from adjustments import refresh_adjustments
+import metrics
+from metrics import METRICS, TRANSFORM, EXPORT
+
+def insert_data_to_db(data, index_name, writer=None, db_path="stock.db"):
     """
-    Inserts data directly from API response into the stock_company_price_daily table.
+    Inserts data directly from API response into the stock_company_price_daily table,
+    and the corporate actions in its CA field into corporate_actions.
 
     Args:
         data (list): A list of dictionaries, where each dictionary is a row of data.
+        index_name (str): The index the rows belong to (e.g., "NIFTY METAL").
+        writer (BulkWriter, optional): Shared writer that batches many chunks into one
+            transaction. If omitted, the rows are written and committed immediately.
+        db_path (str): SQLite database or PostgreSQL URL used when no writer is given.
+
+    Returns:
+        tuple: (inserted, skipped) counts. With a shared writer the rows are only staged,
+        so (0, 0) is returned until the writer flushes.
     """
-    db_path = "stock.db"
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        data_to_insert = []
-        for row in data:
-            # Handle empty strings for numeric fields
-            for key in ['CH_PREVIOUS_CLS_PRICE', 'CH_OPENING_PRICE', 'CH_TRADE_HIGH_PRICE', 'CH_TRADE_LOW_PRICE', 'CH_LAST_TRADED_PRICE', 'CH_CLOSING_PRICE', 'VWAP', 'CH_TOT_TRADED_QTY', 'CH_TOT_TRADED_VAL', 'CH_TOTAL_TRADES', 'CH_52WEEK_HIGH_PRICE', 'CH_52WEEK_LOW_PRICE', 'SLBMH_TOT_VAL']:
-                if row[key] == '':
-                    row[key] = None
-            
-            data_to_insert.append((
-                row['CH_SYMBOL'], row['CH_SERIES'], row['CH_TIMESTAMP'], row['TIMESTAMP'], row['mTIMESTAMP'],
-                row['CH_PREVIOUS_CLS_PRICE'], row['CH_OPENING_PRICE'], row['CH_TRADE_HIGH_PRICE'],
-                row['CH_TRADE_LOW_PRICE'], row['CH_LAST_TRADED_PRICE'], row['CH_CLOSING_PRICE'], row['VWAP'],
-                row['CH_TOT_TRADED_QTY'], row['CH_TOT_TRADED_VAL'], row['CH_TOTAL_TRADES'],
-                row['CH_52WEEK_HIGH_PRICE'], row['CH_52WEEK_LOW_PRICE'], row['SLBMH_TOT_VAL'],
-                'sectoral',
-                index_name
-            ))
-
-        inserted_count = 0
-        for record in data_to_insert:
-            try:
-                cursor.execute("""
-                    INSERT INTO stock_company_price_daily (
-                        CH_SYMBOL, CH_SERIES, CH_TIMESTAMP, TIMESTAMP, mTIMESTAMP,
-                        CH_PREVIOUS_CLS_PRICE, CH_OPENING_PRICE, CH_TRADE_HIGH_PRICE,
-                        CH_TRADE_LOW_PRICE, CH_LAST_TRADED_PRICE, CH_CLOSING_PRICE, VWAP,
-                        CH_TOT_TRADED_QTY, CH_TOT_TRADED_VAL, CH_TOTAL_TRADES,
-                        CH_52WEEK_HIGH_PRICE, CH_52WEEK_LOW_PRICE, SLBMH_TOT_VAL, index_type, index_name
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, record)
-                inserted_count += 1
-            except sqlite3.IntegrityError:
-                print(f"Skipping duplicate record for {record[0]} on {record[2]}.")
-
-        conn.commit()
-        print(f"Successfully inserted {inserted_count} rows into the database.")
+    with METRICS.timer(TRANSFORM):
+        rows = company_rows(data, index_name)
+        actions = corporate_action_rows(data)
+    if writer is not None:
+        if actions:
+            writer.record_corporate_actions(actions)
+        writer.stage_company_rows(rows)
+        return 0, 0
 
+    try:
+        with open_writer(db_path) as own_writer:
+            if actions:
+                own_writer.record_corporate_actions(actions)
+            own_writer.stage_company_rows(rows)
+            inserted, skipped = own_writer.flush()
+        print(f"Successfully inserted {inserted} rows into the database ({skipped} duplicates skipped).")
+        return inserted, skipped
     except sqlite3.Error as e:
         print(f"Database error during insertion: {e}")
     except Exception as e:
         print(f"An unexpected error occurred during insertion: {e}")
-    finally:
-        if conn:
-            conn.close()
+    return 0, 0
+
+def record_empty_window(symbol, index_name, start_dt, end_dt, writer=None, db_path="stock.db"):
+    """
+    Remembers that a historical window returned no rows so the gap planner skips it.
+
+    Args:
+        symbol (str): The stock symbol.
+        index_name (str): The index the symbol is tracked under (e.g., "NIFTY METAL").
+        start_dt, end_dt (datetime): First and last day of the window.
+        writer (BulkWriter, optional): Shared writer; a private one is opened if omitted.
+        db_path (str): SQLite database or PostgreSQL URL used when no writer is given.
+    """
+    window = [(symbol, index_name, start_dt.strftime("%Y-%m-%d"), end_dt.strftime("%Y-%m-%d"))]
+    if writer is not None:
+        writer.record_empty_windows(window)
+        return
+    with open_writer(db_path) as own_writer:
+        own_writer.record_empty_windows(window)
+
+class ParquetSink:
+    """
+    Streams one symbol's records into the columnar store.
+
+    Records are buffered only until the download moves past their calendar year, then
+    written to that year's partition, so at most about a year of rows is held however
+    long the requested range is.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.rows = 0
+        self._buffer = []
+        self._year = None
+
+    def add(self, records, window_start):
+        # Windows run forward in time, so a window starting in a later year means every
+        # buffered year is complete (write_equity merges any overlap into the partition).
+        if self._year is not None and window_start.year > self._year:
+            self.flush()
+        if self._year is None:
+            self._year = window_start.year
+        self._buffer.extend(records)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        with METRICS.timer(EXPORT):
+            columnar_store.write_equity(columnar_store.equity_frame(self._buffer), self.index)
+        METRICS.inc("nse_rows_exported_total", len(self._buffer), format="parquet")
+        self.rows += len(self._buffer)
+        self._buffer = []
+        self._year = None
+
+    def close(self):
+        self.flush()
+        return self.rows
+
 
-def download_nse_data(index, index_name,symbol, from_date, to_date, series="EQ"):
+class CsvSink:
+    """
+    Writes one symbol's records to a single CSV, newest first.
+
+    Records go through an ExternalSorter, which spills sorted runs to temporary files,
+    and are appended to the CSV from the merged runs when the sink is closed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._sorter = ExternalSorter(key=lambda record: record.get('CH_TIMESTAMP') or '', reverse=True)
+
+    def add(self, records, window_start):
+        self._sorter.add(records)
+
+    def close(self):
+        if not self._sorter.count:
+            return 0
+        with METRICS.timer(EXPORT):
+            tmp = f"{self.path}.tmp"
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            out = CsvAppendWriter(tmp)
+            try:
+                out.write(self._sorter)
+            finally:
+                out.close()
+                self._sorter.close()
+            os.replace(tmp, self.path)
+        METRICS.inc("nse_rows_exported_total", out.rows, format="csv")
+        return out.rows
+
+
+def download_nse_data(index, index_name,symbol, from_date, to_date, series="EQ", pool=None, limiter=None, writer=None, cache=None, file_format="parquet", scheduler=None):
     """
     Downloads historical data for a given symbol from the NSE India API.
-    Splits the date range into 60-day chunks to bypass API limitations and saves to a single CSV.
+    Splits the date range into windows sized by the scheduler (starting at 60 days and
+    adapting to what the API accepts) and saves the rows to the columnar store (or, with
+    file_format="csv", to a single CSV).
+
+    Each window is decoded as it arrives, staged for the database and handed to the file
+    sink before the next one is fetched, so memory stays flat however long the range is.
 
     Args:
         index (str): The index name (e.g., "NIFTY_AUTO").
@@ -72,96 +164,243 @@ def download_nse_data(index, index_name,symbol, from_date, to_date, series="EQ")
         from_date (str): The start date in DD-MM-YYYY format.
         to_date (str): The end date in DD-MM-YYYY format.
         series (str, optional): The series type. Defaults to "EQ".
+        pool (SessionPool, optional): Shared warmed sessions. A private pool is used if omitted.
+        limiter (HostLimiter, optional): Shared per-host limiter, used when no scheduler is given.
+        writer (BulkWriter, optional): Shared bulk writer used for database inserts.
+        cache (ResponseCache, optional): On-disk response cache for historical windows.
+        file_format (str, optional): "parquet" (columnar store) or "csv". Defaults to "parquet".
+        scheduler (RequestScheduler, optional): Shared retry, pacing and window-size policy.
+
+    Returns:
+        tuple: (rows, failed) where rows is the number of records fetched and failed lists
+        the (from_date, to_date, error) windows that could not be fetched.
     """
     from_dt = datetime.strptime(from_date, "%d-%m-%Y")
     to_dt = datetime.strptime(to_date, "%d-%m-%Y")
-    
-    current_dt = from_dt
-    all_data = []
-
-    while current_dt <= to_dt:
-        chunk_end_dt = current_dt + pd.DateOffset(days=60)
-        if chunk_end_dt > to_dt:
-            chunk_end_dt = to_dt
-            
-        from_chunk = current_dt.strftime("%d-%m-%Y")
-        to_chunk = chunk_end_dt.strftime("%d-%m-%Y")
-        
-        print(f"Fetching data for {symbol} from {from_chunk} to {to_chunk}...")
-        
-        base_url = "https://www.nseindia.com/api/historical/cm/equity"
-        url = f"{base_url}?symbol={symbol}&series=[%22{series}%22]&from={from_chunk}&to={to_chunk}"
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
-            'Accept': 'application/json, text/javascript, */*; q=0.01',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Referer': f'https://www.nseindia.com/get-quotes/equity?symbol={symbol}',
-            'X-Requested-With': 'XMLHttpRequest'
-        }
-
-        try:
-            session = requests.Session()
-            session.get("https://www.nseindia.com", headers=headers)
-            
-            response = session.get(url, headers=headers)
-            response.raise_for_status()
-
-            data = response.json()
-
-            if 'data' in data and data['data']:
-                all_data.extend(data['data'])
-                insert_data_to_db(data['data'], index_name)
-            else:
-                print(f"No data found for the period {from_chunk} to {to_chunk}.")
-
-        except requests.exceptions.RequestException as e:
-            print(f"An error occurred: {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-            
-        current_dt = chunk_end_dt + pd.DateOffset(days=1)
-
-    if all_data:
-        combined_df = pd.DataFrame(all_data)
-        combined_df = combined_df.sort_values(by='CH_TIMESTAMP', ascending=False)
-        
+
+    own_pool = pool is None
+    if own_pool:
+        pool = SessionPool(size=1)
+    if scheduler is None:
+        scheduler = RequestScheduler(limiter)
+
+    if file_format == "parquet":
+        sink = ParquetSink(index)
+    else:
         folder = os.path.join("data", index, symbol.upper())
-        os.makedirs(folder, exist_ok=True)
-        
         filename = os.path.join(folder, f"{symbol}_{from_date}_to_{to_date}.csv")
-        
-        combined_df.to_csv(filename, index=False)
+        sink = CsvSink(filename)
+
+    def fetch(chunk_start_dt, chunk_end_dt):
+        from_chunk = chunk_start_dt.strftime("%d-%m-%Y")
+        to_chunk = chunk_end_dt.strftime("%d-%m-%Y")
+        print(f"Fetching data for {symbol} from {from_chunk} to {to_chunk}...")
+        return fetch_equity_chunk(pool, scheduler.limiter, symbol, from_chunk, to_chunk, series, cache)
+
+    fetched, failed = 0, []
+    try:
+        for chunk_start_dt, chunk_end_dt, rows, error in scheduler.iter_windows("equity", from_dt, to_dt, fetch, EQUITY_API_URL):
+            from_chunk = chunk_start_dt.strftime("%d-%m-%Y")
+            to_chunk = chunk_end_dt.strftime("%d-%m-%Y")
+
+            if error is not None:
+                if isinstance(error, OfflineCacheMiss):
+                    print(f"Skipping window in offline mode: {error}")
+                else:
+                    print(f"Failed to fetch {symbol} from {from_chunk} to {to_chunk}: {error}")
+                failed.append((from_chunk, to_chunk, error))
+                continue
+
+            try:
+                if rows:
+                    insert_data_to_db(rows, index_name, writer)
+                    sink.add(rows, chunk_start_dt)
+                    fetched += len(rows)
+                else:
+                    print(f"No data found for the period {from_chunk} to {to_chunk}.")
+                    if is_historical(to_chunk):
+                        record_empty_window(symbol, index_name, chunk_start_dt, chunk_end_dt, writer)
+            except Exception as e:
+                print(f"An unexpected error occurred: {e}")
+                failed.append((from_chunk, to_chunk, e))
+    finally:
+        if own_pool:
+            pool.close()
+        exported = sink.close()
+
+    if exported and file_format == "parquet":
+        print(f"Successfully downloaded all data for {symbol} into the columnar store.")
+    elif exported:
         print(f"Successfully downloaded all data and saved to {filename}")
+    return fetched, failed
+
+
+def download_windows(windows, series="EQ", max_workers=8, sessions=4, per_host=4, db_path="stock.db", cache=None, file_format="parquet", scheduler=None):
+    """
+    Downloads many (index, symbol, window) units concurrently through one shared session pool.
+
+    The pool of workers is bounded, and every request goes through one RequestScheduler
+    whose HostLimiter caps the simultaneous requests to any host.
+
+    Args:
+        windows (list): (index, symbol, from_date, to_date) tuples with dates in DD-MM-YYYY format.
+        series (str, optional): The series type. Defaults to "EQ".
+        max_workers (int): Number of worker threads.
+        sessions (int): Number of warmed sessions kept in the pool.
+        per_host (int): Maximum concurrent requests per host (ignored when a scheduler is given).
+        db_path (str): SQLite database or PostgreSQL URL all workers write to through one bulk writer.
+        cache (ResponseCache, optional): On-disk response cache shared by all workers.
+        file_format (str, optional): "parquet" (columnar store) or "csv".
+        scheduler (RequestScheduler, optional): Retry, pacing and window-size policy. Defaults to
+            unpaced requests with three retries.
+
+    Returns:
+        tuple: (inserted, skipped) row counts for the whole run.
+    """
+    pool = SessionPool(size=sessions)
+    if scheduler is None:
+        scheduler = RequestScheduler(HostLimiter(default_limit=per_host))
+    writer = open_writer(db_path)
+    failed = []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for index, symbol, from_date, to_date in windows:
+                index_name = index.replace("_", " ")
+                future = executor.submit(download_nse_data, index, index_name, symbol, from_date, to_date,
+                                         series, pool, None, writer, cache, file_format, scheduler)
+                futures[future] = (symbol, from_date, to_date)
+            for future in as_completed(futures):
+                symbol, from_date, to_date = futures[future]
+                try:
+                    _, unit_failed = future.result()
+                    failed.extend((symbol, start, end) for start, end, _ in unit_failed)
+                except Exception as e:
+                    print(f"Download failed for {symbol} {from_date} to {to_date}: {e}")
+                    failed.append((symbol, from_date, to_date))
+    finally:
+        pool.close()
+        writer.close()
+    print(f"Inserted {writer.inserted} rows, skipped {writer.skipped} duplicates.")
+    if failed:
+        # The gap planner requests exactly these sessions again on the next incremental run.
+        print(f"{len(failed)} windows could not be fetched: " +
+              ", ".join(f"{symbol} {start} to {end}" for symbol, start, end in sorted(failed)))
+    return writer.inserted, writer.skipped
+
+
+def download_journaled(windows, journal, series="EQ", max_workers=8, sessions=4, per_host=4, db_path="stock.db", cache=None, file_format="parquet", scheduler=None):
+    """
+    Downloads (index, symbol, window) units through a persistent work journal.
+
+    The units are added to `journal` (units it already holds keep their state) and
+    drained by `max_workers` threads that lease one unit at a time. A unit is only
+    marked done after its rows are committed and its file sink is closed, so an
+    interrupted run resumes with the first unfinished unit; units with failed windows
+    are requeued with backoff. Several processes may drain the same journal.
+
+    Args:
+        windows (list): (index, symbol, from_date, to_date) tuples with dates in DD-MM-YYYY format.
+        journal (Journal): The work journal.
+        Other arguments as for `download_windows`.
+
+    Returns:
+        dict: Units completed and failed by this process.
+    """
+    added = journal.enqueue(windows)
+    print(f"Queued {added} new or reopened units in {journal.path}.")
+    pool = SessionPool(size=sessions)
+    if scheduler is None:
+        scheduler = RequestScheduler(HostLimiter(default_limit=per_host))
+    writer = open_writer(db_path)
+
+    def run_unit(index, symbol, from_date, to_date):
+        result = download_nse_data(index, index.replace("_", " "), symbol, from_date, to_date,
+                                   series, pool, None, writer, cache, file_format, scheduler)
+        writer.flush()
+        return result
+
+    try:
+        totals = run_units(journal, run_unit, max_workers=max_workers)
+    finally:
+        pool.close()
+        writer.close()
+    print(f"Inserted {writer.inserted} rows, skipped {writer.skipped} duplicates; "
+          f"{totals['done']} units done, {totals['failed']} requeued or failed.")
+    print_status(journal)
+    return totals
+
+
+def download_symbols(jobs, years, series="EQ", max_workers=8, sessions=4, per_host=4, db_path="stock.db", cache=None, file_format="parquet", scheduler=None, journal=None):
+    """
+    Downloads full calendar years for many (index, symbol) pairs; see `download_windows`.
+
+    Args:
+        jobs (list): (index, symbol) tuples, e.g. [("NIFTY_AUTO", "MARUTI")].
+        years (list): Calendar years to download for every symbol.
+        journal (Journal, optional): Checkpoint the (symbol, year) units in this work
+            journal (see `download_journaled`).
+    """
+    windows = [(index, symbol, f"01-01-{year}", f"31-12-{year}") for index, symbol in jobs for year in years]
+    if journal is not None:
+        return download_journaled(windows, journal, series, max_workers, sessions, per_host, db_path, cache, file_format, scheduler)
+    return download_windows(windows, series, max_workers, sessions, per_host, db_path, cache, file_format, scheduler)
 
 
 if __name__ == "__main__":
-    # --- Parameters to Change ---
-    stock_series = "EQ"
-    years = [2015, 2016, 2017, 2018, 2019, 2020, 2021, 2022, 2023, 2024, 2025]
-    nifty_auto = ["MARUTI", "TMPV", "M&M", "HEROMOTOCO", "EICHERMOT", "BAJAJ-AUTO", "UNOMINDA", "SONACOMS", "ASHOKLEY", "TVSMOTOR", "BOSCHLTD", "EXIDEIND", "BHARATFORG", "MOTHERSON", "TIINDIA"]
-    nifty_financial_services = ["SBICARD", "HDFCLIFE", "SBILIFE", "SHRIRAMFIN", "KOTAKBANK", "AXISBANK", "PFC", "RECLTD", "SBIN", "ICICIBANK", "HDFCBANK", "ICICIPRULI", "BSE", "LICHSGFIN", "JIOFIN", "MUTHOOTFIN", "ICICIGI", "BAJAJFINSV", "BAJFINANCE", "CHOLAFIN"]
-    nifty_fmcg = ["TATACONSUM", "ITC", "UNITDSPR", "HINDUNILVR", "MARICO", "COLPAL", "BRITANNIA", "NESTLEIND", "GODREJCP", "UBL", "VBL", "PATANJALI", "EMAMILTD", "DABUR", "RADICO"]
-    nifty_it = ["INFY", "TECHM", "TCS", "MPHASIS", "WIPRO", "PERSISTENT", "LTIM", "HCLTECH", "OFSS", "COFORGE"]
-    nifty_metal = ["APLAPOLLO", "ADANIENT", "NMDC", "WELCORP", "JSL", "TATASTEEL", "JINDALSTEL", "NATIONALUM", "HINDALCO", "VEDL", "JSWSTEEL", "HINDZINC", "SAIL", "LLOYDSME", "HINDCOPPER"]
-    
-    indexes = nifty_metal
-    index = "NIFTY_METAL"
-    index_name = index.replace("_", " ")
-    for ind in indexes:
-        stock_symbol = ind # Change index to fetch data for different stocks
-        
-        # Record start time for the entire loop
-        loop_start_time = datetime.now()
-        for year in years:
-            start_date = f"01-01-{year}"
-            end_date = f"31-12-{year}"
-            print(f"Fetching data for {stock_symbol} from {start_date} to {end_date}...")
-            download_nse_data(index, index_name,stock_symbol, start_date, end_date, stock_series)
-
-    # Record end time and calculate total
-    loop_end_time = datetime.now()
-    total_loop_time = str(loop_end_time - loop_start_time)
-    print(f"Total time taken for all years: {total_loop_time}")
-
-        
+    parser = argparse.ArgumentParser(description="Download historical equity data for sector constituents.")
+    parser.add_argument("--index", type=str, nargs="+", default=["NIFTY_METAL"], choices=registry.index_keys(), help="One or more indices whose constituents should be fetched.")
+    parser.add_argument("--all", action="store_true", help="Fetch the constituents of every known index.")
+    parser.add_argument("--series", type=str, default="EQ", help="The series type.")
+    parser.add_argument("--workers", type=int, default=8, help="Number of concurrent download workers.")
+    parser.add_argument("--sessions", type=int, default=4, help="Number of warmed NSE sessions to keep.")
+    parser.add_argument("--per-host", type=int, default=4, help="Maximum concurrent requests per host.")
+    parser.add_argument("--cache-dir", type=str, default=CACHE_DIR, help="Directory of the on-disk response cache.")
+    parser.add_argument("--cache-max-mb", type=int, default=2048, help="Size budget of the response cache in MB.")
+    parser.add_argument("--no-cache", action="store_true", help="Always download, bypassing the response cache.")
+    parser.add_argument("--offline", action="store_true", help="Rebuild from cached responses only; never touch the network.")
+    parser.add_argument("--full", action="store_true", help="Re-request every year instead of only the gaps missing from the database.")
+    parser.add_argument("--format", type=str, default="parquet", choices=["parquet", "csv"], help="File sink for downloaded rows.")
+    parser.add_argument("--backfill", action="store_true", help="Also fill gaps before each symbol's first stored date.")
+    parser.add_argument("--db", type=str, default="stock.db", help="Path to the SQLite database or a PostgreSQL URL.")
+    parser.add_argument("--journal", type=str, default=JOURNAL_PATH, help="Work journal that checkpoints --full backfills.")
+    parser.add_argument("--no-journal", action="store_true", help="Run --full without checkpointing.")
+    parser.add_argument("--restart", action="store_true", help="Forget the journal's completed units and backfill from scratch.")
+    scheduler.add_arguments(parser)
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.start_from_args(args)
+
+    cache = None
+    if args.offline or not args.no_cache:
+        cache = ResponseCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 ** 2, offline=args.offline)
+
+    request_scheduler = scheduler_from_args(args, per_host=args.per_host)
+
+    years = list(range(2015, datetime.now().year + 1))
+    indexes = registry.index_keys() if args.all else args.index
+    jobs = [(index, symbol) for index in indexes for symbol in registry.constituents(index)]
+
+    # Record start time for the entire run
+    run_start_time = datetime.now()
+    if args.full or args.offline:
+        journal = None
+        if args.full and not args.offline and not args.no_journal:
+            journal = Journal(args.journal)
+            if args.restart:
+                journal.reset()
+        download_symbols(jobs, years, args.series, args.workers, args.sessions, args.per_host, args.db, cache=cache, file_format=args.format,
+                         scheduler=request_scheduler, journal=journal)
+    else:
+        windows = plan_requests(jobs, f"01-01-{years[0]}", datetime.now().strftime("%d-%m-%Y"), db_path=args.db, backfill=args.backfill)
+        download_windows(windows, args.series, args.workers, args.sessions, args.per_host, args.db, cache=cache, file_format=args.format,
+                         scheduler=request_scheduler)
+
+    # Only symbols whose new rows contain a corporate action are re-adjusted.
+    # The derived tables are maintained in SQLite only.
+    if not is_postgres(args.db):
+        refresh_adjustments(args.db)
+
+    # The whole run, downloads and adjustments included.
+    print(f"Total time taken for all years: {datetime.now() - run_start_time}")
+    metrics.finish_from_args(args)
@@ -1,172 +1,369 @@
+import os
 import requests
 import json
-import sqlite3
 from datetime import datetime, timedelta
 import argparse
-import os
-import pandas as pd
+import queue
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from db_writer import index_rows
+from storage import open_writer, read_frame, is_postgres, STORAGE_ERRORS
+from index_export import export_index
+from response_cache import ResponseCache, CACHE_DIR, is_historical
+from nse_client import record_response
+from scheduler import RequestScheduler, scheduler_from_args
+import scheduler
+import registry
+import metrics
+from metrics import METRICS, DOWNLOAD, DECODE, TRANSFORM
+
+# NIFTYINDICES_BASE_URL points the client at another server, e.g. mock_nse.py for benchmarks.
+NIFTYINDICES_URL = os.environ.get("NIFTYINDICES_BASE_URL", "https://www.niftyindices.com")
+INDEX_API_URL = f"{NIFTYINDICES_URL}/Backpage.aspx/getHistoricaldatatabletoString"
+# Seconds to wait for a history response; a timeout shrinks the request window.
+INDEX_TIMEOUT = 30
 
 def get_latest_date(index_name, db_path="stock.db"):
     """Gets the latest date for a given index from the database."""
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(date_key) FROM stock_index_price_daily WHERE index_name = ?", (index_name,))
-        result = cursor.fetchone()[0]
-        return result
-    except sqlite3.Error as e:
+        df = read_frame(db_path, "SELECT MAX(date_key) AS date_key FROM stock_index_price_daily WHERE index_name = ?", (index_name,))
+        return df['date_key'].iloc[0]
+    except STORAGE_ERRORS as e:
         print(f"Database error when fetching latest date: {e}")
         return None
-    finally:
-        if conn:
-            conn.close()
 
-def export_to_csv(index_name, db_path="stock.db"):
-    """Exports all data for a given index from the database to a CSV file."""
+def get_latest_dates(db_path="stock.db"):
+    """Gets the latest stored date of every index with one grouped query."""
     try:
-        conn = sqlite3.connect(db_path)
-        
-        # Fetch all data for the index
-        query = "SELECT date_key, open, high, low, close FROM stock_index_price_daily WHERE index_name = ? ORDER BY date_key"
-        df = pd.read_sql_query(query, conn, params=(index_name,))
-        
-        if df.empty:
-            print(f"No data found for index {index_name} to export.")
-            return
-
-        # Create directory structure
-        today_date = datetime.now().strftime('%d-%m-%Y')
-        file_name = f"{index_name}_01-01-2015_to_{today_date}.csv"
-        dir_path = os.path.join("data", "INDEX_DATA", index_name)
-        os.makedirs(dir_path, exist_ok=True)
-        
-        # Define the full file path
-        file_path = os.path.join(dir_path, file_name)
-        
-        # Export to CSV
-        df.to_csv(file_path, index=False)
-        print(f"Successfully exported data to {file_path}")
-
-    except sqlite3.Error as e:
-        print(f"Database error during CSV export: {e}")
-    except Exception as e:
-        print(f"An error occurred during CSV export: {e}")
-    finally:
-        if conn:
-            conn.close()
+        df = read_frame(db_path, "SELECT index_name, MAX(date_key) AS date_key FROM stock_index_price_daily GROUP BY index_name")
+        return dict(zip(df['index_name'], df['date_key']))
+    except STORAGE_ERRORS as e:
+        print(f"Database error when fetching latest dates: {e}")
+        return {}
+
+def start_date_after(latest_date_str):
+    """Returns the DD-Mon-YYYY day after `latest_date_str` (YYYY-MM-DD), or the default start for new indices."""
+    if not latest_date_str:
+        # If no data exists, start from a default date
+        return '01-Jan-2015'
+    latest_date = datetime.strptime(latest_date_str, '%Y-%m-%d')
+    return (latest_date + timedelta(days=1)).strftime('%d-%b-%Y')
 
-def fetch_and_insert_data(name, start_date, end_date, index_name):
+def export_to_csv(index_name, db_path="stock.db", file_format="csv"):
     """
-    Fetches stock data from the API, transforms it, and inserts it into the database.
+    Exports new rows of a given index to its stable export file, appending only what
+    was added since the previous export (see index_export.export_index).
     """
-    api_url = "https://www.niftyindices.com/Backpage.aspx/getHistoricaldatatabletoString"
-    cinfo_payload = {
-        "name": name,
-        "startDate": start_date,
-        "endDate": end_date,
-        "indexName": index_name
-    }
+    if is_postgres(db_path):
+        print("Exports are only produced from the SQLite database.")
+        return 0
+    return export_index(index_name, db_path, file_format)
+
+def post_index_history(cinfo_payload, cache=None, limiter=None, timeout=INDEX_TIMEOUT):
+    """
+    POSTs a history request to niftyindices.com and returns the raw response body.
+
+    Windows that end before today are served from and stored in `cache` when one is given.
+    With a `limiter`, the request waits for its host's concurrency slot and rate.
+    """
+    cacheable = cache is not None and is_historical(cinfo_payload["endDate"], '%d-%b-%Y')
+    if cacheable or (cache is not None and cache.offline):
+        body = cache.get(INDEX_API_URL, cinfo_payload)
+        if body is not None:
+            METRICS.inc("nse_cache_hits_total", endpoint="index")
+            return body
+
     # The API expects the cinfo value to be a string that looks like a dictionary, using single quotes.
     request_body = {
         "cinfo": json.dumps(cinfo_payload).replace('"', "'")
     }
     # print("Request Body:", request_body)
-    db_path = "stock.db"
-    conn = None
+    headers = {
+        'Content-Type': 'application/json; charset=utf-8',
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+    with limiter.slot(INDEX_API_URL) if limiter is not None else contextlib.nullcontext(), METRICS.timer(DOWNLOAD):
+        response = requests.post(INDEX_API_URL, json=request_body, headers=headers, timeout=timeout)
+    record_response(response)
+    response.raise_for_status()  # Raise an exception for bad status codes
+    if cacheable:
+        cache.put(INDEX_API_URL, cinfo_payload, response.text)
+    return response.text
 
+def fetch_and_insert_data(name, start_date, end_date, index_name, writer=None, cache=None, db_path="stock.db", scheduler=None,
+                          raise_errors=False):
+    """
+    Fetches stock data from the API, transforms it, and inserts it into the database.
+
+    The range is requested in adaptively sized windows (see `fetch_index_rows`); if a
+    window fails, the rows before it are still stored so the next run resumes there.
+    Errors are printed and the fetch counts as done unless `raise_errors` is set.
+
+    Args:
+        writer (BulkWriter, optional): Shared writer that batches many indices into one
+            transaction. If omitted, the rows are written and committed immediately.
+        cache (ResponseCache, optional): On-disk response cache for historical windows.
+        db_path (str): SQLite database or PostgreSQL URL used when no writer is given.
+        scheduler (RequestScheduler, optional): Retry, pacing and window-size policy.
+        raise_errors (bool): Re-raise the error that stopped the fetch (after storing the
+            rows before it) and database errors instead of printing them.
+
+    Returns:
+        tuple: (inserted, skipped) counts (both 0 when staged into a shared writer).
+    """
     try:
-        # Fetch data from the API
-        headers = {
-            'Content-Type': 'application/json; charset=utf-8',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.post(api_url, json=request_body, headers=headers, timeout=100)
-        response.raise_for_status()  # Raise an exception for bad status codes
-
-        # The response['d'] is a JSON string, so it needs to be parsed
-        data = json.loads(response.json()['d'])
-        print(f"Fetched {len(data)} records from the API.")
-        print("Sample record:", data[0] if data else "No data")
-        # Connect to the SQLite database
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Prepare data for insertion
-        data_to_insert = []
-        for record in data:
-            # Transform date format
-            try:
-                date_obj = datetime.strptime(record['HistoricalDate'], '%d %b %Y')
-                date_key = date_obj.strftime('%Y-%m-%d')
-            except ValueError:
-                print(f"Could not parse date: {record['HistoricalDate']}. Skipping row.")
+        rows, error = fetch_index_rows(name, start_date, end_date, cache, scheduler, index_name=index_name)
+        if error is not None:
+            print(f"Error fetching data from API: {error}")
+        print(f"Fetched {len(rows)} records from the API.")
+
+        if writer is not None:
+            writer.stage_index_rows(rows)
+            inserted, skipped = 0, 0
+        else:
+            with open_writer(db_path) as own_writer:
+                own_writer.stage_index_rows(rows)
+                inserted, skipped = own_writer.flush()
+            print(f"Successfully inserted {inserted} new rows into the database ({skipped} duplicates skipped).")
+        if error is not None and raise_errors:
+            raise error
+        return inserted, skipped
+
+    except STORAGE_ERRORS as e:
+        if raise_errors:
+            raise
+        print(f"Database error: {e}")
+    return 0, 0
+
+def replay_cached_index(index_name, cache, db_path="stock.db"):
+    """
+    Rebuilds an index's rows from every cached response for it, without any network access.
+
+    Returns:
+        tuple: (inserted, skipped) counts.
+    """
+    with open_writer(db_path) as writer:
+        for params, body in cache.entries(INDEX_API_URL):
+            if params.get("name") != index_name:
                 continue
+            writer.stage_index_rows(index_rows(json.loads(json.loads(body)['d'])))
+    print(f"Replayed cached responses for {index_name}: inserted {writer.inserted}, skipped {writer.skipped}.")
+    return writer.inserted, writer.skipped
 
-            data_to_insert.append((
-                record['INDEX_NAME'].upper(),
-                float(record['OPEN']),
-                float(record['HIGH']),
-                float(record['LOW']),
-                float(record['CLOSE']),
-                date_key,
-                'sectoral'  # Adding the index_type
-            ))
-
-        # Insert data into the tables
-        inserted_count = 0
-        for record in data_to_insert:
-            try:
+def fetch_index_rows(name, start_date, end_date, cache=None, scheduler=None, index_name=None):
+    """
+    Fetches an index's history in windows sized by the scheduler and returns
+    stock_index_price_daily tuples.
+
+    Transient failures (network errors, timeouts, 429 and 5xx) are retried with jittered
+    exponential backoff. Fetching stops at the first window that still fails, so the
+    rows returned always form an unbroken prefix of the range: the next run starts from
+    the latest stored date and fills the rest instead of leaving a hole.
 
-                # Insert into stock_index_price_daily
-                cursor.execute("""
-                    INSERT INTO stock_index_price_daily (index_name, open, high, low, close, date_key, index_type)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, record)
+    Args:
+        name (str): Index name sent to the API.
+        start_date (str): First day in DD-Mon-YYYY format.
+        end_date (str): Last day in DD-Mon-YYYY format.
+        cache (ResponseCache, optional): On-disk response cache for historical windows.
+        scheduler (RequestScheduler, optional): Defaults to unpaced requests with three retries.
+        index_name (str, optional): indexName sent to the API. Defaults to `name`.
 
-                inserted_count += 1
-            except sqlite3.IntegrityError:
-                # This error occurs if the primary key (index_name, date_key) already exists.
-                print(f"Skipping duplicate record for {record[0]} on {record[5]}.")
+    Returns:
+        tuple: (rows, error) where error is the exception that stopped the fetch, or None.
+    """
+    if scheduler is None:
+        scheduler = RequestScheduler()
 
-        conn.commit()
-        print(f"Successfully inserted {inserted_count} new rows into the database.")
+    def fetch(window_start, window_end):
+        cinfo_payload = {"name": name, "startDate": window_start.strftime('%d-%b-%Y'),
+                         "endDate": window_end.strftime('%d-%b-%Y'), "indexName": index_name or name}
+        body = post_index_history(cinfo_payload, cache, scheduler.limiter)
+        with METRICS.timer(DECODE):
+            # The response['d'] is a JSON string, so it needs to be parsed
+            data = json.loads(json.loads(body)['d'])
+        with METRICS.timer(TRANSFORM):
+            return index_rows(data)
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data from API: {e}")
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
-    except (ValueError, KeyError) as e:
-        print(f"Error processing data: {e}")
+    rows = []
+    start_dt = datetime.strptime(start_date, '%d-%b-%Y')
+    end_dt = datetime.strptime(end_date, '%d-%b-%Y')
+    for _, _, window_rows, error in scheduler.iter_windows("index", start_dt, end_dt, fetch, INDEX_API_URL):
+        if error is not None:
+            return rows, error
+        rows.extend(window_rows)
+    return rows, None
+
+def refresh_indices(index_names, max_workers=8, cache=None, db_path="stock.db", export="csv", scheduler=None):
+    """
+    Brings many indices up to date in one process.
+
+    Start dates come from a single grouped MAX(date_key) query. Windows are fetched by a
+    bounded thread pool and the parsed rows are handed through a queue to one writer
+    thread, so SQLite only ever sees a single writer. If the writer fails (e.g. a locked
+    database), pending fetches are cancelled and its error is re-raised.
+
+    Args:
+        index_names (list): Index names (case-insensitive).
+        max_workers (int): Concurrent requests to niftyindices.com.
+        cache (ResponseCache, optional): On-disk response cache for historical windows.
+        db_path (str): Path to the SQLite database or a PostgreSQL URL.
+        export (str, optional): Export format ("csv" or "parquet") for every index that
+            received rows; None skips the export.
+        scheduler (RequestScheduler, optional): Retry, pacing and window-size policy. Defaults
+            to unpaced requests with three retries.
+
+    Returns:
+        dict: Counts of fetched, up-to-date and failed indices and inserted/skipped rows.
+    """
+    start_time = datetime.now()
+    latest = get_latest_dates(db_path)
+    end_date = datetime.now().strftime('%d-%b-%Y')
+    today = datetime.now().date()
+
+    jobs, up_to_date = [], 0
+    for name in dict.fromkeys(name.upper() for name in index_names):
+        start_date = start_date_after(latest.get(name))
+        if datetime.strptime(start_date, '%d-%b-%Y').date() > today:
+            up_to_date += 1
+            continue
+        jobs.append((name, start_date))
+    print(f"Refreshing {len(jobs)} indices ({up_to_date} already up to date) with {max_workers} workers.")
+
+    if scheduler is None:
+        scheduler = RequestScheduler()
+
+    rows_queue = queue.Queue(maxsize=max_workers * 4)
+    totals, writer_errors = {}, []
+
+    def write_rows():
+        try:
+            with open_writer(db_path) as writer:
+                while True:
+                    rows = rows_queue.get()
+                    if rows is None:
+                        break
+                    writer.stage_index_rows(rows)
+            totals.update(inserted=writer.inserted, skipped=writer.skipped)
+        except Exception as e:
+            print(f"Index writer failed: {e}")
+            writer_errors.append(e)
+
+    def hand_off(item):
+        # A dead writer never drains the queue, so never block on it indefinitely.
+        while True:
+            if not writer_thread.is_alive():
+                raise writer_errors[0] if writer_errors else RuntimeError("The index writer stopped unexpectedly.")
+            try:
+                rows_queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    writer_thread = threading.Thread(target=write_rows, name="index-writer")
+    writer_thread.start()
+
+    fetched, failed = [], []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(fetch_index_rows, name, start_date, end_date, cache, scheduler): name
+                for name, start_date in jobs
+            }
+            try:
+                for future in as_completed(futures):
+                    name = futures[future]
+                    rows, error = future.result()
+                    if error is not None:
+                        print(f"Failed to fetch {name}: {error}")
+                        failed.append(name)
+                    if rows:
+                        hand_off(rows)
+                        fetched.append(name)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
     finally:
-        if conn:
-            conn.close()
+        if writer_thread.is_alive():
+            hand_off(None)
+        writer_thread.join()
+    if writer_errors:
+        raise writer_errors[0]
+
+    if export:
+        for name in sorted(fetched):
+            export_to_csv(name, db_path, export)
+
+    print(f"Refreshed {len(fetched)} indices in {datetime.now() - start_time}: inserted {totals.get('inserted', 0)}, "
+          f"skipped {totals.get('skipped', 0)}, {len(failed)} failed.")
+    if failed:
+        print("Failed indices: " + ", ".join(sorted(failed)))
+    return {
+        "fetched": len(fetched),
+        "up_to_date": up_to_date,
+        "failed": len(failed),
+        "inserted": totals.get('inserted', 0),
+        "skipped": totals.get('skipped', 0),
+    }
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Fetch historical stock data.")
-    parser.add_argument("--index", type=str, required=True, help="The name of the index to fetch.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--index", type=str, help="The name of the index to fetch.")
+    target.add_argument("--all", action="store_true", help="Refresh every index in the registry (see registry.py).")
+    target.add_argument("--indices-file", type=str, help="Refresh the indices listed in this file, one per line.")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent requests for --all/--indices-file.")
+    parser.add_argument("--db", type=str, default="stock.db", help="Path to the SQLite database or a PostgreSQL URL.")
+    parser.add_argument("--export-format", type=str, choices=["csv", "parquet"], default="csv", help="Format of the incremental export.")
+    parser.add_argument("--cache-dir", type=str, default=CACHE_DIR, help="Directory of the on-disk response cache.")
+    parser.add_argument("--no-cache", action="store_true", help="Always download, bypassing the response cache.")
+    parser.add_argument("--offline", action="store_true", help="Rebuild from cached responses only; never touch the network.")
+    scheduler.add_arguments(parser)
+    metrics.add_arguments(parser)
     args = parser.parse_args()
+    metrics.start_from_args(args)
+    request_scheduler = scheduler_from_args(args, per_host=args.workers)
 
-    INDEX = args.index.upper()
-    
-    # Determine the start date
-    latest_date_str = get_latest_date(INDEX)
-    if latest_date_str:
-        latest_date = datetime.strptime(latest_date_str, '%Y-%m-%d')
-        start_date_obj = latest_date + timedelta(days=1)
-        start_date = start_date_obj.strftime('%d-%b-%Y')
+    cache = None
+    if args.offline or not args.no_cache:
+        cache = ResponseCache(args.cache_dir, offline=args.offline)
+
+    if args.index is None:
+        if args.all:
+            names = registry.index_names()
+        else:
+            with open(args.indices_file, encoding="utf-8") as f:
+                names = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        if args.offline:
+            for name in dict.fromkeys(name.upper() for name in names):
+                replay_cached_index(name, cache, args.db)
+                export_to_csv(name, args.db, args.export_format)
+        else:
+            refresh_indices(names, max_workers=args.workers, cache=cache, db_path=args.db,
+                            export=args.export_format, scheduler=request_scheduler)
     else:
-        # If no data exists, start from a default date
-        start_date = '01-Jan-2015'
+        INDEX = args.index.upper()
+        if args.offline:
+            replay_cached_index(INDEX, cache, args.db)
+        else:
+            start_date = start_date_after(get_latest_date(INDEX, args.db))
 
-    # End date is always today
-    end_date = datetime.now().strftime('%d-%b-%Y')
+            # End date is always today
+            end_date = datetime.now().strftime('%d-%b-%Y')
+
+            print(f"Fetching data for {INDEX} from {start_date} to {end_date}")
+
+            fetch_and_insert_data(name=INDEX,
+                                  start_date=start_date,
+                                  end_date=end_date,
+                                  index_name=INDEX,
+                                  cache=cache,
+                                  db_path=args.db,
+                                  scheduler=request_scheduler)
 
-    print(f"Fetching data for {INDEX} from {start_date} to {end_date}")
+        # Export the new rows
+        export_to_csv(INDEX, args.db, args.export_format)
 
-    fetch_and_insert_data(name=INDEX,
-                          start_date=start_date,
-                          end_date=end_date,
-                          index_name=INDEX)
-                          
-    # Export the data to CSV
-    export_to_csv(INDEX)
+    metrics.finish_from_args(args)
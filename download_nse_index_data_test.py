@@ -0,0 +1,25 @@
+import pytest
+
+import download_nse_index_data
+
+
+class LockedWriter:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def stage_index_rows(self, rows):
+        raise RuntimeError("database is locked")
+
+
+def test_refresh_indices_reraises_writer_failure(tmp_path, monkeypatch):
+    rows = [("NIFTY 50", 1.0, 1.0, 1.0, 1.0, "2024-01-01", "sectoral")]
+    monkeypatch.setattr(download_nse_index_data, "fetch_index_rows", lambda *args, **kwargs: (rows, None))
+    monkeypatch.setattr(download_nse_index_data, "open_writer", lambda db_path: LockedWriter())
+
+    # Far more indices than queue slots: a dead writer used to block the hand-off forever.
+    names = [f"INDEX {i}" for i in range(50)]
+    with pytest.raises(RuntimeError, match="database is locked"):
+        download_nse_index_data.refresh_indices(names, max_workers=2, db_path=str(tmp_path / "stock.db"), export=None)
@@ -0,0 +1,165 @@
+import os
+import csv
+import glob
+import sqlite3
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+from columnar_store import STORE_DIR, index_frame, write_index
+from metrics import METRICS, EXPORT
+
+EXPORT_DIR = os.path.join("data", "INDEX_DATA")
+EXPORT_COLUMNS = ['date_key', 'open', 'high', 'low', 'close']
+CHUNK_ROWS = 10000
+
+EXPORT_STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS export_state (
+        index_name TEXT,
+        format TEXT,
+        last_date_key TEXT,
+        row_count INTEGER,
+        PRIMARY KEY (index_name, format)
+    )
+"""
+
+ROWS_UP_TO_SQL = "SELECT COUNT(*) FROM stock_index_price_daily WHERE index_name = ? AND date_key <= ?"
+
+
+def export_path(index_name, export_dir=EXPORT_DIR):
+    """Stable CSV path of an index export, e.g. data/INDEX_DATA/NIFTY IT/NIFTY IT.csv."""
+    return os.path.join(export_dir, index_name, f"{index_name}.csv")
+
+
+def _stream_rows(conn, index_name, after, chunk_rows):
+    """Yields lists of (date_key, open, high, low, close) rows newer than `after`, in date order."""
+    cursor = conn.execute(
+        f"SELECT {', '.join(EXPORT_COLUMNS)} FROM stock_index_price_daily "
+        "WHERE index_name = ? AND date_key > ? ORDER BY date_key",
+        (index_name, after or ''))
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        yield rows
+
+
+def _append_csv(path, chunks, rewrite):
+    """Appends chunks to `path` (rewriting it when `rewrite`); returns (rows written, last date_key)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written, last_date = 0, None
+    with open(path, "w" if rewrite else "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if rewrite:
+            writer.writerow(EXPORT_COLUMNS)
+        for rows in chunks:
+            writer.writerows(rows)
+            written += len(rows)
+            last_date = rows[-1][0]
+    return written, last_date
+
+
+def _append_parquet(index_name, chunks, store_dir):
+    """Merges chunks into the index's year partitions of the columnar store."""
+    written, last_date = 0, None
+    for rows in chunks:
+        df = pd.DataFrame(rows, columns=EXPORT_COLUMNS)
+        df['index_name'] = index_name
+        write_index(index_frame(df), store_dir)
+        written += len(rows)
+        last_date = rows[-1][0]
+    return written, last_date
+
+
+def export_index(index_name, db_path="stock.db", file_format="csv", full=False,
+                 export_dir=EXPORT_DIR, store_dir=STORE_DIR, chunk_rows=CHUNK_ROWS):
+    """
+    Exports an index's history, appending only rows newer than the last export.
+
+    The last exported date_key per (index, format) is kept in export_state, and rows are
+    streamed from the cursor in chunks, so the cost of an export depends on the new rows
+    rather than the whole history. export_state also keeps how many rows lay on or before
+    that date; when the count has changed, rows were backfilled below it and the index is
+    exported in full again. CSV exports go to one stable file per index (see
+    `export_path`); a full CSV export also removes the dated files older versions left
+    behind. Parquet exports go to the columnar store, where only the touched year
+    partitions are rewritten.
+
+    Args:
+        index_name (str): The index to export (e.g., "NIFTY IT").
+        db_path (str): Path to the SQLite database.
+        file_format (str): "csv" or "parquet".
+        full (bool): Ignore the export state and export everything again.
+        export_dir (str): Root directory of the CSV exports.
+        store_dir (str): Root directory of the columnar store.
+        chunk_rows (int): Rows fetched from the cursor at a time.
+
+    Returns:
+        int: Number of rows exported.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        conn.execute(EXPORT_STATE_DDL)
+        if "row_count" not in {column[1] for column in conn.execute("PRAGMA table_info(export_state)")}:
+            with conn:
+                conn.execute("ALTER TABLE export_state ADD COLUMN row_count INTEGER")
+        row = conn.execute("SELECT last_date_key, row_count FROM export_state WHERE index_name = ? AND format = ?",
+                           (index_name, file_format)).fetchone()
+        after = None if full or row is None else row[0]
+        if after is not None and conn.execute(ROWS_UP_TO_SQL, (index_name, after)).fetchone()[0] != row[1]:
+            print(f"Rows of {index_name} were backfilled before {after}; exporting it in full.")
+            after = None
+
+        with METRICS.timer(EXPORT):
+            if file_format == "csv":
+                path = export_path(index_name, export_dir)
+                # Without a state row or a file to append to, the stable file is written from scratch.
+                if not os.path.exists(path):
+                    after = None
+                written, last_date = _append_csv(path, _stream_rows(conn, index_name, after, chunk_rows), rewrite=after is None)
+                if after is None:
+                    for stale in glob.glob(os.path.join(glob.escape(os.path.dirname(path)), f"{glob.escape(index_name)}_*_to_*.csv")):
+                        os.remove(stale)
+            else:
+                written, last_date = _append_parquet(index_name, _stream_rows(conn, index_name, after, chunk_rows), store_dir)
+
+        if last_date is not None:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO export_state VALUES (?, ?, ?, ?)",
+                             (index_name, file_format, last_date, conn.execute(ROWS_UP_TO_SQL, (index_name, last_date)).fetchone()[0]))
+        METRICS.inc("nse_rows_exported_total", written, format=file_format)
+        if written:
+            print(f"Exported {written} new rows of {index_name} ({file_format}).")
+        else:
+            print(f"Export of {index_name} ({file_format}) is up to date.")
+        return written
+
+    except sqlite3.Error as e:
+        print(f"Database error during export: {e}")
+    except OSError as e:
+        print(f"An error occurred during export: {e}")
+    finally:
+        if conn:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally export index history to CSV or Parquet.")
+    parser.add_argument("--index", type=str, nargs="+", help="Index names to export. Defaults to every stored index.")
+    parser.add_argument("--format", type=str, choices=["csv", "parquet"], default="csv", help="Export format.")
+    parser.add_argument("--full", action="store_true", help="Re-export the whole history.")
+    parser.add_argument("--db", type=str, default="stock.db", help="Path to the SQLite database.")
+    args = parser.parse_args()
+
+    names = [name.upper() for name in args.index] if args.index else None
+    if names is None:
+        conn = sqlite3.connect(args.db)
+        names = [row[0] for row in conn.execute("SELECT DISTINCT index_name FROM stock_index_price_daily ORDER BY index_name")]
+        conn.close()
+
+    start_time = datetime.now()
+    total = sum(export_index(name, args.db, args.format, args.full) for name in names)
+    print(f"Exported {total} rows for {len(names)} indices in {datetime.now() - start_time}.")
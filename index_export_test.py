@@ -0,0 +1,28 @@
+import csv
+
+from db_writer import BulkWriter
+from index_export import export_index, export_path
+
+
+def stage(db_path, days):
+    with BulkWriter(db_path) as writer:
+        writer.stage_index_rows([("NIFTY IT", 1.0, 2.0, 0.5, 1.5, day, "sectoral") for day in days])
+
+
+def exported_dates(export_dir):
+    with open(export_path("NIFTY IT", export_dir), newline="", encoding="utf-8") as f:
+        return [row["date_key"] for row in csv.DictReader(f)]
+
+
+def test_export_appends_new_rows_and_rewrites_after_backfill(tmp_path):
+    db_path, export_dir = str(tmp_path / "stock.db"), str(tmp_path / "exports")
+    stage(db_path, ["2024-01-03", "2024-01-04"])
+    assert export_index("NIFTY IT", db_path, export_dir=export_dir) == 2
+    assert export_index("NIFTY IT", db_path, export_dir=export_dir) == 0
+
+    stage(db_path, ["2024-01-05"])
+    assert export_index("NIFTY IT", db_path, export_dir=export_dir) == 1
+
+    stage(db_path, ["2024-01-01", "2024-01-02"])
+    assert export_index("NIFTY IT", db_path, export_dir=export_dir) == 5
+    assert exported_dates(export_dir) == ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"]
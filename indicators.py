@@ -0,0 +1,218 @@
+import sqlite3
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db_writer import connect, DB_PATH
+
+# Sessions per year; also the 52-week high/low window.
+YEAR_SESSIONS = 252
+VOL_WINDOW = 20
+SMA_WINDOWS = (20, 50, 200)
+RSI_WINDOW = 14
+# Calendar days of history re-read before the first new date so every rolling window
+# of the appended tail is complete.
+LOOKBACK_DAYS = 400
+
+INDICATOR_COLUMNS = [
+    'close', 'adj_factor', 'ret_1d', 'vol_20d', 'sma_20', 'sma_50', 'sma_200',
+    'rsi_14', 'peak', 'drawdown', 'high_52w', 'low_52w'
+]
+
+INDICATORS_TABLE_DDL = f"""
+    CREATE TABLE IF NOT EXISTS stock_company_indicators_daily (
+        index_name TEXT,
+        CH_SYMBOL TEXT,
+        date_key TEXT,
+        {', '.join(f'{column} REAL' for column in INDICATOR_COLUMNS)},
+        PRIMARY KEY (index_name, CH_SYMBOL, date_key)
+    ) WITHOUT ROWID
+"""
+
+
+def load_matrix(conn, index_name, start=None, adjusted=True):
+    """
+    Loads an index's constituents into aligned dates x symbols matrices.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection.
+        index_name (str): The index whose constituents are loaded (e.g., "NIFTY METAL").
+        start (str, optional): First date_key to load (YYYY-MM-DD).
+        adjusted (bool): Use stock_company_price_adjusted when it exists.
+
+    Returns:
+        tuple: (close, factor) DataFrames indexed by date_key with one column per symbol.
+    """
+    has_adjusted = adjusted and conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stock_company_price_adjusted'").fetchone()
+    params = [index_name]
+    if has_adjusted:
+        query = """
+            SELECT CH_SYMBOL, date_key, close, adj_factor FROM stock_company_price_adjusted
+            WHERE CH_SYMBOL IN (SELECT DISTINCT CH_SYMBOL FROM stock_company_price_daily WHERE index_name = ?)
+        """
+    else:
+        query = """
+            SELECT CH_SYMBOL, CH_TIMESTAMP AS date_key, CH_CLOSING_PRICE AS close, 1.0 AS adj_factor
+            FROM stock_company_price_daily WHERE index_name = ?
+        """
+    if start is not None:
+        query += f" AND {'date_key' if has_adjusted else 'CH_TIMESTAMP'} >= ?"
+        params.append(start)
+    df = pd.read_sql_query(query, conn, params=params).drop_duplicates(subset=['CH_SYMBOL', 'date_key'])
+    close = df.pivot(index='date_key', columns='CH_SYMBOL', values='close').sort_index()
+    factor = df.pivot(index='date_key', columns='CH_SYMBOL', values='adj_factor').reindex_like(close)
+    return close, factor
+
+
+def rolling_rsi(close, window=RSI_WINDOW):
+    """
+    Simple-average (Cutler) RSI. Unlike Wilder's recursive smoothing it depends only on
+    the last `window` changes, so it can be computed for any tail without carried state.
+    """
+    change = close.diff()
+    gain = change.clip(lower=0).rolling(window, min_periods=window).mean()
+    loss = (-change.clip(upper=0)).rolling(window, min_periods=window).mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+    return rsi.where(loss != 0, 100.0).where(gain.notna())
+
+
+def compute_indicators(close, prior_peak=None):
+    """
+    Computes every indicator for a dates x symbols close matrix in one vectorized pass.
+
+    Args:
+        close (pandas.DataFrame): Close prices indexed by date with one column per symbol.
+        prior_peak (pandas.Series, optional): Running peak per symbol before the first row,
+            used to continue drawdowns incrementally.
+
+    Returns:
+        dict: indicator name -> DataFrame aligned with `close`.
+    """
+    returns = close.pct_change(fill_method=None)
+    result = {
+        'close': close,
+        'ret_1d': returns,
+        'vol_20d': returns.rolling(VOL_WINDOW, min_periods=VOL_WINDOW).std() * np.sqrt(YEAR_SESSIONS),
+        'rsi_14': rolling_rsi(close),
+        'high_52w': close.rolling(YEAR_SESSIONS, min_periods=1).max(),
+        'low_52w': close.rolling(YEAR_SESSIONS, min_periods=1).min(),
+    }
+    for window in SMA_WINDOWS:
+        result[f'sma_{window}'] = close.rolling(window, min_periods=window).mean()
+
+    peak = close.cummax()
+    if prior_peak is not None:
+        seed = prior_peak.reindex(close.columns)
+        peak = np.fmax(peak, seed.to_numpy()[np.newaxis, :])
+        peak = pd.DataFrame(peak, index=close.index, columns=close.columns).where(close.notna())
+    result['peak'] = peak
+    result['drawdown'] = close / peak - 1.0
+    return result
+
+
+def _stored_state(conn, index_name):
+    """Returns the last stored row per symbol together with the factor it was computed with."""
+    return pd.read_sql_query("""
+        SELECT i.CH_SYMBOL, i.date_key, i.peak, i.adj_factor
+        FROM stock_company_indicators_daily i
+        JOIN (SELECT index_name, CH_SYMBOL, MAX(date_key) AS date_key FROM stock_company_indicators_daily
+              WHERE index_name = ? GROUP BY CH_SYMBOL) last USING (index_name, CH_SYMBOL, date_key)
+    """, conn, params=(index_name,)).set_index('CH_SYMBOL')
+
+
+def refresh_indicators(index_name, db_path=DB_PATH, rebuild=False):
+    """
+    Computes and persists indicators for an index's constituents, touching only new dates.
+
+    History is only re-read far enough back to complete the rolling windows of the new
+    tail. Symbols whose adjustment factor changed since they were last computed (a new
+    split or bonus) are recomputed in full.
+
+    Args:
+        index_name (str): The index whose constituents are processed (e.g., "NIFTY METAL").
+        db_path (str): Path to the SQLite database.
+        rebuild (bool): Recompute the whole history.
+
+    Returns:
+        int: Number of rows written.
+    """
+    start_time = datetime.now()
+    conn = None
+    try:
+        conn = connect(db_path)
+        conn.execute(INDICATORS_TABLE_DDL)
+        if rebuild:
+            with conn:
+                conn.execute("DELETE FROM stock_company_indicators_daily WHERE index_name = ?", (index_name,))
+
+        state = _stored_state(conn, index_name)
+        start = None
+        if not state.empty:
+            start = (pd.Timestamp(state['date_key'].min()) - pd.Timedelta(days=LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+        close, factor = load_matrix(conn, index_name, start)
+        if close.empty:
+            print(f"No price data found for {index_name}.")
+            return 0
+
+        # A changed factor at the last computed date means the series was re-adjusted.
+        stale = []
+        for symbol, row in state.iterrows():
+            if symbol in factor.columns and row['date_key'] in factor.index:
+                current = factor.at[row['date_key'], symbol]
+                if pd.notna(current) and not np.isclose(current, row['adj_factor']):
+                    stale.append(symbol)
+        if stale:
+            print(f"Recomputing re-adjusted symbols: {', '.join(stale)}")
+            with conn:
+                conn.executemany("DELETE FROM stock_company_indicators_daily WHERE CH_SYMBOL = ? AND index_name = ?",
+                                 [(symbol, index_name) for symbol in stale])
+            state = state.drop(index=stale)
+
+        # Re-adjusted or newly added constituents need their full history.
+        if start is not None and (stale or set(close.columns) - set(state.index)):
+            close, factor = load_matrix(conn, index_name)
+
+        indicators = compute_indicators(close, state['peak'] if not state.empty else None)
+        indicators['adj_factor'] = factor
+
+        long = pd.concat({name: frame.stack(future_stack=True) for name, frame in indicators.items()}, axis=1)
+        long.index.names = ['date_key', 'CH_SYMBOL']
+        long = long.reset_index()
+        long = long[long['close'].notna()]
+        if not state.empty:
+            last_date = long['CH_SYMBOL'].map(state['date_key']).fillna('')
+            long = long[long['date_key'] > last_date]
+
+        out = long[['CH_SYMBOL', 'date_key']].copy()
+        out.insert(0, 'index_name', index_name)
+        for column in INDICATOR_COLUMNS:
+            out[column] = long[column]
+        values = out.to_numpy(dtype=object)
+        values[pd.isna(values)] = None
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO stock_company_indicators_daily VALUES ({', '.join('?' * out.shape[1])})",
+                map(tuple, values))
+        print(f"Wrote {len(out)} indicator rows for {index_name} in {datetime.now() - start_time}.")
+        return len(out)
+
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        print(f"Database error while computing indicators: {e}")
+        return 0
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute vectorized indicators for an index's constituents.")
+    parser.add_argument("--index", type=str, required=True, help="The index name, e.g. 'NIFTY METAL'.")
+    parser.add_argument("--db", type=str, default=DB_PATH, help="Path to the SQLite database.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the whole history.")
+    args = parser.parse_args()
+
+    refresh_indicators(args.index.upper(), args.db, args.rebuild)
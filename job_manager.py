@@ -0,0 +1,174 @@
+import itertools
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from download_nse_index_data import get_latest_date, start_date_after, fetch_and_insert_data, export_to_csv
+from response_cache import ResponseCache, CACHE_DIR
+
+EVENT_CAPACITY = 2000
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    """Status record of one submitted job; mutated only under the manager's lock."""
+
+    def __init__(self, job_id, name):
+        self.id = job_id
+        self.name = name
+        self.status = QUEUED
+        self.submitted = datetime.now()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.future = None
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs jobs on a worker pool and records their progress as structured events.
+
+    Events go into a bounded ring buffer, so memory stays flat however chatty or
+    long-running the jobs are; each event carries a sequence number and pollers ask only
+    for events newer than the last one they saw.
+    """
+
+    def __init__(self, max_workers=4, event_capacity=EVENT_CAPACITY):
+        """
+        Args:
+            max_workers (int): Number of jobs run concurrently.
+            event_capacity (int): Number of most recent events kept.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._events = deque(maxlen=event_capacity)
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def emit(self, job_id, message, level="info", **fields):
+        """Appends an event for `job_id`; safe to call from any thread."""
+        with self._lock:
+            self._events.append({
+                "seq": next(self._seq),
+                "time": datetime.now(),
+                "job_id": job_id,
+                "level": level,
+                "message": message,
+                **fields,
+            })
+
+    def submit(self, name, fn, *args, **kwargs):
+        """
+        Queues `fn(*args, emit=..., **kwargs)`; `emit(message, **fields)` reports progress.
+
+        Returns:
+            int: The job id.
+        """
+        with self._lock:
+            job = Job(next(self._ids), name)
+            self._jobs[job.id] = job
+        self.emit(job.id, f"Queued {name}.")
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            if job.status == CANCELLED:
+                return
+            job.status = RUNNING
+            job.started = datetime.now()
+        self.emit(job.id, f"Started {job.name}.")
+        try:
+            result = fn(*args, emit=lambda message, **fields: self.emit(job.id, message, **fields), **kwargs)
+        except Exception as e:
+            with self._lock:
+                job.status = FAILED
+                job.error = str(e)
+                job.finished = datetime.now()
+            self.emit(job.id, f"Failed {job.name}: {e}", level="error", traceback=traceback.format_exc())
+            return
+        with self._lock:
+            job.status = DONE
+            job.result = result
+            job.finished = datetime.now()
+        self.emit(job.id, f"Finished {job.name}.", result=result)
+
+    def cancel(self, job_id):
+        """Cancels a job that has not started yet. Returns True when it was cancelled."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return False
+            job.status = CANCELLED
+            job.finished = datetime.now()
+        job.future.cancel()
+        self.emit(job_id, f"Cancelled {job.name}.")
+        return True
+
+    def jobs(self):
+        """Returns a snapshot of every job as a list of dicts, newest first."""
+        with self._lock:
+            return [job.as_dict() for job in sorted(self._jobs.values(), key=lambda job: -job.id)]
+
+    def events(self, after=0, job_id=None):
+        """Returns buffered events with seq > `after`, optionally for one job only."""
+        with self._lock:
+            return [event for event in self._events
+                    if event["seq"] > after and (job_id is None or event["job_id"] == job_id)]
+
+    def counts(self):
+        """Returns the number of jobs per status."""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def fetch_index_job(index_name, emit, db_path="stock.db", cache_dir=CACHE_DIR):
+    """
+    Incrementally fetches one index from niftyindices.com, inserts it and exports it to CSV.
+
+    This is the in-process equivalent of `python download_nse_index_data.py --index NAME`.
+    A failed fetch or database error fails the job; rows fetched before the failure are
+    still stored, so rerunning the job resumes after them, but nothing is exported.
+
+    Returns:
+        dict: inserted and skipped row counts.
+    """
+    start_date = start_date_after(get_latest_date(index_name, db_path))
+    end_date = datetime.now().strftime('%d-%b-%Y')
+    emit(f"Fetching {index_name} from {start_date} to {end_date}.", stage="fetch")
+
+    inserted, skipped = fetch_and_insert_data(name=index_name, start_date=start_date, end_date=end_date,
+                                              index_name=index_name, cache=ResponseCache(cache_dir), db_path=db_path,
+                                              raise_errors=True)
+    emit(f"Inserted {inserted} rows ({skipped} duplicates skipped).", stage="insert", inserted=inserted, skipped=skipped)
+
+    export_to_csv(index_name, db_path)
+    emit(f"Exported {index_name} to CSV.", stage="export")
+    return {"inserted": inserted, "skipped": skipped}
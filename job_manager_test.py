@@ -0,0 +1,38 @@
+import requests
+
+import download_nse_index_data
+import job_manager
+from job_manager import JobManager, fetch_index_job, DONE, FAILED
+
+
+def run_job(tmp_path, monkeypatch, fetch_result):
+    monkeypatch.setattr(download_nse_index_data, "fetch_index_rows", lambda *args, **kwargs: fetch_result)
+    exported = []
+    monkeypatch.setattr(job_manager, "export_to_csv", lambda index_name, db_path: exported.append(index_name))
+    manager = JobManager(max_workers=1)
+    job_id = manager.submit("NIFTY 50", fetch_index_job, "NIFTY 50",
+                            db_path=str(tmp_path / "stock.db"), cache_dir=str(tmp_path / "cache"))
+    manager.shutdown()
+    return manager.jobs()[0], manager.events(job_id=job_id), exported
+
+
+def test_failed_fetch_fails_the_job_and_skips_the_export(tmp_path, monkeypatch):
+    rows = [("NIFTY 50", 1.0, 1.0, 1.0, 1.0, "2024-01-01", "broad")]
+    job, events, exported = run_job(tmp_path, monkeypatch, (rows, requests.HTTPError("503 Server Error")))
+
+    assert job["status"] == FAILED
+    assert job["error"] == "503 Server Error"
+    assert events[-1]["level"] == "error" and "503 Server Error" in events[-1]["message"]
+    assert not [event for event in events if event.get("stage") in ("insert", "export")]
+    assert exported == []
+    # The rows before the failed window are kept, so the next run resumes after them.
+    assert download_nse_index_data.get_latest_date("NIFTY 50", str(tmp_path / "stock.db")) == "2024-01-01"
+
+
+def test_successful_fetch_is_inserted_and_exported(tmp_path, monkeypatch):
+    rows = [("NIFTY 50", 1.0, 1.0, 1.0, 1.0, "2024-01-01", "broad")]
+    job, events, exported = run_job(tmp_path, monkeypatch, (rows, None))
+
+    assert job["status"] == DONE
+    assert job["result"] == {"inserted": 1, "skipped": 0}
+    assert exported == ["NIFTY 50"]
@@ -0,0 +1,336 @@
+import os
+import time
+import random
+import socket
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+from response_cache import is_historical
+
+JOURNAL_PATH = "journal.db"
+# How long a leased unit stays reserved for a worker that stops reporting.
+LEASE_SECONDS = 15 * 60
+# Attempts after which a unit is parked as failed instead of requeued.
+MAX_ATTEMPTS = 5
+# Base delay in seconds of the requeue backoff.
+RETRY_BACKOFF = 30.0
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+WORK_UNITS_DDL = """
+CREATE TABLE IF NOT EXISTS work_units (
+    unit_id TEXT PRIMARY KEY,
+    index_folder TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    from_date TEXT NOT NULL,
+    to_date TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    rows INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    not_before REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at TEXT
+)
+"""
+WORK_UNITS_STATE_INDEX = "CREATE INDEX IF NOT EXISTS idx_work_units_state ON work_units (state, not_before)"
+
+
+def unit_id(index, symbol, from_date, to_date):
+    return f"{index}|{symbol}|{from_date}|{to_date}"
+
+
+def worker_name():
+    """Identifies a worker thread across processes on one machine."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class Journal:
+    """
+    Persistent work journal of a backfill, stored in its own SQLite file.
+
+    Each work unit is one (index, symbol, window) download with a state, an attempt
+    count and the number of rows it fetched. Workers lease units in short IMMEDIATE
+    transactions, so several processes can drain the same journal; a lease that is not
+    completed before it expires (the worker was killed, the machine slept) is handed out
+    again. Failed units are requeued with exponential backoff until MAX_ATTEMPTS.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, backoff=RETRY_BACKOFF):
+        """
+        Args:
+            path (str): SQLite file of the journal.
+            lease_seconds (float): Lifetime of a lease.
+            max_attempts (int): Attempts before a unit is parked as failed.
+            backoff (float): Base delay in seconds before a failed unit is retried.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(WORK_UNITS_DDL)
+        conn.execute(WORK_UNITS_STATE_INDEX)
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; every write below opens its own short transaction.
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql, params=()):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(sql, params)
+            conn.execute("COMMIT")
+            return cursor.rowcount
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, windows):
+        """
+        Adds (index, symbol, from_date, to_date) units that are not yet in the journal.
+
+        Completed units are skipped on later runs, except windows that reach today or
+        later: those can still gain rows, so they are queued again.
+
+        Returns:
+            int: Number of units that are new or requeued.
+        """
+        now = _now()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            added = 0
+            for index, symbol, from_date, to_date in windows:
+                key = unit_id(index, symbol, from_date, to_date)
+                added += conn.execute(
+                    "INSERT OR IGNORE INTO work_units (unit_id, index_folder, symbol, from_date, to_date, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (key, index, symbol, from_date, to_date, now)
+                ).rowcount
+                if not is_historical(to_date):
+                    added += conn.execute(
+                        "UPDATE work_units SET state = ?, attempts = 0, not_before = 0, updated_at = ? "
+                        "WHERE unit_id = ? AND state = ?", (PENDING, now, key, DONE)
+                    ).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def lease(self, owner):
+        """
+        Reserves the next runnable unit for `owner`.
+
+        Returns:
+            tuple: (unit_id, index, symbol, from_date, to_date), or None if nothing is
+            runnable right now.
+        """
+        clock = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT unit_id, index_folder, symbol, from_date, to_date FROM work_units "
+                "WHERE (state = ? AND not_before <= ?) OR (state = ? AND lease_expires < ?) "
+                "ORDER BY index_folder, symbol, unit_id LIMIT 1", (PENDING, clock, LEASED, clock)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE work_units SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE unit_id = ?", (LEASED, owner, clock + self.lease_seconds, _now(), row[0])
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def complete(self, unit, owner, rows):
+        """Marks a leased unit done; False if the lease had expired and moved to another worker."""
+        return bool(self._write(
+            "UPDATE work_units SET state = ?, rows = ?, lease_owner = NULL, lease_expires = NULL, last_error = NULL, "
+            "updated_at = ? WHERE unit_id = ? AND state = ? AND lease_owner = ?", (DONE, rows, _now(), unit, LEASED, owner)
+        ))
+
+    def fail(self, unit, owner, error, rows=0):
+        """Requeues a leased unit with jittered exponential backoff, or parks it as failed."""
+        attempts = self._conn().execute("SELECT attempts FROM work_units WHERE unit_id = ?", (unit,)).fetchone()[0]
+        if attempts >= self.max_attempts:
+            state, not_before = FAILED, 0
+        else:
+            state = PENDING
+            not_before = time.time() + self.backoff * (2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+        return bool(self._write(
+            "UPDATE work_units SET state = ?, rows = ?, not_before = ?, lease_owner = NULL, lease_expires = NULL, "
+            "last_error = ?, updated_at = ? WHERE unit_id = ? AND state = ? AND lease_owner = ?",
+            (state, rows, not_before, str(error)[:500], _now(), unit, LEASED, owner)
+        ))
+
+    def release_orphans(self):
+        """
+        Requeues units leased by processes on this machine that are no longer running,
+        so a restarted backfill resumes at once instead of waiting for their leases to expire.
+        """
+        host = socket.gethostname()
+        orphans = []
+        for key, owner in self._conn().execute("SELECT unit_id, lease_owner FROM work_units WHERE state = ?", (LEASED,)):
+            owner_host, _, rest = (owner or "").partition(":")
+            pid = rest.partition(":")[0]
+            if owner_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                orphans.append((key, owner))
+        released = 0
+        for key, owner in orphans:
+            released += self._write(
+                "UPDATE work_units SET state = ?, not_before = 0, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE unit_id = ? AND state = ? AND lease_owner = ?", (PENDING, _now(), key, LEASED, owner)
+            )
+        return released
+
+    def next_wakeup(self):
+        """
+        Seconds until some unit becomes runnable: 0 if one is runnable now, None if none
+        will be (everything is done or failed).
+        """
+        clock = time.time()
+        row = self._conn().execute(
+            "SELECT MIN(CASE WHEN state = ? THEN not_before ELSE lease_expires END) FROM work_units WHERE state IN (?, ?)",
+            (PENDING, PENDING, LEASED)
+        ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - clock)
+
+    def requeue_failed(self):
+        """Gives parked failed units a fresh set of attempts."""
+        return self._write("UPDATE work_units SET state = ?, attempts = 0, not_before = 0, updated_at = ? WHERE state = ?",
+                           (PENDING, _now(), FAILED))
+
+    def reset(self):
+        """Forgets every unit, e.g. to run a backfill from scratch."""
+        return self._write("DELETE FROM work_units")
+
+    def status(self):
+        """Unit counts and fetched rows per state."""
+        rows = self._conn().execute("SELECT state, COUNT(*), SUM(rows) FROM work_units GROUP BY state").fetchall()
+        return {state: {"units": units, "rows": total or 0} for state, units, total in rows}
+
+    def failures(self):
+        """(unit_id, attempts, last_error) of every unit that is parked or waiting to be retried after an error."""
+        return self._conn().execute(
+            "SELECT unit_id, attempts, last_error FROM work_units WHERE last_error IS NOT NULL AND state IN (?, ?) "
+            "ORDER BY unit_id", (PENDING, FAILED)
+        ).fetchall()
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def run_units(journal, run_unit, max_workers=8, poll=5.0):
+    """
+    Drains the journal with `max_workers` threads.
+
+    Each thread leases a unit, calls run_unit(index, symbol, from_date, to_date) and
+    records the outcome. run_unit returns (rows, failed) where failed lists
+    (from_date, to_date, error) windows; a unit with failed windows is requeued. Threads sleep while only backed-off or foreign-leased units
+    remain and exit once every unit is done or failed.
+
+    Returns:
+        dict: Units completed and failed by this process.
+    """
+    released = journal.release_orphans()
+    if released:
+        print(f"Resuming {released} units left leased by an interrupted run.")
+    totals = {"done": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def work():
+        owner = worker_name()
+        try:
+            while True:
+                unit = journal.lease(owner)
+                if unit is None:
+                    wait = journal.next_wakeup()
+                    if wait is None:
+                        return
+                    time.sleep(min(max(wait, 0.1), poll))
+                    continue
+                key, index, symbol, from_date, to_date = unit
+                try:
+                    rows, failed = run_unit(index, symbol, from_date, to_date)
+                except Exception as e:
+                    rows, failed = 0, [(from_date, to_date, e)]
+                if failed:
+                    journal.fail(key, owner, "; ".join(f"{start} to {end}: {error}" for start, end, error in failed), rows)
+                    outcome = "failed"
+                else:
+                    journal.complete(key, owner, rows)
+                    outcome = "done"
+                with lock:
+                    totals[outcome] += 1
+        finally:
+            journal.close()
+
+    threads = [threading.Thread(target=work, name=f"journal-worker-{i}") for i in range(max_workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return totals
+
+
+def print_status(journal):
+    status = journal.status()
+    for state in (PENDING, LEASED, DONE, FAILED):
+        stats = status.get(state, {"units": 0, "rows": 0})
+        print(f"{state:<8} {stats['units']:>7} units  {stats['rows']:>10} rows")
+    for key, attempts, error in journal.failures():
+        print(f"  {key} (attempt {attempts}): {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or maintain a backfill work journal.")
+    parser.add_argument("command", choices=["status", "requeue", "reset"], help="status: unit counts; requeue: retry parked failures; reset: forget every unit.")
+    parser.add_argument("--journal", type=str, default=JOURNAL_PATH, help="Path to the journal database.")
+    args = parser.parse_args()
+
+    journal = Journal(args.journal)
+    if args.command == "requeue":
+        print(f"Requeued {journal.requeue_failed()} failed units.")
+    elif args.command == "reset":
+        print(f"Removed {journal.reset()} units.")
+    print_status(journal)
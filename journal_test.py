@@ -0,0 +1,82 @@
+import time
+
+import journal as journal_module
+from journal import Journal, run_units, PENDING, DONE, FAILED
+
+PAST = ("NIFTY_IT", "INFY", "01-01-2020", "31-01-2020")
+OPEN = ("NIFTY_IT", "INFY", "01-01-2020", "31-12-2999")
+
+
+def state(journal, unit):
+    return journal._conn().execute("SELECT state, attempts FROM work_units WHERE unit_id = ?", (unit,)).fetchone()
+
+
+def test_enqueue_skips_done_units_unless_their_window_is_still_open(tmp_path):
+    journal = Journal(str(tmp_path / "journal.db"))
+    assert journal.enqueue([PAST, OPEN]) == 2
+    for _ in range(2):
+        unit = journal.lease("w")
+        journal.complete(unit[0], "w", 10)
+    assert journal.enqueue([PAST, OPEN]) == 1
+    assert state(journal, journal_module.unit_id(*OPEN)) == (PENDING, 0)
+    assert state(journal, journal_module.unit_id(*PAST))[0] == DONE
+
+
+def test_expired_lease_moves_to_another_worker(tmp_path):
+    journal = Journal(str(tmp_path / "journal.db"), lease_seconds=-1)
+    journal.enqueue([PAST])
+    first = journal.lease("a")
+    second = journal.lease("b")
+    assert first[0] == second[0]
+    # The first worker lost its lease, so its late result is ignored.
+    assert not journal.complete(first[0], "a", 5)
+    assert journal.complete(second[0], "b", 5)
+
+
+def test_failures_back_off_then_park(tmp_path):
+    journal = Journal(str(tmp_path / "journal.db"), max_attempts=2, backoff=3600)
+    journal.enqueue([PAST])
+    unit = journal.lease("w")[0]
+    assert journal.fail(unit, "w", "boom")
+    assert journal.lease("w") is None
+    assert 0 < journal.next_wakeup() <= 3600 * 1.5
+
+    journal._conn().execute("UPDATE work_units SET not_before = 0")
+    journal.lease("w")
+    journal.fail(unit, "w", "boom again")
+    assert state(journal, unit) == (FAILED, 2)
+    assert journal.next_wakeup() is None
+    assert journal.failures() == [(unit, 2, "boom again")]
+
+    assert journal.requeue_failed() == 1
+    assert state(journal, unit) == (PENDING, 0)
+
+
+def test_release_orphans_requeues_units_of_dead_processes(tmp_path, monkeypatch):
+    journal = Journal(str(tmp_path / "journal.db"))
+    journal.enqueue([PAST])
+    owner = f"{journal_module.socket.gethostname()}:999999:1"
+    journal.lease(owner)
+    monkeypatch.setattr(journal_module, "_pid_alive", lambda pid: pid != 999999)
+    assert journal.release_orphans() == 1
+    assert journal.lease("w") is not None
+
+
+def test_run_units_drains_the_journal(tmp_path):
+    journal = Journal(str(tmp_path / "journal.db"), backoff=0.01)
+    windows = [("NIFTY_IT", symbol, "01-01-2020", "31-01-2020") for symbol in ("A", "B", "C")]
+    journal.enqueue(windows)
+    calls = []
+
+    def run_unit(index, symbol, from_date, to_date):
+        calls.append(symbol)
+        if symbol == "B" and calls.count("B") == 1:
+            return 0, [(from_date, to_date, RuntimeError("timeout"))]
+        return 7, []
+
+    start = time.time()
+    totals = run_units(journal, run_unit, max_workers=2, poll=0.05)
+    assert time.time() - start < 10
+    assert totals == {"done": 3, "failed": 1}
+    assert journal.status()[DONE] == {"units": 3, "rows": 21}
+    journal.close()
@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Upper bounds (seconds) of the stage histogram buckets.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Most recent observations kept per histogram for exact percentiles in the JSON report.
+RESERVOIR = 10000
+
+# The ingest stages every downloader reports under nse_stage_seconds{stage=...}.
+DOWNLOAD = "download"
+DECODE = "decode"
+TRANSFORM = "transform"
+INSERT = "insert"
+EXPORT = "export"
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{str(value)}"' for name, value in pairs) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram plus a bounded reservoir of recent samples."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=RESERVOIR)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0, "sum": 0.0}
+        samples = np.fromiter(self.samples, dtype=float)
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count,
+            "p50": float(np.percentile(samples, 50)),
+            "p90": float(np.percentile(samples, 90)),
+            "p99": float(np.percentile(samples, 99)),
+            "max": float(samples.max()),
+        }
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and histograms for one process.
+
+    Counters and histograms are identified by a name and a set of labels, Prometheus
+    style, so the same registry can be rendered as exposition text (`prometheus_text`)
+    or as a JSON run report (`report`).
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self._start = time.perf_counter()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        """Adds `amount` to counter `name` with the given labels."""
+        if not amount:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Records one observation (usually seconds) in histogram `name`."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Times the block into nse_stage_seconds{stage=...}, whether or not it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("nse_stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started = datetime.now()
+            self._start = time.perf_counter()
+
+    def counter_value(self, name, **labels):
+        """Sum of counter `name` over every label set matching `labels`."""
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(value for (metric, key), value in self._counters.items()
+                       if metric == name and wanted <= set(key))
+
+    def prometheus_text(self):
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            seen = set()
+            for (name, key), value in counters:
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_format_labels(key)} {value}")
+            for (name, key), histogram in histograms:
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """
+        Returns a JSON-serialisable run report.
+
+        Stage timings are summarised per stage (count, total, mean and percentiles in
+        seconds); counters are listed with their labels.
+        """
+        with self._lock:
+            stages, histograms = {}, []
+            for (name, key), histogram in sorted(self._histograms.items()):
+                labels = dict(key)
+                if name == "nse_stage_seconds" and len(labels) == 1:
+                    stages[labels["stage"]] = histogram.summary()
+                else:
+                    histograms.append({"name": name, "labels": labels, **histogram.summary()})
+            counters = [{"name": name, "labels": dict(key), "value": value}
+                        for (name, key), value in sorted(self._counters.items())]
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "wall_seconds": time.perf_counter() - self._start,
+            "stages": stages,
+            "histograms": histograms,
+            "counters": counters,
+        }
+
+    def write_prometheus(self, path):
+        """Writes the exposition text atomically, e.g. for node_exporter's textfile collector."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+    def write_report(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves /metrics in Prometheus text format from a daemon thread; returns the server."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = registry.prometheus_text().encode()
+                self.send_response(200 if self.path.startswith("/metrics") else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+    def print_summary(self):
+        """Prints where the run spent its time, stage by stage."""
+        report = self.report()
+        print(f"Run finished in {report['wall_seconds']:.1f}s.")
+        for stage, stats in sorted(report["stages"].items(), key=lambda item: -item[1]["sum"]):
+            print(f"  {stage:<10} {stats['count']:>7} calls  {stats['sum']:>9.2f}s total  "
+                  f"p50 {stats['p50'] * 1000:>8.1f}ms  p99 {stats['p99'] * 1000:>8.1f}ms")
+        for counter in report["counters"]:
+            labels = ", ".join(f"{name}={value}" for name, value in counter["labels"].items())
+            print(f"  {counter['name']}{f' ({labels})' if labels else ''}: {counter['value']}")
+
+
+# The process-wide registry every module reports to.
+METRICS = Metrics()
+METRICS.describe("nse_stage_seconds", "Time spent per ingest stage (download, decode, transform, insert, export).")
+METRICS.describe("nse_http_requests_total", "HTTP requests by host and status code.")
+METRICS.describe("nse_http_bytes_total", "Response bytes received by host.")
+METRICS.describe("nse_retries_total", "Requests retried after a transient failure.")
+METRICS.describe("nse_session_warms_total", "NSE sessions warmed (initial and re-warms).")
+METRICS.describe("nse_session_rewarms_total", "NSE sessions re-warmed after a 401/403.")
+METRICS.describe("nse_rows_inserted_total", "Rows inserted into the database.")
+METRICS.describe("nse_rows_skipped_total", "Staged rows skipped as duplicates.")
+METRICS.describe("nse_rows_exported_total", "Rows written to export files.")
+METRICS.describe("nse_cache_hits_total", "API responses served from the on-disk response cache.")
+METRICS.describe("nse_pacing_seconds_total", "Time requests waited for a host's token bucket.")
+METRICS.describe("nse_throttled_total", "429 responses that slowed a host's request rate.")
+METRICS.describe("nse_windows_failed_total", "Request windows given up on after retries.")
+METRICS.describe("nse_windows_refetched_total", "Responses that looked truncated and were fetched again with a smaller window.")
+
+
+def add_arguments(parser):
+    """Adds --metrics-file, --metrics-port and --report options to a script's parser."""
+    parser.add_argument("--metrics-file", type=str, help="Write Prometheus text metrics to this file at the end of the run.")
+    parser.add_argument("--metrics-port", type=int, help="Serve live Prometheus metrics on this port during the run.")
+    parser.add_argument("--report", type=str, help="Write a JSON run report (stage timings, counters) to this file.")
+
+
+def start_from_args(args):
+    """Restarts the run clock and starts the metrics endpoint if one was requested."""
+    METRICS.reset()
+    if args.metrics_port:
+        METRICS.serve(args.metrics_port)
+        print(f"Serving metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+
+
+def finish_from_args(args):
+    """Prints the stage summary and writes the outputs requested on the command line."""
+    METRICS.print_summary()
+    if args.metrics_file:
+        METRICS.write_prometheus(args.metrics_file)
+    if args.report:
+        METRICS.write_report(args.report)
@@ -0,0 +1,252 @@
+import os
+import ast
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pandas as pd
+
+from bulk_load import discover_files, group_files, _read_csvs
+
+HOST = "127.0.0.1"
+PORT = 8766
+EQUITY_PATH = "/api/historical/cm/equity"
+INDEX_PATH = "/Backpage.aspx/getHistoricaldatatabletoString"
+SESSION_COOKIE = "nsit"
+
+
+class MockData:
+    """
+    API payloads rebuilt from the CSV tree under data/.
+
+    Equity CSVs are the NSE API's own records, so their rows are replayed as they are;
+    index CSVs are turned back into niftyindices records. Everything is held in memory
+    sorted by date, and responses for a window are slices of it.
+    """
+
+    def __init__(self, data_dir="data"):
+        self.equity = {}
+        self.index = {}
+        self.constituents = {}
+        for kind, paths, index_name in group_files(discover_files(data_dir)):
+            df = _read_csvs(paths)
+            if kind == "index":
+                self._add_index(index_name, df)
+            else:
+                symbol = os.path.basename(os.path.dirname(paths[0])).upper()
+                # Keyed like the registry's constituents, e.g. "NIFTY_METAL".
+                self.constituents.setdefault(index_name.replace(" ", "_"), []).append(symbol)
+                if symbol not in self.equity:
+                    self._add_equity(symbol, df)
+
+    def _add_equity(self, symbol, df):
+        df = df.drop_duplicates(subset=['CH_TIMESTAMP']).sort_values('CH_TIMESTAMP').reset_index(drop=True)
+        self.equity[symbol] = (pd.to_datetime(df['CH_TIMESTAMP']).to_numpy(), df)
+
+    def _add_index(self, name, df):
+        if 'date_key' in df:
+            dates = pd.to_datetime(df['date_key'])
+            prices = df[['open', 'high', 'low', 'close']]
+        else:
+            dates = pd.to_datetime(df['Date'], format="%d %b %Y")
+            prices = df[['Open', 'High', 'Low', 'Close']]
+        out = pd.DataFrame({
+            'INDEX_NAME': name,
+            'HistoricalDate': dates.dt.strftime('%d %b %Y'),
+            'OPEN': prices.iloc[:, 0], 'HIGH': prices.iloc[:, 1], 'LOW': prices.iloc[:, 2], 'CLOSE': prices.iloc[:, 3],
+        })
+        out['_date'] = dates
+        out = out.drop_duplicates(subset=['_date']).sort_values('_date').reset_index(drop=True)
+        self.index[name.upper()] = (out['_date'].to_numpy(), out.drop(columns='_date'))
+
+    @staticmethod
+    def _window(entry, start, end):
+        dates, df = entry
+        lo, hi = dates.searchsorted(pd.Timestamp(start).to_datetime64()), dates.searchsorted(pd.Timestamp(end).to_datetime64(), side='right')
+        return df.iloc[lo:hi]
+
+    def equity_body(self, symbol, from_date, to_date):
+        """The /api/historical/cm/equity body for a DD-MM-YYYY window, newest row first like NSE."""
+        entry = self.equity.get(symbol.upper())
+        rows = "[]" if entry is None else self._window(
+            entry, pd.to_datetime(from_date, format="%d-%m-%Y"), pd.to_datetime(to_date, format="%d-%m-%Y")
+        ).iloc[::-1].to_json(orient='records')
+        return f'{{"data": {rows}, "meta": {{"symbols": {json.dumps([symbol])}}}}}'
+
+    def index_body(self, name, start_date, end_date):
+        """The getHistoricaldatatabletoString body for a DD-Mon-YYYY window: {"d": "<JSON string>"}."""
+        entry = self.index.get(name.upper())
+        rows = "[]" if entry is None else self._window(
+            entry, pd.to_datetime(start_date, format="%d-%b-%Y"), pd.to_datetime(end_date, format="%d-%b-%Y")
+        ).iloc[::-1].to_json(orient='records')
+        return json.dumps({"d": rows})
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with bursts of up to `rate`."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Serves the NSE homepage/equity API and the niftyindices history API from MockData."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "MockNSE/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        self.server.record(status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _admit(self):
+        """Applies the configured latency, rate limit and error rate; False when the request was rejected."""
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency * random.uniform(0.5, 1.5))
+        if not server.take_token(self.client_address[0]):
+            self._send(429, b'{"error": "rate limited"}', headers={"Retry-After": "1"})
+            return False
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(503, b'{"error": "injected failure"}')
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/":
+            self._send(200, b"<html>mock nse</html>", "text/html", {"Set-Cookie": f"{SESSION_COOKIE}=mock; Path=/"})
+            return
+        if url.path != EQUITY_PATH:
+            self._send(404, b'{"error": "not found"}')
+            return
+        if f"{SESSION_COOKIE}=" not in self.headers.get("Cookie", ""):
+            # NSE rejects API calls from sessions that never loaded the homepage.
+            self._send(401, b'{"error": "no session"}')
+            return
+        if not self._admit():
+            return
+        query = parse_qs(url.query)
+        try:
+            body = self.server.data.equity_body(query["symbol"][0], query["from"][0], query["to"][0])
+        except (KeyError, ValueError) as e:
+            self._send(400, json.dumps({"error": str(e)}).encode())
+            return
+        self._send(200, body.encode())
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = self.rfile.read(length)
+        if urlsplit(self.path).path != INDEX_PATH:
+            self._send(404, b'{"error": "not found"}')
+            return
+        if not self._admit():
+            return
+        try:
+            # cinfo is a dict literal with single quotes, exactly as the real site expects.
+            cinfo = ast.literal_eval(json.loads(payload)["cinfo"])
+            body = self.server.data.index_body(cinfo["name"], cinfo["startDate"], cinfo["endDate"])
+        except (KeyError, ValueError, SyntaxError) as e:
+            self._send(400, json.dumps({"error": str(e)}).encode())
+            return
+        self._send(200, body.encode())
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    Local stand-in for nseindia.com and niftyindices.com.
+
+    Point the downloaders at it with NSE_BASE_URL and NIFTYINDICES_BASE_URL set to
+    `url`. Responses can be delayed, failed with 503 and rate limited per client with
+    429 to exercise retry and throttling paths.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, data, host=HOST, port=PORT, latency=0.0, error_rate=0.0, rate_limit=None):
+        """
+        Args:
+            data (MockData): Payload source.
+            host, port: Address to bind; port 0 picks a free port.
+            latency (float): Mean response delay in seconds (uniformly jittered by +/-50%).
+            error_rate (float): Fraction of API requests answered with 503.
+            rate_limit (float, optional): API requests per second allowed per client address.
+        """
+        super().__init__((host, port), MockHandler)
+        self.data = data
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.counts = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def take_token(self, client):
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            bucket = self._buckets.setdefault(client, TokenBucket(self.rate_limit))
+            return bucket.take()
+
+    def record(self, status):
+        with self._lock:
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+    def start(self):
+        """Serves from a daemon thread and returns self."""
+        threading.Thread(target=self.serve_forever, name="mock-nse", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the NSE equity and niftyindices history APIs.")
+    parser.add_argument("--data-dir", type=str, default="data", help="CSV tree the payloads are generated from.")
+    parser.add_argument("--host", type=str, default=HOST, help="Interface to bind.")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to listen on.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean response delay in milliseconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failed with 503.")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second per client before 429s.")
+    args = parser.parse_args()
+
+    data = MockData(args.data_dir)
+    server = MockServer(data, args.host, args.port, args.latency_ms / 1000, args.error_rate, args.rate_limit)
+    print(f"Serving {len(data.equity)} symbols and {len(data.index)} indices on {server.url}")
+    print(f"Use NSE_BASE_URL={server.url} NIFTYINDICES_BASE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
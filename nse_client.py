@@ -0,0 +1,384 @@
+import os
+import json
+import codecs
+import time
+import threading
+import queue
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+
+from datetime import datetime
+
+from response_cache import is_historical, OfflineCacheMiss
+from metrics import METRICS, DOWNLOAD, DECODE
+from streaming import iter_json_array
+
+# NSE_BASE_URL points the client at another server, e.g. mock_nse.py for benchmarks.
+NSE_HOME_URL = os.environ.get("NSE_BASE_URL", "https://www.nseindia.com")
+EQUITY_API_URL = f"{NSE_HOME_URL}/api/historical/cm/equity"
+
+NSE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
+    'Accept': 'application/json, text/javascript, */*; q=0.01',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'X-Requested-With': 'XMLHttpRequest'
+}
+
+# Status codes NSE returns when the session cookies have expired.
+REWARM_STATUS_CODES = (401, 403)
+
+
+class TokenBucket:
+    """
+    Paces callers to `rate` requests per second with bursts of up to `burst`.
+
+    Tokens are reserved under a lock and the wait happens outside it, so concurrent
+    callers queue up in arrival order. `throttle` halves the rate after a 429 and
+    `recover` creeps back towards the configured rate on every success.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.max_rate = self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, sleeping until it is available; returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def throttle(self):
+        with self._lock:
+            self.rate = max(self.max_rate / 8, self.rate / 2)
+
+    def recover(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate * 1.05)
+
+
+class HostLimiter:
+    """
+    Caps the number of in-flight requests per host so that many workers can share
+    one process without tripping the exchange's throttling, and optionally paces each
+    host's requests with a TokenBucket.
+    """
+
+    def __init__(self, default_limit=4, limits=None, default_rate=None, rates=None):
+        """
+        Args:
+            default_limit (int): Concurrent requests allowed for hosts not listed in `limits`.
+            limits (dict, optional): Per-host overrides, e.g. {"www.nseindia.com": 2}.
+            default_rate (float, optional): Requests per second allowed for hosts not listed
+                in `rates`. None leaves requests unpaced.
+            rates (dict, optional): Per-host rate overrides.
+        """
+        self.default_limit = default_limit
+        self.limits = dict(limits or {})
+        self.default_rate = default_rate
+        self.rates = dict(rates or {})
+        self._semaphores = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.limits.get(host, self.default_limit))
+            return self._semaphores[host]
+
+    def _bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                rate = self.rates.get(host, self.default_rate)
+                self._buckets[host] = TokenBucket(rate) if rate else None
+            return self._buckets[host]
+
+    @contextmanager
+    def slot(self, url):
+        """Blocks until a request slot for the url's host is free and its rate allows a request."""
+        host = urlparse(url).netloc
+        with self._semaphore(host):
+            bucket = self._bucket(host)
+            if bucket is not None:
+                waited = bucket.acquire()
+                if waited:
+                    METRICS.inc("nse_pacing_seconds_total", waited, host=host)
+            yield
+
+    def throttle(self, url):
+        """Slows the url's host down after it answered 429."""
+        host = urlparse(url).netloc
+        METRICS.inc("nse_throttled_total", host=host)
+        bucket = self._bucket(host)
+        if bucket is not None:
+            bucket.throttle()
+
+    def recover(self, url):
+        bucket = self._bucket(urlparse(url).netloc)
+        if bucket is not None:
+            bucket.recover()
+
+
+class SessionPool:
+    """
+    A small pool of cookie-warmed `requests.Session` objects shared between worker threads.
+
+    Sessions are warmed once by visiting the NSE homepage and are only re-warmed when the
+    API answers with 401 or 403.
+    """
+
+    def __init__(self, size=4, warm_url=NSE_HOME_URL, headers=None, timeout=30):
+        """
+        Args:
+            size (int): Maximum number of sessions kept in the pool.
+            warm_url (str): Page visited to obtain the cookies the API requires.
+            headers (dict, optional): Headers sent with every request. Defaults to NSE_HEADERS.
+            timeout (int): Timeout in seconds for warm-up requests.
+        """
+        self.size = size
+        self.warm_url = warm_url
+        self.headers = dict(headers or NSE_HEADERS)
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def warm(self, session):
+        """Drops any stale cookies and revisits the homepage to obtain fresh ones."""
+        METRICS.inc("nse_session_warms_total")
+        session.cookies.clear()
+        session.get(self.warm_url, headers=self.headers, timeout=self.timeout)
+
+    def _new_session(self):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        self.warm(session)
+        return session
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._new_session()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def session(self):
+        """Borrows a warmed session from the pool and returns it when done."""
+        session = self._acquire()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+    def close(self):
+        """Closes every idle session in the pool."""
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            session.close()
+            with self._lock:
+                self._created -= 1
+
+
+def record_response(response):
+    """Counts a response and its size under the host it came from."""
+    host = urlparse(response.url).netloc
+    METRICS.inc("nse_http_requests_total", host=host, status=response.status_code)
+    METRICS.inc("nse_http_bytes_total", len(response.content), host=host)
+
+
+def get_text(pool, limiter, url, headers=None, timeout=30):
+    """
+    Performs a GET through a pooled session, re-warming the session once on 401/403.
+
+    Args:
+        pool (SessionPool): The session pool to borrow from.
+        limiter (HostLimiter): Per-host concurrency limiter.
+        url (str): The URL to fetch.
+        headers (dict, optional): Extra headers for this request.
+        timeout (int): Request timeout in seconds.
+
+    Returns:
+        str: The response body.
+    """
+    with pool.session() as session:
+        with limiter.slot(url), METRICS.timer(DOWNLOAD):
+            response = session.get(url, headers=headers, timeout=timeout)
+        record_response(response)
+        if response.status_code in REWARM_STATUS_CODES:
+            print(f"Received {response.status_code}, re-warming session...")
+            METRICS.inc("nse_session_rewarms_total")
+            pool.warm(session)
+            with limiter.slot(url), METRICS.timer(DOWNLOAD):
+                response = session.get(url, headers=headers, timeout=timeout)
+            record_response(response)
+        response.raise_for_status()
+        return response.text
+
+
+def get_json(pool, limiter, url, headers=None, timeout=30):
+    """Like `get_text`, but returns the decoded JSON body."""
+    return json.loads(get_text(pool, limiter, url, headers=headers, timeout=timeout))
+
+
+def stream_text(pool, limiter, url, headers=None, timeout=30, chunk_size=1 << 16):
+    """
+    Like `get_text`, but yields the body in decoded text chunks as they arrive.
+
+    The session stays borrowed until the generator is exhausted or closed, so callers
+    should consume it promptly. Response bytes are counted as they are read rather than
+    from a buffered body.
+
+    Args:
+        pool (SessionPool): The session pool to borrow from.
+        limiter (HostLimiter): Per-host concurrency limiter.
+        url (str): The URL to fetch.
+        headers (dict, optional): Extra headers for this request.
+        timeout (int): Request timeout in seconds.
+        chunk_size (int): Bytes read from the socket per chunk.
+
+    Yields:
+        str: Consecutive pieces of the response body.
+    """
+    host = urlparse(url).netloc
+    with pool.session() as session:
+        with limiter.slot(url), METRICS.timer(DOWNLOAD):
+            response = session.get(url, headers=headers, timeout=timeout, stream=True)
+        if response.status_code in REWARM_STATUS_CODES:
+            METRICS.inc("nse_http_requests_total", host=host, status=response.status_code)
+            response.close()
+            print(f"Received {response.status_code}, re-warming session...")
+            METRICS.inc("nse_session_rewarms_total")
+            pool.warm(session)
+            with limiter.slot(url), METRICS.timer(DOWNLOAD):
+                response = session.get(url, headers=headers, timeout=timeout, stream=True)
+        METRICS.inc("nse_http_requests_total", host=host, status=response.status_code)
+        try:
+            response.raise_for_status()
+            # Incremental decoding keeps multi-byte characters split across chunks intact.
+            decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                METRICS.inc("nse_http_bytes_total", len(chunk), host=host)
+                yield decoder.decode(chunk)
+            yield decoder.decode(b"", final=True)
+        finally:
+            response.close()
+
+
+def iter_equity_chunk(pool, limiter, symbol, from_date, to_date, series="EQ", cache=None):
+    """
+    Yields the records of one window of historical equity data as the response arrives.
+
+    The 'data' array is decoded element by element (see streaming.iter_json_array), so
+    a window never has to be held as one body string plus one decoded list. Takes the
+    same arguments as `fetch_equity_chunk`; cacheable windows are still stored whole.
+    """
+    params = {"symbol": symbol, "series": series, "from": from_date, "to": to_date}
+    cacheable = cache is not None and is_historical(to_date)
+    body = None
+    if cacheable or (cache is not None and cache.offline):
+        try:
+            body = cache.get(EQUITY_API_URL, params)
+        except OfflineCacheMiss:
+            # Adaptive windows rarely line up with the cached ones; replay overlapping entries.
+            yield from _replay_covering(cache, params)
+            return
+        if body is not None:
+            METRICS.inc("nse_cache_hits_total", endpoint="equity")
+    if body is not None:
+        chunks = [body]
+    else:
+        url = f"{EQUITY_API_URL}?symbol={symbol}&series=[%22{series}%22]&from={from_date}&to={to_date}"
+        headers = {'Referer': f'{NSE_HOME_URL}/get-quotes/equity?symbol={symbol}'}
+        chunks = stream_text(pool, limiter, url, headers=headers)
+        if cacheable:
+            chunks = _tee(chunks, lambda text: cache.put(EQUITY_API_URL, params, text))
+
+    records = iter_json_array(chunks)
+    decode_seconds = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                record = next(records)
+            except StopIteration:
+                break
+            finally:
+                decode_seconds += time.perf_counter() - start
+            yield record
+        # Read past the array so a cacheable body is complete and the session is released.
+        for _ in chunks:
+            pass
+    finally:
+        records.close()
+        if not isinstance(chunks, list):
+            chunks.close()
+        METRICS.observe("nse_stage_seconds", decode_seconds, stage=DECODE)
+
+
+def _replay_covering(cache, params):
+    """Yields the rows of cached windows overlapping `params`, clipped to its range and de-duplicated."""
+    bodies = cache.covering(EQUITY_API_URL, params, "from", "to")
+    METRICS.inc("nse_cache_hits_total", len(bodies), endpoint="equity")
+    start = datetime.strptime(params["from"], "%d-%m-%Y").strftime("%Y-%m-%d")
+    end = datetime.strptime(params["to"], "%d-%m-%Y").strftime("%Y-%m-%d")
+    seen = set()
+    for body in bodies:
+        for record in iter_json_array([body]):
+            day = (record.get("CH_TIMESTAMP") or "")[:10]
+            if start <= day <= end and day not in seen:
+                seen.add(day)
+                yield record
+
+
+def _tee(chunks, on_complete):
+    """Passes chunks through and hands their concatenation to `on_complete` once exhausted."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    on_complete("".join(parts))
+
+
+def fetch_equity_chunk(pool, limiter, symbol, from_date, to_date, series="EQ", cache=None):
+    """
+    Fetches one window of historical equity data from the NSE API.
+
+    Args:
+        pool (SessionPool): The session pool to borrow from.
+        limiter (HostLimiter): Per-host concurrency limiter.
+        symbol (str): The stock symbol (e.g., "MARUTI").
+        from_date (str): The start date in DD-MM-YYYY format.
+        to_date (str): The end date in DD-MM-YYYY format.
+        series (str, optional): The series type. Defaults to "EQ".
+        cache (ResponseCache, optional): Serves and stores windows that end before today.
+
+    Returns:
+        list: The rows in the response's 'data' array (empty if none).
+    """
+    return list(iter_equity_chunk(pool, limiter, symbol, from_date, to_date, series=series, cache=cache))
@@ -0,0 +1,21 @@
+import json
+
+from nse_client import iter_equity_chunk, EQUITY_API_URL
+from response_cache import ResponseCache
+
+
+def body(days):
+    return json.dumps({"data": [{"CH_SYMBOL": "A", "CH_TIMESTAMP": day} for day in days]})
+
+
+def test_offline_replay_clips_and_deduplicates_overlapping_windows(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put(EQUITY_API_URL, {"symbol": "A", "series": "EQ", "from": "01-01-2020", "to": "10-01-2020"},
+              body(["2020-01-02", "2020-01-09"]))
+    cache.put(EQUITY_API_URL, {"symbol": "A", "series": "EQ", "from": "08-01-2020", "to": "20-01-2020"},
+              body(["2020-01-09", "2020-01-15", "2020-01-20"]))
+
+    offline = ResponseCache(str(tmp_path), offline=True)
+    # No pool or limiter: an offline replay must never touch the network.
+    records = iter_equity_chunk(None, None, "A", "05-01-2020", "16-01-2020", cache=offline)
+    assert [record["CH_TIMESTAMP"] for record in records] == ["2020-01-09", "2020-01-15"]
@@ -0,0 +1,352 @@
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db_writer import DB_PATH, add_write_listener, remove_write_listener
+from storage import is_postgres, get_storage, STORAGE_ERRORS
+
+OHLC_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+INDEX_FIELDS = ('open', 'high', 'low', 'close')
+
+# Decoded blocks kept in memory per client, and how often another process's writes are
+# looked for (writes made in this process invalidate the cache immediately).
+CACHE_BYTES = 256 * 2 ** 20
+POLL_INTERVAL = 1.0
+
+EQUITY = "equity"
+ADJUSTED = "adjusted"
+INDEX = "index"
+
+# Block queries per kind: one row per instrument and date, ordered so the first row of
+# a duplicated (instrument, date) is the one kept (the EQ series for equities).
+BLOCK_QUERIES = {
+    EQUITY: """
+        SELECT CH_SYMBOL AS name, CH_TIMESTAMP AS date_key, CH_OPENING_PRICE AS open, CH_TRADE_HIGH_PRICE AS high,
+               CH_TRADE_LOW_PRICE AS low, CH_CLOSING_PRICE AS close, CH_TOT_TRADED_QTY AS volume
+        FROM stock_company_price_daily WHERE CH_SYMBOL IN ({placeholders}) AND CH_TIMESTAMP IS NOT NULL
+        ORDER BY CH_SYMBOL, CH_TIMESTAMP, CASE WHEN CH_SERIES = 'EQ' THEN 0 ELSE 1 END
+    """,
+    ADJUSTED: """
+        SELECT CH_SYMBOL AS name, date_key, open, high, low, close, volume
+        FROM stock_company_price_adjusted WHERE CH_SYMBOL IN ({placeholders})
+        ORDER BY CH_SYMBOL, date_key
+    """,
+    INDEX: """
+        SELECT index_name AS name, date_key, open, high, low, close
+        FROM stock_index_price_daily WHERE index_name IN ({placeholders}) AND date_key IS NOT NULL
+        ORDER BY index_name, date_key
+    """,
+}
+
+BLOCK_FIELDS = {EQUITY: OHLC_FIELDS, ADJUSTED: OHLC_FIELDS, INDEX: INDEX_FIELDS}
+
+# Which blocks a write notification for a table invalidates.
+TABLE_KINDS = {
+    "stock_company_price_daily": EQUITY,
+    "stock_company_price_adjusted": ADJUSTED,
+    "stock_index_price_daily": INDEX,
+}
+
+_EMPTY_DATES = np.array([], dtype='datetime64[D]')
+
+
+def _day(value):
+    """'2025-11-21', a datetime or a Timestamp -> numpy datetime64[D]; None stays None."""
+    return None if value is None else np.datetime64(pd.Timestamp(value).date(), 'D')
+
+
+class QueryClient:
+    """
+    Read API over the price tables with an in-memory cache of decoded history.
+
+    Each instrument's full history is read once and kept as a block: a sorted
+    datetime64[D] array plus a float64 (dates x fields) array. Range queries slice the
+    cached blocks with a binary search, so repeated analysis over the same instruments
+    runs no SQL and parses nothing. Blocks are evicted least-recently-used once their
+    total size exceeds `cache_bytes`.
+
+    The cache listens to db_writer's write notifications and drops exactly the blocks a
+    write touched. Writes made by other processes are detected through the write counter
+    in db_meta, which is polled at most every `poll_interval` seconds and clears the
+    whole cache when it moves unexpectedly.
+    """
+
+    def __init__(self, target=DB_PATH, cache_bytes=CACHE_BYTES, poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            target (str): SQLite path or PostgreSQL URL.
+            cache_bytes (int): Upper bound on the memory held by cached blocks.
+            poll_interval (float): Seconds between write counter checks.
+        """
+        self.target = target
+        self.cache_bytes = cache_bytes
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self._blocks = OrderedDict()
+        self._bytes = 0
+        self._counter = None
+        self._checked = 0.0
+        # Bumped on every invalidation, so a block read before a write commits is never cached after it.
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+        add_write_listener(self._on_write)
+
+    def _connection(self):
+        """This thread's read-only SQLite connection, opened on first use and reused afterwards."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = f"{Path(self.target).absolute().as_uri()}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _read_frame(self, query, params=()):
+        if is_postgres(self.target):
+            # PostgresStorage reads through its own connection pool.
+            return get_storage(self.target).read_frame(query, params)
+        return pd.read_sql_query(query, self._connection(), params=params)
+
+    def _read_counter(self):
+        try:
+            df = self._read_frame("SELECT value FROM db_meta WHERE key = 'write_counter'")
+        except STORAGE_ERRORS:
+            return 0
+        return int(df['value'].iloc[0]) if len(df) else 0
+
+    def _on_write(self, db_path, counter, touched):
+        if db_path != self.target:
+            return
+        with self._lock:
+            for table, names in touched.items():
+                kind = TABLE_KINDS.get(table)
+                for name in names if kind else ():
+                    block = self._blocks.pop((kind, name), None)
+                    if block is not None:
+                        self._bytes -= block[0].nbytes + block[1].nbytes
+            self._generation += 1
+            if self._counter is not None:
+                # A gap means another process wrote in between, and any block may be stale.
+                if counter > self._counter + 1:
+                    self._clear_locked()
+                self._counter = max(self._counter, counter)
+
+    def _check_counter(self):
+        now = time.monotonic()
+        if now - self._checked < self.poll_interval:
+            return
+        counter = self._read_counter()
+        with self._lock:
+            self._checked = now
+            if counter != self._counter:
+                if self._counter is not None:
+                    self._clear_locked()
+                self._counter = counter
+
+    def data_version(self):
+        """
+        Returns the write counter the cached data corresponds to.
+
+        It changes whenever new rows land, which makes it usable as a validator for
+        anything derived from query results (e.g. HTTP ETags).
+        """
+        self._check_counter()
+        with self._lock:
+            return self._counter
+
+    def _clear_locked(self):
+        self._blocks.clear()
+        self._bytes = 0
+        self._generation += 1
+
+    def clear(self):
+        """Drops every cached block."""
+        with self._lock:
+            self._clear_locked()
+
+    def cache_info(self):
+        """Returns hit/miss counts and the number and size of cached blocks."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "blocks": len(self._blocks),
+                    "bytes": self._bytes, "max_bytes": self.cache_bytes}
+
+    def _load(self, kind, names):
+        """Reads and decodes the blocks of `names` in one query; returns name -> block."""
+        fields = BLOCK_FIELDS[kind]
+        df = self._read_frame(BLOCK_QUERIES[kind].format(placeholders=', '.join('?' * len(names))), list(names))
+        df = df.drop_duplicates(subset=['name', 'date_key'])
+        dates = pd.to_datetime(df['date_key']).to_numpy().astype('datetime64[D]')
+        values = df[list(fields)].to_numpy(dtype=float)
+        instruments = df['name'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, instruments[1:] != instruments[:-1]]) if len(df) else np.array([], dtype=int)
+        bounds = np.r_[starts, len(df)]
+        blocks = {name: (_EMPTY_DATES, np.empty((0, len(fields)))) for name in names}
+        for i, start in enumerate(starts):
+            # Copies, so evicting a block frees its memory instead of pinning the whole result.
+            blocks[instruments[start]] = (dates[start:bounds[i + 1]].copy(), values[start:bounds[i + 1]].copy())
+        return blocks
+
+    def _blocks_for(self, kind, names):
+        """Returns the cached blocks of `names`, reading the missing ones in a single query."""
+        self._check_counter()
+        found, missing = {}, []
+        with self._lock:
+            for name in names:
+                block = self._blocks.get((kind, name))
+                if block is None:
+                    missing.append(name)
+                else:
+                    self._blocks.move_to_end((kind, name))
+                    found[name] = block
+            self.hits += len(found)
+            self.misses += len(missing)
+            generation = self._generation
+        if not missing:
+            return found
+
+        loaded = self._load(kind, missing)
+        found.update(loaded)
+        with self._lock:
+            if generation == self._generation:
+                for name, block in loaded.items():
+                    self._blocks[(kind, name)] = block
+                    self._bytes += block[0].nbytes + block[1].nbytes
+                while self._bytes > self.cache_bytes and self._blocks:
+                    _, (dates, values) = self._blocks.popitem(last=False)
+                    self._bytes -= dates.nbytes + values.nbytes
+        return found
+
+    def _query(self, kind, names, start, end, fields, as_frame):
+        names = [names] if isinstance(names, str) else list(names)
+        names = list(dict.fromkeys(name.upper() for name in names))
+        all_fields = BLOCK_FIELDS[kind]
+        fields = all_fields if fields is None else tuple(fields)
+        columns = [all_fields.index(field) for field in fields]
+        start, end = _day(start), _day(end)
+
+        try:
+            blocks = self._blocks_for(kind, names) if names else {}
+        except STORAGE_ERRORS as e:
+            print(f"Database error while reading {kind} data: {e}")
+            blocks = {}
+
+        sliced = []
+        for name in names:
+            dates, values = blocks.get(name, (_EMPTY_DATES, np.empty((0, len(all_fields)))))
+            lo = 0 if start is None else np.searchsorted(dates, start, side='left')
+            hi = len(dates) if end is None else np.searchsorted(dates, end, side='right')
+            sliced.append((dates[lo:hi], values[lo:hi]))
+
+        # Align every instrument on the union of their dates; missing sessions are NaN.
+        dates = np.unique(np.concatenate([d for d, _ in sliced])) if sliced else _EMPTY_DATES
+        cube = np.full((len(fields), len(dates), len(names)), np.nan)
+        for j, (block_dates, values) in enumerate(sliced):
+            rows = np.searchsorted(dates, block_dates)
+            cube[:, rows, j] = values[:, columns].T
+
+        if not as_frame:
+            return dates, {field: cube[i] for i, field in enumerate(fields)}
+        frame = pd.DataFrame(
+            cube.transpose(1, 0, 2).reshape(len(dates), len(fields) * len(names)),
+            index=pd.DatetimeIndex(dates, name='date_key'),
+            columns=pd.MultiIndex.from_product([fields, names], names=['field', 'name']),
+        )
+        return frame
+
+    def get_ohlc(self, symbols, start=None, end=None, adjusted=False, fields=None, as_frame=True):
+        """
+        Daily OHLC and volume of equities, aligned on a common date axis.
+
+        Args:
+            symbols (str or list): Symbols, e.g. ["TATASTEEL", "HINDALCO"].
+            start, end (str or datetime, optional): Inclusive date bounds.
+            adjusted (bool): Use split/bonus adjusted prices (stock_company_price_adjusted).
+            fields (list, optional): Subset of OHLC_FIELDS. Defaults to all of them.
+            as_frame (bool): Return a DataFrame instead of NumPy arrays.
+
+        Returns:
+            DataFrame with a date_key index and (field, symbol) columns, or, when
+            `as_frame` is False, a tuple (dates, {field: dates x symbols array}).
+        """
+        return self._query(ADJUSTED if adjusted else EQUITY, symbols, start, end, fields, as_frame)
+
+    def get_index(self, names, start=None, end=None, fields=None, as_frame=True):
+        """
+        Daily OHLC of indices, aligned on a common date axis.
+
+        Args:
+            names (str or list): Index names, e.g. ["NIFTY IT", "NIFTY METAL"].
+            start, end (str or datetime, optional): Inclusive date bounds.
+            fields (list, optional): Subset of INDEX_FIELDS. Defaults to all of them.
+            as_frame (bool): Return a DataFrame instead of NumPy arrays.
+
+        Returns:
+            DataFrame with a date_key index and (field, index_name) columns, or, when
+            `as_frame` is False, a tuple (dates, {field: dates x indices array}).
+        """
+        return self._query(INDEX, names, start, end, fields, as_frame)
+
+    def close(self):
+        """Stops listening for writes and closes the read connections."""
+        remove_write_listener(self._on_write)
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._clear_locked()
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(target=DB_PATH):
+    """Returns the shared QueryClient of a SQLite path or PostgreSQL URL."""
+    with _clients_lock:
+        client = _clients.get(target)
+        if client is None:
+            client = _clients[target] = QueryClient(target)
+        return client
+
+
+def get_ohlc(symbols, start=None, end=None, adjusted=False, fields=None, as_frame=True, db_path=DB_PATH):
+    """Equity OHLC through the shared client of `db_path`; see QueryClient.get_ohlc."""
+    return get_client(db_path).get_ohlc(symbols, start, end, adjusted, fields, as_frame)
+
+
+def get_index(names, start=None, end=None, fields=None, as_frame=True, db_path=DB_PATH):
+    """Index OHLC through the shared client of `db_path`; see QueryClient.get_index."""
+    return get_client(db_path).get_index(names, start, end, fields, as_frame)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print aligned price history of symbols or indices.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--symbol", type=str, nargs="+", help="Equity symbols, e.g. TATASTEEL.")
+    group.add_argument("--index", type=str, nargs="+", help="Index names, e.g. 'NIFTY IT'.")
+    parser.add_argument("--start", type=str, help="First date (YYYY-MM-DD).")
+    parser.add_argument("--end", type=str, help="Last date (YYYY-MM-DD).")
+    parser.add_argument("--field", type=str, default="close", help="Field to print.")
+    parser.add_argument("--adjusted", action="store_true", help="Use split/bonus adjusted equity prices.")
+    parser.add_argument("--db", type=str, default=DB_PATH, help="SQLite path or PostgreSQL URL.")
+    args = parser.parse_args()
+
+    start_time = datetime.now()
+    if args.symbol:
+        df = get_ohlc(args.symbol, args.start, args.end, adjusted=args.adjusted, fields=[args.field], db_path=args.db)
+    else:
+        df = get_index(args.index, args.start, args.end, fields=[args.field], db_path=args.db)
+    print(df[args.field].tail(20).to_string())
+    print(f"{len(df)} sessions read in {datetime.now() - start_time}.")
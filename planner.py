@@ -0,0 +1,161 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import TradingCalendar
+from storage import read_frame, STORAGE_ERRORS
+
+DB_PATH = "stock.db"
+
+# The NSE equity API rejects windows much longer than this.
+MAX_WINDOW_DAYS = 60
+
+
+def get_coverage(db_path=DB_PATH, index_name=None, symbols=None):
+    """
+    Reads the stored trading dates per (CH_SYMBOL, index_name) from stock_company_price_daily.
+
+    Args:
+        db_path (str): Path to the SQLite database or a PostgreSQL URL.
+        index_name (str, optional): Restrict to one index (e.g., "NIFTY METAL").
+        symbols (list, optional): Restrict to these symbols.
+
+    Returns:
+        dict: (symbol, index_name) -> sorted numpy array of datetime64[D] dates.
+    """
+    query = "SELECT CH_SYMBOL, index_name, CH_TIMESTAMP FROM stock_company_price_daily"
+    clauses, params = [], []
+    if index_name is not None:
+        clauses.append("index_name = ?")
+        params.append(index_name)
+    if symbols:
+        clauses.append(f"CH_SYMBOL IN ({', '.join('?' * len(symbols))})")
+        params.extend(symbols)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+
+    try:
+        df = read_frame(db_path, query, params)
+    except STORAGE_ERRORS as e:
+        print(f"Database error when reading coverage: {e}")
+        return {}
+
+    df["CH_TIMESTAMP"] = pd.to_datetime(df["CH_TIMESTAMP"], errors="coerce")
+    df = df.dropna(subset=["CH_TIMESTAMP"])
+    coverage = {}
+    for (symbol, name), group in df.groupby(["CH_SYMBOL", "index_name"]):
+        coverage[(symbol, name)] = np.unique(group["CH_TIMESTAMP"].values.astype("datetime64[D]"))
+    return coverage
+
+
+def get_empty_windows(db_path=DB_PATH, symbols=None):
+    """
+    Reads the historical windows the equity API answered with no rows.
+
+    Returns:
+        dict: (symbol, index_name) -> sorted numpy array of the datetime64[D] days they span.
+    """
+    query = "SELECT CH_SYMBOL, index_name, from_date, to_date FROM empty_windows"
+    params = []
+    if symbols:
+        query += f" WHERE CH_SYMBOL IN ({', '.join('?' * len(symbols))})"
+        params.extend(symbols)
+    try:
+        df = read_frame(db_path, query, params)
+    except STORAGE_ERRORS as e:
+        print(f"Database error when reading empty windows: {e}")
+        return {}
+
+    empty = {}
+    for symbol, name, from_date, to_date in df.itertuples(index=False):
+        days = np.arange(np.datetime64(from_date, "D"), np.datetime64(to_date, "D") + 1)
+        empty.setdefault((symbol, name), []).append(days)
+    return {key: np.unique(np.concatenate(spans)) for key, spans in empty.items()}
+
+
+def merge_into_windows(missing, max_window_days=MAX_WINDOW_DAYS):
+    """
+    Greedily packs sorted missing dates into the fewest windows of at most `max_window_days`.
+
+    Dates that are already stored but fall inside a window are simply re-requested; the
+    writer ignores duplicates, so merging nearby gaps is always cheaper than splitting them.
+
+    Args:
+        missing (numpy.ndarray): Sorted datetime64[D] dates that need fetching.
+
+    Returns:
+        list: (start, end) tuples of datetime64[D].
+    """
+    windows = []
+    if len(missing) == 0:
+        return windows
+    span = np.timedelta64(max_window_days, "D")
+    start = end = missing[0]
+    for day in missing[1:]:
+        if day - start <= span:
+            end = day
+        else:
+            windows.append((start, end))
+            start = end = day
+    windows.append((start, end))
+    return windows
+
+
+def missing_sessions(have, sessions, backfill=False, empty=None):
+    """
+    Returns the sessions not present in `have`.
+
+    Unless `backfill` is set, sessions before the first stored date are ignored so that
+    symbols listed after the start of the range are not re-requested on every run.
+    Days in `empty` (windows that already came back without rows) are never missing.
+    """
+    if len(have) and not backfill:
+        sessions = sessions[sessions >= have[0]]
+    missing = np.setdiff1d(sessions, have, assume_unique=True)
+    if empty is not None and len(empty):
+        missing = np.setdiff1d(missing, empty, assume_unique=True)
+    return missing
+
+
+def plan_requests(jobs, start, end, db_path=DB_PATH, calendar=None, max_window_days=MAX_WINDOW_DAYS, backfill=False):
+    """
+    Plans the minimal set of API windows needed to complete the stored history.
+
+    Args:
+        jobs (list): (index, symbol) tuples, e.g. [("NIFTY_METAL", "SAIL")].
+        start (str): First date of the desired history in DD-MM-YYYY format.
+        end (str): Last date of the desired history in DD-MM-YYYY format.
+        db_path (str): Path to the SQLite database.
+        calendar (TradingCalendar, optional): Defaults to a calendar learnt from the database.
+        max_window_days (int): Longest window the API accepts.
+        backfill (bool): Also request sessions before a symbol's first stored date.
+
+    Returns:
+        list: (index, symbol, from_date, to_date) tuples with dates in DD-MM-YYYY format.
+    """
+    if calendar is None:
+        calendar = TradingCalendar.from_db(db_path)
+    start_dt = datetime.strptime(start, "%d-%m-%Y")
+    end_dt = datetime.strptime(end, "%d-%m-%Y")
+    sessions = calendar.sessions(start_dt, end_dt).values.astype("datetime64[D]")
+
+    symbols = sorted({symbol for _, symbol in jobs})
+    coverage = get_coverage(db_path, symbols=symbols)
+    empty_windows = get_empty_windows(db_path, symbols=symbols)
+    empty = np.array([], dtype="datetime64[D]")
+
+    plan = []
+    for index, symbol in jobs:
+        key = (symbol, index.replace("_", " "))
+        have = coverage.get(key, empty)
+        missing = missing_sessions(have, sessions, backfill, empty_windows.get(key))
+        for window_start, window_end in merge_into_windows(missing, max_window_days):
+            plan.append((
+                index,
+                symbol,
+                pd.Timestamp(window_start).strftime("%d-%m-%Y"),
+                pd.Timestamp(window_end).strftime("%d-%m-%Y"),
+            ))
+    print(f"Planned {len(plan)} requests for {len(jobs)} symbols.")
+    return plan
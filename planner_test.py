@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from db_writer import BulkWriter, company_rows
+from planner import merge_into_windows, missing_sessions, plan_requests
+from trading_calendar import TradingCalendar
+
+
+def days(*values):
+    return np.array(values, dtype="datetime64[D]")
+
+
+def test_merge_into_windows_packs_nearby_gaps():
+    missing = days("2024-01-01", "2024-01-10", "2024-03-15", "2024-03-20")
+    windows = merge_into_windows(missing, max_window_days=60)
+    assert windows == [(missing[0], missing[1]), (missing[2], missing[3])]
+
+
+def test_missing_sessions_ignores_pre_listing_and_empty_windows():
+    sessions = days("2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05")
+    have = days("2024-01-02", "2024-01-05")
+    assert list(missing_sessions(have, sessions)) == list(days("2024-01-03", "2024-01-04"))
+    assert list(missing_sessions(have, sessions, backfill=True)) == list(days("2024-01-01", "2024-01-03", "2024-01-04"))
+    assert list(missing_sessions(have, sessions, empty=days("2024-01-03"))) == list(days("2024-01-04"))
+
+
+def test_calendar_treats_short_gaps_as_holidays_and_long_gaps_as_unfetched():
+    observed = pd.bdate_range("2024-01-01", "2024-03-29")
+    observed = observed.drop(pd.Timestamp("2024-03-25"))  # Holi
+    observed = observed.drop(pd.bdate_range("2024-02-05", "2024-02-16"))  # never fetched
+    calendar = TradingCalendar.from_sessions(list(observed) + [pd.Timestamp("2024-01-20")])
+
+    assert not calendar.is_session("2024-03-25")
+    assert calendar.is_session("2024-02-07")
+    assert calendar.is_session("2024-01-20")  # special weekend session
+    assert not calendar.is_session("2024-01-26")  # fixed holiday
+
+
+def test_plan_requests_uses_equity_dates_and_empty_windows(tmp_path):
+    db_path = str(tmp_path / "stock.db")
+    stored = [d.strftime("%Y-%m-%d") for d in pd.bdate_range("2024-01-01", "2024-01-31")
+              if d.strftime("%Y-%m-%d") not in ("2024-01-22", "2024-01-26")]
+    records = [{'CH_SYMBOL': 'SAIL', 'CH_SERIES': 'EQ', 'CH_TIMESTAMP': day} for day in stored]
+    with BulkWriter(db_path) as writer:
+        writer.stage_company_rows(company_rows(records, 'NIFTY METAL'))
+
+    # No index rows at all: 22 Jan is learnt as a holiday from the equity table alone.
+    assert plan_requests([("NIFTY_METAL", "SAIL")], "01-01-2024", "31-01-2024", db_path) == []
+
+    plan = plan_requests([("NIFTY_METAL", "SAIL")], "01-01-2024", "09-02-2024", db_path)
+    assert plan == [("NIFTY_METAL", "SAIL", "01-02-2024", "09-02-2024")]
+
+    with BulkWriter(db_path) as writer:
+        writer.record_empty_windows([("SAIL", "NIFTY METAL", "2024-02-01", "2024-02-09")])
+    assert plan_requests([("NIFTY_METAL", "SAIL")], "01-01-2024", "09-02-2024", db_path) == []
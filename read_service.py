@@ -0,0 +1,249 @@
+import json
+import zlib
+import hashlib
+import argparse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import numpy as np
+import pyarrow as pa
+
+from db_writer import DB_PATH
+from nsedata import get_client, OHLC_FIELDS, INDEX_FIELDS
+
+HOST = "127.0.0.1"
+PORT = 8765
+# Rows per streamed chunk (one JSON fragment, CSV block or Arrow record batch).
+STREAM_ROWS = 5000
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _param(query, name, default=None):
+    values = query.get(name)
+    return values[-1] if values else default
+
+
+def _response_format(query, accept):
+    """Picks the response format from ?format= or, failing that, the Accept header."""
+    requested = _param(query, "format")
+    if requested is None:
+        requested = "arrow" if "arrow" in accept else "csv" if "text/csv" in accept else "json"
+    if requested not in CONTENT_TYPES:
+        raise BadRequest(f"Unknown format '{requested}'; use one of {', '.join(CONTENT_TYPES)}.")
+    return requested
+
+
+def _fields(query, available):
+    """Parses ?fields=open,close against the fields a route offers."""
+    requested = _param(query, "fields")
+    if requested is None:
+        return list(available)
+    fields = [field.strip().lower() for field in requested.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown or not fields:
+        raise BadRequest(f"Unknown fields {unknown}; available: {', '.join(available)}.")
+    return fields
+
+
+def _day(value, name):
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise BadRequest(f"{name} must be YYYY-MM-DD, got '{value}'.")
+
+
+def _json_chunks(name, dates, columns, fields):
+    """Yields a {"name", "columns", "data"} document in row chunks."""
+    yield json.dumps({"name": name, "columns": ["date_key"] + fields})[:-1].encode() + b', "data": ['
+    for start in range(0, len(dates), STREAM_ROWS):
+        stop = start + STREAM_ROWS
+        rows = zip(dates[start:stop].astype(str).tolist(),
+                   *[np.where(np.isnan(column[start:stop]), None, column[start:stop]).tolist() for column in columns])
+        fragment = json.dumps([list(row) for row in rows])[1:-1]
+        yield (", " if start else "").encode() + fragment.encode()
+    yield b"]}"
+
+
+def _csv_chunks(name, dates, columns, fields):
+    yield (",".join(["date_key"] + fields) + "\n").encode()
+    for start in range(0, len(dates), STREAM_ROWS):
+        stop = start + STREAM_ROWS
+        text = [dates[start:stop].astype(str)]
+        for column in columns:
+            values = column[start:stop]
+            text.append(np.where(np.isnan(values), "", values.astype(str)))
+        yield ("\n".join(",".join(row) for row in zip(*text)) + "\n").encode()
+
+
+class _ChunkSink:
+    """Minimal writable file for pyarrow that collects what the IPC writer emits."""
+
+    def __init__(self):
+        self.buffer = []
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.buffer = b"".join(self.buffer), []
+        return data
+
+
+def _arrow_chunks(name, dates, columns, fields):
+    """Yields an Arrow IPC stream, one record batch per chunk."""
+    schema = pa.schema([("date_key", pa.date32())] + [(field, pa.float64()) for field in fields],
+                       metadata={"name": name})
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(sink, schema)
+    for start in range(0, len(dates), STREAM_ROWS):
+        stop = start + STREAM_ROWS
+        arrays = [pa.array(dates[start:stop], pa.date32())]
+        arrays += [pa.array(column[start:stop], pa.float64(), from_pandas=True) for column in columns]
+        writer.write_batch(pa.record_batch(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {"json": _json_chunks, "csv": _csv_chunks, "arrow": _arrow_chunks}
+
+
+class ReadHandler(BaseHTTPRequestHandler):
+    """
+    GET /ohlc/{symbol} and /index/{name}.
+
+    Query parameters: start, end (YYYY-MM-DD, inclusive), fields (comma-separated),
+    format (json, csv or arrow; also negotiated from Accept) and, for /ohlc, adjusted=1.
+    """
+
+    protocol_version = "HTTP/1.1"
+    db_path = DB_PATH
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_error(self, status, message):
+        body = json.dumps({"error": message}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPES["json"])
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        if len(parts) != 2 or parts[0] not in ("ohlc", "index") or not parts[1]:
+            self._send_error(404, "Use /ohlc/{symbol} or /index/{name}.")
+            return
+        route, name = parts[0], parts[1].upper()
+        query = parse_qs(url.query)
+        try:
+            file_format = _response_format(query, self.headers.get("Accept", ""))
+            fields = _fields(query, OHLC_FIELDS if route == "ohlc" else INDEX_FIELDS)
+            start = _day(_param(query, "start"), "start")
+            end = _day(_param(query, "end"), "end")
+            adjusted = _param(query, "adjusted", "0").lower() in ("1", "true", "yes")
+        except BadRequest as e:
+            self._send_error(400, str(e))
+            return
+
+        client = get_client(self.db_path)
+        gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        # The write counter changes whenever rows land, so it validates every response.
+        version = client.data_version()
+        etag = '"' + hashlib.sha1(
+            f"{version}|{route}|{name}|{start}|{end}|{','.join(fields)}|{adjusted}|{file_format}|{gzip}".encode()
+        ).hexdigest()[:32] + '"'
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if route == "ohlc":
+            dates, values = client.get_ohlc(name, start, end, adjusted=adjusted, fields=fields, as_frame=False)
+        else:
+            dates, values = client.get_index(name, start, end, fields=fields, as_frame=False)
+        if not len(dates) and start is None and end is None:
+            self._send_error(404, f"No data for {name}.")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[file_format])
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept, Accept-Encoding")
+        self.send_header("Transfer-Encoding", "chunked")
+        if gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+        columns = [values[field][:, 0] for field in fields]
+        for chunk in ENCODERS[file_format](name, dates, columns, fields):
+            if compressor:
+                chunk = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._write_chunk(chunk)
+        if compressor:
+            self._write_chunk(compressor.flush())
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def serve(host=HOST, port=PORT, db_path=DB_PATH):
+    """
+    Serves OHLC and index history over HTTP until interrupted.
+
+    Every request thread reads through the shared nsedata client of `db_path`, so
+    concurrent consumers are answered from its in-memory cache and only cache misses
+    reach the database (through read-only connections that never block an ingest).
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to listen on.
+        db_path (str): SQLite path or PostgreSQL URL.
+    """
+    handler = type("Handler", (ReadHandler,), {"db_path": db_path})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    print(f"Serving {db_path} on http://{host}:{port} (/ohlc/{{symbol}}, /index/{{name}}).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP read service for stored OHLC and index history.")
+    parser.add_argument("--host", type=str, default=HOST, help="Interface to bind.")
+    parser.add_argument("--port", type=int, default=PORT, help="Port to listen on.")
+    parser.add_argument("--db", type=str, default=DB_PATH, help="SQLite path or PostgreSQL URL.")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.db)
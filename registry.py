@@ -0,0 +1,436 @@
+import os
+import csv
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+# Next to this module, so every script finds the same registry whatever its working directory.
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "registry.db")
+# Seconds a fetched source is trusted before `refresh` revalidates it.
+TTL_SECONDS = 24 * 60 * 60
+
+# NIFTYINDICES_BASE_URL points the client at another server, e.g. mock_nse.py for benchmarks.
+NIFTYINDICES_URL = os.environ.get("NIFTYINDICES_BASE_URL", "https://www.niftyindices.com")
+INDEX_MAPPING_URL = os.environ.get("NIFTYINDICES_BLOB_URL", "https://iislliveblob.niftyindices.com") + "/assets/json/IndexMapping.json"
+CONSTITUENTS_URL = f"{NIFTYINDICES_URL}/IndexConstituent/{{}}"
+
+# Constituent list published by niftyindices.com for each sector, keyed by the folder
+# name the equity downloaders use (data/NIFTY_AUTO/<SYMBOL>/...).
+CONSTITUENT_LISTS = {
+    "NIFTY_AUTO": "ind_niftyautolist.csv",
+    "NIFTY_FINANCIAL_SERVICES": "ind_niftyfinancelist.csv",
+    "NIFTY_FMCG": "ind_niftyfmcglist.csv",
+    "NIFTY_IT": "ind_niftyitlist.csv",
+    "NIFTY_METAL": "ind_niftymetallist.csv",
+}
+
+# Older data/ folders that hold the constituents of a key above under another name.
+# NIFTY_FINANCIAL_SERVICES_25/50 predates the downloaders, which store the same symbols
+# under NIFTY_FINANCIAL_SERVICES; loading it under its own name would split their history.
+FOLDER_ALIASES = {
+    "NIFTY_FINANCIAL_SERVICES_25/50": "NIFTY_FINANCIAL_SERVICES",
+}
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Effective date of rows that predate the registry (the seed below).
+UNKNOWN_START = ""
+
+REGISTRY_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS registry_index (
+        index_name TEXT NOT NULL,
+        effective_from TEXT NOT NULL,
+        effective_to TEXT,
+        PRIMARY KEY (index_name, effective_from)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS registry_constituent (
+        index_key TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        effective_from TEXT NOT NULL,
+        effective_to TEXT,
+        PRIMARY KEY (index_key, symbol, effective_from)
+    ) WITHOUT ROWID
+    """,
+    # Validators of the last response per URL, for conditional GETs.
+    """
+    CREATE TABLE IF NOT EXISTS registry_source (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        checked_at REAL
+    )
+    """,
+)
+
+# Contents of an empty registry, so a fresh checkout works without any network call.
+SEED_INDICES = [
+    'NIFTY500 FLEXICAP', 'Nifty Pvt Bank', 'Nifty 200', 'Nifty 50', 'Nifty 500', 'Nifty Auto', 'Nifty Bank',
+    'Nifty Commodities', 'Nifty Consumption', 'Nifty CPSE', 'Nifty Div Opps 50', 'Nifty Energy',
+    'Nifty Fin Service', 'Nifty FMCG', 'Nifty GrowSect 15', 'Nifty Infra', 'Nifty IT', 'Nifty Media',
+    'Nifty Metal', 'Nifty Mid Liq 15', 'NIFTY MIDCAP 100', 'Nifty Midcap 50', 'Nifty MNC', 'Nifty Next 50',
+    'Nifty Pharma', 'Nifty PSE', 'Nifty PSU Bank', 'Nifty 100', 'NIFTY100 QUALTY30', 'Nifty Realty',
+    'Nifty Serv Sector', 'NIFTY SMLCAP 100', 'Nifty100 Liq 15', 'Nifty50 Div Point', 'Nifty50 PR 1x Inv',
+    'Nifty50 PR 2x Lev', 'Nifty50 TR 1x Inv', 'Nifty50 TR 2x Lev', 'Nifty50 Value 20', 'NIFTY 1D RATE INDEX',
+    'NIFTY 50 ARBITRAGE', 'NIFTY 50 FUTURES INDEX', 'NIFTY 50 FUTURES TR INDEX', 'NIFTY ADITYA BIRLA GROUP',
+    'NIFTY ALPHA 50', 'NIFTY FULL MIDCAP 100', 'NIFTY FULL SMALLCAP 100', 'Nifty HighBeta 50',
+    'Nifty Low Vol 50', 'NIFTY MAHINDRA GROUP', 'NIFTY MIDCAP 150', 'Nifty Shariah 25', 'NIFTY SMLCAP 250',
+    'NIFTY SMLCAP 50', 'NIFTY TATA GROUP', 'NIFTY TATA 25 CAP', 'NIFTY100 EQL WGT', 'NIFTY100 LOWVOL30',
+    'Nifty50 Shariah', 'NIFTY50 USD', 'Nifty500 Shariah', 'NIFTY 5YR BENCHMARK G-SEC INDEX', 'Nifty GS 10Yr',
+    'Nifty GS 10Yr Cln', 'Nifty GS 11 15Yr', 'Nifty GS 15YrPlus', 'Nifty GS 4 8Yr', 'Nifty GS 8 13Yr',
+    'Nifty GS Compsite', 'NIFTY AAA CORPORATE BOND', 'NIFTY AAA LONG-TERM CORPORATE BOND',
+    'NIFTY AAA MEDIUM-TERM CORPORATE BOND', 'NIFTY AAA SHORT-TERM CORPORATE BOND',
+    'NIFTY AAA ULTRA LONG-TERM CORPORATE BOND', 'NIFTY AAA ULTRA SHORT-TERM CORPORATE BOND',
+    'NIFTY ALPHALOWVOL', 'Nifty AQL 30', 'Nifty Qlty LV 30', 'Nifty AQLV 30', 'NIFTY50 EQL WGT',
+    'NIFTY 50 BLENDED 10 YR BENCHMARK G-SEC - GROWTH INDEX',
+    'NIFTY NEXT 50 BLENDED 10 YR BENCHMARK G-SEC - GROWTH INDEX', 'NIFTY 10 YEAR SDL INDEX', 'NIFTY SME EMERGE',
+    'Nifty500 Value 50', 'NIFTY200 QUALITY 30', 'Nifty100 Enh ESG', 'NIFTY100 ESG',
+    'Nifty BHARAT Bond Index - April 2023', 'BHARATBOND-APR30', 'BHARATBOND-APR25', 'BHARATBOND-APR31',
+    'NIFTY M150 QLTY50', 'NIFTY FINSRV25 50', 'Nifty100ESGSecLdr', 'Nifty200Momentm30', 'Nifty100 Alpha 30',
+    'Nifty CPSE Bond Plus SDL Sep 2024 50:50 Index', 'NIFTY HEALTHCARE', 'NIFTY MIDSML 400',
+    'NIFTY500 MULTICAP', 'Nifty PSU Bond Plus SDL Apr 2026 50:50 Index',
+    'Nifty AAA Bond Plus SDL Apr 2026 50:50 Index', 'NIFTY MICROCAP250', 'NIFTY INDIA MFG', 'Nifty New Consump',
+    'Nifty SDL Apr 2026 Top 20 Equal Weight Index',
+    'Nifty India Government Fully Accessible Route (FAR) Select 7 Bonds Index (USD)',
+    'Nifty India Government Fully Accessible Route (FAR) Select 7 Bonds Index (INR)', 'NIFTY CONSR DURBL',
+    'NIFTY OIL AND GAS', 'NIFTY LARGEMID250', 'Nifty SDL Plus PSU Bond Sep 2026 60:40 Index',
+    'NIFTY MID SELECT', 'Nifty PSU Bond Plus SDL Sep 2027 40:60 Index',
+    'Nifty PSU Bond Plus SDL Apr 2027 50:50 Index', 'NIFTY AAA BOND PLUS SDL APR 2031 70:30 INDEX',
+    'NIFTY AAA BOND PLUS SDL APR 2026 70:30 INDEX', 'NIFTY TOTAL MKT', 'Nifty NonCyc Cons', 'BHARATBOND-APR32',
+    'Nifty Mobility', 'NIFTY IND DIGITAL', 'NIFTY INTERNET', 'Nifty CPSE Bond Plus SDL Sep 2026 50:50 Index',
+    'Nifty SDL Apr 2027 Index', 'Nifty Ind Defence', 'Nifty SDL Apr 2027 Top 12 Equal Weight Index',
+    'Nifty SDL Apr 2032 Top 12 Equal Weight Index', 'Nifty FinSerExBnk', 'Nifty Housing', 'Nifty Trans Logis',
+    'Nifty SDL Plus G-Sec Jun 2028 30:70 Index', 'Nifty SDL Plus AAA PSU Bond Dec 2027 60:40 Index',
+    'Nifty SDL Jun 2027 Index', 'Nifty SDL Sep 2027 Index', 'Nifty AAA CPSE Bond Plus SDL Apr 2027 60:40 Index',
+    'Nifty G-Sec Jun 2027 Index', 'Nifty AQLV 30 Plus 5yr G-Sec 70:30 index', 'Nifty Fixed Income PRC Indices',
+    'Nifty200 Alpha 30', 'Nifty MS Fin Serv', 'NIFTY MIDSML HLTH', 'Nifty MS IT Telcm', 'NIFTYM150MOMNTM50',
+    'Nifty SDL Sep 2025 Index', 'Nifty SDL Dec 2028 Index', 'Nifty SDL Plus AAA PSU Bond Jul 2028 60:40 Index',
+    'Nifty G-Sec Dec 2030 Index', 'Nifty SDL Plus AAA PSU Bond Jul 2033 60:40 Index',
+    'Nifty AAA PSU Bond Plus SDL Sep 2026 50:50 Index', 'Nifty MS Ind Cons', 'Nifty G-Sec Dec 2026 Index',
+    'Nifty G-Sec Jul 2031 Index', 'Nifty SDL Sep 2026 Index', 'Nifty SDL Plus G-Sec Jun 2028 70:30 Index',
+    'Nifty G-Sec Sep 2027 Index', 'Nifty G-Sec Jun 2036 Index', 'Nifty G-Sec Sep 2032 Index',
+    'BHARATBOND-APR33', 'Nifty SDL Sep 2026 V1 Index', 'Nifty SDL Jul 2026 Index', 'Nifty G-Sec Dec 2029 Index',
+    'Nifty AAA PSU Bond Plus SDL Apr 2026 50:50 Index', 'Nifty SDL Dec 2026 Index',
+    'Nifty SDL Plus G-Sec Sep 2027 50:50 Index', 'Nifty SDL Plus AAA PSU Bond Apr 2026 75:25 Index',
+    'Nifty SDL Plus G-Sec Jun 2029 70:30 Index', 'Nifty SDL Jul 2033 Index',
+    'Nifty India Sovereign Green Bond Dec 2033 Index', 'Nifty India Sovereign Green Bond June 2028 Index',
+    'Nifty G-Sec Oct 2028 Index', 'Nifty SDL Oct 2026 Index', 'Nifty India Municipal Bond Index',
+    'Nifty G-Sec Apr 2029 Index', 'Nifty SDL Plus AAA PSU Bond Apr 2028 75:25 Index',
+    'Nifty G-Sec May 2029 Index', 'Nifty India Sovereign Green Bond Jan 2033 Index',
+    'Nifty India Sovereign Green Bond Jan 2028 Index', 'Nifty SDL Plus G-Sec June 2027 40:60 Index',
+    'Nifty SDL Jul 2028 Index', 'Nifty G-Sec Jul 2027 Index', 'Nifty Sml250 Q50', 'Nifty SDL June 2028 Index',
+    'Nifty REITs & InvITs', 'Nifty Multi Asset - Equity : Arbitrage : REITS/INVITS (50:40:10) Index',
+    'Nifty Multi Asset - Equity : Debt : Arbitrage : REITS/INVITS (50:20:20:10) Index', 'Nifty CoreHousing',
+    'Nifty 5 Year SDL Index', 'Nifty 3 Year SDL Index', 'Nifty G-Sec Jul 2033 Index', 'NiftySml250MQ 100',
+    'NiftyMS400 MQ 100', 'NIFTY MULTI MFG', 'NIFTY MULTI INFRA', 'Nifty AAA Bond Jun 2025 HTM Index',
+    'Nifty India Corporate Group Index - Aditya Birla Group',
+    'Nifty India Corporate Group Index - Mahindra Group', 'Nifty India Corporate Group Index - Tata Group',
+    'Nifty EV', 'Nifty500 EW', 'Nifty500Momentm50', 'Nifty500 LMS Eql', 'Nifty200 Value 30',
+    'Nifty Ind Tourism', 'Nifty Top 10 EW', 'Nifty IPO', 'Nifty Rural', 'Nifty Multi MQ 50',
+    'Nifty Capital Mkt', 'Nifty Top 15 EW', 'Nifty Top 20 EW', 'Nifty Corp MAATR', 'Nifty India Railways PSU',
+    'Nifty500 Qlty50', 'Nifty500 LowVol50', 'Nifty500 MQVLv50',
+    'Nifty AAA Financial Services Bond Mar 2028 Index', 'Nifty AAA Bond Plus G-Sec Mar 2035 30:70 Index',
+    'Nifty Chemicals', 'Nifty Waves', 'Nifty AAA Financial Services Bond Plus G-Sec Apr 2028 90:10 Index',
+    'Nifty AAA Financial Services Bond Plus G-Sec Apr 2027 90:10 Index', 'NIFTY INFRALOG',
+    'Nifty Financial Services 3 to 6 Months Debt Index', 'Nifty Financial Services 9 to 12 Months Debt Index',
+    'NIFTY500 HEALTH', 'NIFTY TMMQ 50', 'NIFTY FPI 150', 'Nifty Conglomerate 50',
+]
+
+SEED_CONSTITUENTS = {
+    "NIFTY_AUTO": ["MARUTI", "TMPV", "M&M", "HEROMOTOCO", "EICHERMOT", "BAJAJ-AUTO", "UNOMINDA", "SONACOMS", "ASHOKLEY", "TVSMOTOR", "BOSCHLTD", "EXIDEIND", "BHARATFORG", "MOTHERSON", "TIINDIA"],
+    "NIFTY_FINANCIAL_SERVICES": ["SBICARD", "HDFCLIFE", "SBILIFE", "SHRIRAMFIN", "KOTAKBANK", "AXISBANK", "PFC", "RECLTD", "SBIN", "ICICIBANK", "HDFCBANK", "ICICIPRULI", "BSE", "LICHSGFIN", "JIOFIN", "MUTHOOTFIN", "ICICIGI", "BAJAJFINSV", "BAJFINANCE", "CHOLAFIN"],
+    "NIFTY_FMCG": ["TATACONSUM", "ITC", "UNITDSPR", "HINDUNILVR", "MARICO", "COLPAL", "BRITANNIA", "NESTLEIND", "GODREJCP", "UBL", "VBL", "PATANJALI", "EMAMILTD", "DABUR", "RADICO"],
+    "NIFTY_IT": ["INFY", "TECHM", "TCS", "MPHASIS", "WIPRO", "PERSISTENT", "LTIM", "HCLTECH", "OFSS", "COFORGE"],
+    "NIFTY_METAL": ["APLAPOLLO", "ADANIENT", "NMDC", "WELCORP", "JSL", "TATASTEEL", "JINDALSTEL", "NATIONALUM", "HINDALCO", "VEDL", "JSWSTEEL", "HINDZINC", "SAIL", "LLOYDSME", "HINDCOPPER"],
+}
+
+
+def _today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def _effective(effective_from, effective_to, day):
+    return effective_from <= day and (effective_to is None or effective_to > day)
+
+
+def _upgrade_index_key(conn):
+    """
+    Rebuilds a registry_index keyed on index_name alone (registries written before
+    re-listings kept their history) with the (index_name, effective_from) key.
+    """
+    key = [name for _, name, _, _, _, pk in conn.execute("PRAGMA table_info(registry_index)") if pk]
+    if key != ["index_name"]:
+        return
+    with conn:
+        conn.execute("ALTER TABLE registry_index RENAME TO registry_index_v1")
+        conn.execute(REGISTRY_DDL[0])
+        conn.execute("""
+            INSERT INTO registry_index (index_name, effective_from, effective_to)
+            SELECT index_name, effective_from, effective_to FROM registry_index_v1 ORDER BY rowid
+        """)
+        conn.execute("DROP TABLE registry_index_v1")
+
+
+class Registry:
+    """
+    Index names and index constituents with the dates they were in effect.
+
+    The registry lives in its own SQLite file and is read once, on first use, into
+    memory; nothing touches the network except `refresh`. A row's effective_to is the
+    first day it no longer applies (None while current).
+    """
+
+    def __init__(self, path=REGISTRY_PATH):
+        """
+        Args:
+            path (str): SQLite file of the registry; created and seeded when missing.
+        """
+        self.path = path
+        self._indices = None
+        self._constituents = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60)
+        for ddl in REGISTRY_DDL:
+            conn.execute(ddl)
+        _upgrade_index_key(conn)
+        with conn:
+            if conn.execute("SELECT 1 FROM registry_index LIMIT 1").fetchone() is None:
+                conn.executemany("INSERT INTO registry_index VALUES (?, ?, NULL)",
+                                 [(name, UNKNOWN_START) for name in SEED_INDICES])
+            if conn.execute("SELECT 1 FROM registry_constituent LIMIT 1").fetchone() is None:
+                conn.executemany("INSERT INTO registry_constituent VALUES (?, ?, ?, NULL)",
+                                 [(key, symbol, UNKNOWN_START) for key, symbols in SEED_CONSTITUENTS.items() for symbol in symbols])
+        return conn
+
+    def _load(self):
+        with self._lock:
+            if self._indices is not None:
+                return
+            conn = self._connect()
+            try:
+                self._indices = conn.execute(
+                    "SELECT index_name, effective_from, effective_to FROM registry_index ORDER BY rowid").fetchall()
+                self._constituents = conn.execute(
+                    "SELECT index_key, symbol, effective_from, effective_to FROM registry_constituent "
+                    "ORDER BY index_key, symbol").fetchall()
+            finally:
+                conn.close()
+
+    def invalidate(self):
+        """Drops the in-memory copy; the next lookup reads the file again."""
+        with self._lock:
+            self._indices = self._constituents = None
+
+    def index_names(self, as_of=None):
+        """
+        Returns the index names (as niftyindices.com spells them) in effect on `as_of`.
+
+        Args:
+            as_of (str, optional): Date as YYYY-MM-DD. Defaults to today.
+        """
+        self._load()
+        day = as_of or _today()
+        return [name for name, start, end in self._indices if _effective(start, end, day)]
+
+    def constituents(self, index_key=None, as_of=None):
+        """
+        Returns the constituents in effect on `as_of`.
+
+        Args:
+            index_key (str, optional): Folder-style key such as "NIFTY_METAL".
+            as_of (str, optional): Date as YYYY-MM-DD. Defaults to today.
+
+        Returns:
+            list of symbols for `index_key`, otherwise a dict of index key -> symbols.
+        """
+        self._load()
+        day = as_of or _today()
+        members = {}
+        for key, symbol, start, end in self._constituents:
+            if (index_key is None or key == index_key) and _effective(start, end, day):
+                members.setdefault(key, []).append(symbol)
+        return members.get(index_key, []) if index_key is not None else members
+
+    def index_keys(self, as_of=None):
+        """Returns the keys of every index with constituents on `as_of`, sorted."""
+        return sorted(self.constituents(as_of=as_of))
+
+    def _fetch(self, conn, url, ttl, force, timeout):
+        """
+        Conditionally GETs `url`.
+
+        Returns:
+            tuple: (content, validators); content is None when the stored copy is still
+            within its TTL or the server answered 304 Not Modified.
+        """
+        import requests
+        from nse_client import record_response
+
+        row = conn.execute("SELECT etag, last_modified, checked_at FROM registry_source WHERE url = ?", (url,)).fetchone()
+        etag, last_modified, checked_at = row or (None, None, None)
+        if not force and checked_at is not None and time.time() - checked_at < ttl:
+            return None, None
+        headers = dict(HEADERS)
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        response = requests.get(url, headers=headers, timeout=timeout)
+        record_response(response)
+        validators = (url, response.headers.get('ETag', etag), response.headers.get('Last-Modified', last_modified), time.time())
+        if response.status_code == 304:
+            return None, validators
+        response.raise_for_status()
+        return response.content, validators
+
+    @staticmethod
+    def _apply_indices(conn, names, day):
+        """
+        Opens rows for newly listed names and closes those no longer listed; a re-listed
+        name gets a new row, so its earlier spells stay on record. Returns (added, removed).
+        """
+        current = {name for (name,) in conn.execute("SELECT index_name FROM registry_index WHERE effective_to IS NULL")}
+        added = [name for name in names if name not in current]
+        removed = sorted(current - set(names))
+        conn.executemany("""
+            INSERT INTO registry_index VALUES (?, ?, NULL)
+            ON CONFLICT (index_name, effective_from) DO UPDATE SET effective_to = NULL
+        """, [(name, day) for name in added])
+        conn.executemany("""
+            UPDATE registry_index SET effective_to = ?
+            WHERE index_name = ? AND effective_to IS NULL
+        """, [(day, name) for name in removed])
+        return len(added), len(removed)
+
+    @staticmethod
+    def _apply_constituents(conn, index_key, symbols, day):
+        """Records joins and exits of one index's constituents; returns (added, removed)."""
+        current = {symbol for (symbol,) in conn.execute(
+            "SELECT symbol FROM registry_constituent WHERE index_key = ? AND effective_to IS NULL", (index_key,))}
+        added = [symbol for symbol in symbols if symbol not in current]
+        removed = sorted(current - set(symbols))
+        conn.executemany("""
+            INSERT INTO registry_constituent VALUES (?, ?, ?, NULL)
+            ON CONFLICT (index_key, symbol, effective_from) DO UPDATE SET effective_to = NULL
+        """, [(index_key, symbol, day) for symbol in added])
+        conn.executemany("""
+            UPDATE registry_constituent SET effective_to = ?
+            WHERE index_key = ? AND symbol = ? AND effective_to IS NULL
+        """, [(day, index_key, symbol) for symbol in removed])
+        return len(added), len(removed)
+
+    def refresh(self, ttl=TTL_SECONDS, force=False, indices=True, constituents=True, timeout=30):
+        """
+        Brings the registry up to date with niftyindices.com.
+
+        Each source is only requested once its TTL has expired, and then conditionally
+        (If-None-Match / If-Modified-Since), so an unchanged list costs a 304. Changes are
+        recorded with today's date: new names and symbols become effective, vanished ones
+        get an effective_to. A failed or empty source leaves its rows untouched.
+
+        Args:
+            ttl (float): Seconds a source is trusted after it was last checked.
+            force (bool): Revalidate every source regardless of its TTL.
+            indices (bool): Refresh the index names from IndexMapping.json.
+            constituents (bool): Refresh the constituent lists in CONSTITUENT_LISTS.
+            timeout (float): Seconds to wait for each response.
+
+        Returns:
+            dict: Counts of checked, changed and failed sources and of added/removed rows.
+        """
+        import requests
+
+        sources = []
+        if indices:
+            sources.append((None, INDEX_MAPPING_URL))
+        if constituents:
+            sources.extend((key, CONSTITUENTS_URL.format(name)) for key, name in CONSTITUENT_LISTS.items())
+
+        totals = {"checked": 0, "changed": 0, "failed": 0, "added": 0, "removed": 0}
+        day = _today()
+        conn = self._connect()
+        try:
+            for index_key, url in sources:
+                try:
+                    content, validators = self._fetch(conn, url, ttl, force, timeout)
+                    if validators is None:
+                        continue
+                    totals["checked"] += 1
+                    with conn:
+                        if content is not None:
+                            text = content.decode('utf-8-sig')
+                            if index_key is None:
+                                listed = list(dict.fromkeys(item['Trading_Index_Name'] for item in json.loads(text)))
+                            else:
+                                listed = list(dict.fromkeys(row['Symbol'].strip() for row in csv.DictReader(text.splitlines())))
+                            if not listed:
+                                raise ValueError("the list is empty")
+                            if index_key is None:
+                                added, removed = self._apply_indices(conn, listed, day)
+                            else:
+                                added, removed = self._apply_constituents(conn, index_key, listed, day)
+                            totals["added"] += added
+                            totals["removed"] += removed
+                            totals["changed"] += bool(added or removed)
+                        conn.execute("INSERT OR REPLACE INTO registry_source VALUES (?, ?, ?, ?)", validators)
+                except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                    totals["failed"] += 1
+                    print(f"Could not refresh the registry from {url}: {e}")
+        finally:
+            conn.close()
+        self.invalidate()
+        print(f"Registry refreshed: {totals['checked']} sources checked, {totals['changed']} changed, "
+              f"{totals['added']} added, {totals['removed']} removed, {totals['failed']} failed.")
+        return totals
+
+
+# The registry every downloader and the dashboard enumerate from; read on first use.
+REGISTRY = Registry()
+
+
+def index_names(as_of=None):
+    """See Registry.index_names."""
+    return REGISTRY.index_names(as_of)
+
+
+def constituents(index_key=None, as_of=None):
+    """See Registry.constituents."""
+    return REGISTRY.constituents(index_key, as_of)
+
+
+def index_keys(as_of=None):
+    """See Registry.index_keys."""
+    return REGISTRY.index_keys(as_of)
+
+
+def print_registry(registry, as_of=None):
+    names = registry.index_names(as_of)
+    members = registry.constituents(as_of=as_of)
+    print(f"{len(names)} indices, {sum(map(len, members.values()))} constituents in {len(members)} indices.")
+    for key, symbols in members.items():
+        print(f"  {key:<28} {len(symbols):>3}  {', '.join(symbols)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the local registry of index names and constituents.")
+    parser.add_argument("command", choices=["show", "refresh"], help="Print the registry, or refresh it from niftyindices.com.")
+    parser.add_argument("--registry", type=str, default=REGISTRY_PATH, help="SQLite file of the registry.")
+    parser.add_argument("--as-of", type=str, help="With show, the date (YYYY-MM-DD) to list memberships for.")
+    parser.add_argument("--ttl", type=float, default=TTL_SECONDS, help="Seconds before a source is revalidated.")
+    parser.add_argument("--force", action="store_true", help="Revalidate every source regardless of its TTL.")
+    args = parser.parse_args()
+
+    registry = Registry(args.registry)
+    if args.command == "refresh":
+        registry.refresh(ttl=args.ttl, force=args.force)
+    else:
+        print_registry(registry, args.as_of)
@@ -0,0 +1,42 @@
+import sqlite3
+
+from registry import Registry, SEED_INDICES
+
+
+def apply_indices(registry, names, day):
+    conn = registry._connect()
+    try:
+        with conn:
+            return Registry._apply_indices(conn, names, day)
+    finally:
+        conn.close()
+        registry.invalidate()
+
+
+def test_relisted_index_keeps_its_history(tmp_path):
+    registry = Registry(str(tmp_path / "registry.db"))
+    assert registry.index_names("2024-01-01") == SEED_INDICES
+
+    others = [name for name in SEED_INDICES if name != 'Nifty Pharma']
+    assert apply_indices(registry, others, "2024-02-01") == (0, 1)
+    assert apply_indices(registry, SEED_INDICES, "2024-03-01") == (1, 0)
+
+    assert 'Nifty Pharma' in registry.index_names("2024-01-15")
+    assert 'Nifty Pharma' not in registry.index_names("2024-02-15")
+    assert 'Nifty Pharma' in registry.index_names("2024-03-15")
+
+
+def test_registry_keyed_on_name_alone_is_upgraded(tmp_path):
+    path = str(tmp_path / "registry.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE registry_index (index_name TEXT PRIMARY KEY, effective_from TEXT NOT NULL, effective_to TEXT)")
+    conn.executemany("INSERT INTO registry_index VALUES (?, ?, ?)",
+                     [('Nifty 50', '', None), ('Nifty IT', '', '2024-02-01')])
+    conn.commit()
+    conn.close()
+
+    registry = Registry(path)
+    assert registry.index_names("2024-01-15") == ['Nifty 50', 'Nifty IT']
+    assert apply_indices(registry, ['Nifty 50', 'Nifty IT'], "2024-03-01") == (1, 0)
+    assert registry.index_names("2024-02-15") == ['Nifty 50']
+    assert registry.index_names("2024-03-15") == ['Nifty 50', 'Nifty IT']
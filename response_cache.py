@@ -0,0 +1,251 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+CACHE_DIR = ".http_cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# One JSON line per stored entry with its endpoint, parameters and key, so date ranges
+# can be looked up without decompressing every entry.
+PARAMS_INDEX = "params.jsonl"
+
+
+class OfflineCacheMiss(Exception):
+    """Raised in offline mode when a response is not in the cache."""
+
+
+def is_historical(to_date, date_format="%d-%m-%Y"):
+    """Returns True if a window ending on `to_date` lies entirely before today and can no longer change."""
+    return datetime.strptime(to_date, date_format).date() < datetime.now().date()
+
+
+class ResponseCache:
+    """
+    Content-addressed, gzip-compressed on-disk cache of API responses.
+
+    Entries are keyed by the SHA-256 of the endpoint and its canonicalised parameters
+    and stored as `<cache_dir>/<key[:2]>/<key>.json.gz`. Each file holds the endpoint,
+    the parameters and the raw body, so cached responses can also be enumerated and
+    replayed without knowing their keys. When the cache grows beyond `max_bytes` the
+    least recently used entries are removed. The parameters of every entry are also
+    listed in `<cache_dir>/params.jsonl` (see `covering`).
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        """
+        Args:
+            cache_dir (str): Directory holding the cache entries.
+            max_bytes (int): Size budget for the compressed entries.
+            offline (bool): If True, misses raise OfflineCacheMiss instead of hitting the network.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._size = None
+        self._ranges = {}
+
+    @staticmethod
+    def key(endpoint, params):
+        """Returns the content address for an endpoint and its parameters."""
+        canonical = json.dumps({"endpoint": endpoint, "params": params}, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def get(self, endpoint, params):
+        """
+        Returns the cached body (str) for the request, or None on a miss.
+
+        Raises:
+            OfflineCacheMiss: In offline mode when the entry does not exist.
+        """
+        path = self._path(self.key(endpoint, params))
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, EOFError, OSError, ValueError):
+            if self.offline:
+                raise OfflineCacheMiss(f"No cached response for {endpoint} {params}")
+            return None
+        # Refresh the access time so eviction is least-recently-used.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["body"]
+
+    def put(self, endpoint, params, body):
+        """Stores a response body (str) for the request."""
+        path = self._path(self.key(endpoint, params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"endpoint": endpoint, "params": params, "body": body}, f)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+            self._ranges.pop(endpoint, None)
+            # Without an index yet, the next lookup builds one from all entries, this one included.
+            if os.path.exists(self._index_path()):
+                with open(self._index_path(), "a", encoding="utf-8") as f:
+                    f.write(self._index_line(endpoint, params, self.key(endpoint, params)))
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def _entries_on_disk(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json.gz"):
+                    yield os.path.join(root, name)
+
+    def size(self):
+        """Returns the total size in bytes of the cache entries (computed once, then tracked)."""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(os.path.getsize(path) for path in self._entries_on_disk())
+            return self._size
+
+    def evict(self, target_ratio=0.9):
+        """Removes least recently used entries until the cache is below `target_ratio` of max_bytes."""
+        with self._lock:
+            entries = []
+            for path in self._entries_on_disk():
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * target_ratio
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            self._size = total
+            if removed:
+                # Rebuilt from the surviving entries on the next range lookup.
+                self._ranges.clear()
+                try:
+                    os.remove(self._index_path())
+                except FileNotFoundError:
+                    pass
+        if removed:
+            print(f"Evicted {removed} cached responses.")
+        return removed
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, PARAMS_INDEX)
+
+    @staticmethod
+    def _index_line(endpoint, params, key):
+        return json.dumps({"endpoint": endpoint, "params": params, "key": key}) + "\n"
+
+    def _build_index(self):
+        """Writes params.jsonl from the entries on disk; caller holds the lock."""
+        lines = []
+        for path in self._entries_on_disk():
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (EOFError, OSError, ValueError):
+                continue
+            lines.append(self._index_line(entry["endpoint"], entry["params"], os.path.basename(path)[:-len(".json.gz")]))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._index_path()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self._index_path())
+
+    def _range_index(self, endpoint, start_key, end_key, date_format):
+        """Groups an endpoint's entries by their non-date parameters: {params: [(start, end, path)]}."""
+        with self._lock:
+            if endpoint in self._ranges:
+                return self._ranges[endpoint]
+            if not os.path.exists(self._index_path()):
+                self._build_index()
+            with open(self._index_path(), encoding="utf-8") as f:
+                lines = f.readlines()
+        ranges, seen = {}, set()
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                if entry["endpoint"] != endpoint or entry["key"] in seen:
+                    continue
+                params = dict(entry["params"])
+                start = datetime.strptime(params.pop(start_key), date_format).date()
+                end = datetime.strptime(params.pop(end_key), date_format).date()
+            except (ValueError, KeyError):
+                continue
+            seen.add(entry["key"])
+            ranges.setdefault(json.dumps(params, sort_keys=True), []).append((start, end, self._path(entry["key"])))
+        for spans in ranges.values():
+            spans.sort()
+        with self._lock:
+            self._ranges[endpoint] = ranges
+        return ranges
+
+    def covering(self, endpoint, params, start_key, end_key, date_format="%d-%m-%Y"):
+        """
+        Returns the bodies of cached responses that together cover a request's date range.
+
+        Windows are sized adaptively, so a replay rarely asks for exactly the ranges that
+        were cached. Every entry with the same endpoint and other parameters whose range
+        overlaps the request is returned; the caller keeps the rows inside the request.
+
+        Args:
+            endpoint (str): The endpoint of the request.
+            params (dict): The request parameters, including the range bounds.
+            start_key (str): Parameter holding the first day of the range.
+            end_key (str): Parameter holding the last day of the range.
+            date_format (str): Format of both bounds.
+
+        Returns:
+            list: The bodies (str) of the overlapping entries, oldest range first.
+
+        Raises:
+            OfflineCacheMiss: When some day of the range is not covered by any entry.
+        """
+        others = dict(params)
+        start = datetime.strptime(others.pop(start_key), date_format).date()
+        end = datetime.strptime(others.pop(end_key), date_format).date()
+        spans = self._range_index(endpoint, start_key, end_key, date_format).get(json.dumps(others, sort_keys=True), [])
+        bodies, cursor = [], start
+        for span_start, span_end, path in spans:
+            if span_end < start or span_start > end:
+                continue
+            if span_start > cursor:
+                break
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    bodies.append(json.load(f)["body"])
+            except (EOFError, OSError, ValueError):
+                # Evicted or unreadable; another overlapping entry may still cover these days.
+                continue
+            cursor = max(cursor, span_end + timedelta(days=1))
+        if cursor <= end:
+            raise OfflineCacheMiss(f"No cached responses cover {endpoint} {params}")
+        return bodies
+
+    def entries(self, endpoint=None):
+        """
+        Yields (params, body) for every cached response, optionally filtered by endpoint.
+        """
+        for path in self._entries_on_disk():
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (EOFError, OSError, ValueError):
+                continue
+            if endpoint is None or entry["endpoint"] == endpoint:
+                yield entry["params"], entry["body"]
@@ -0,0 +1,58 @@
+import os
+import json
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, OfflineCacheMiss, PARAMS_INDEX
+
+URL = "https://nse.test/api/historical/cm/equity"
+
+
+def params(symbol, start, end):
+    return {"symbol": symbol, "series": "EQ", "from": start, "to": end}
+
+
+def test_offline_get_raises_on_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path), offline=True)
+    cache.put(URL, params("A", "01-01-2024", "10-01-2024"), "body")
+    assert cache.get(URL, params("A", "01-01-2024", "10-01-2024")) == "body"
+    with pytest.raises(OfflineCacheMiss):
+        cache.get(URL, params("A", "01-01-2024", "11-01-2024"))
+
+
+def test_covering_joins_overlapping_ranges(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put(URL, params("A", "01-01-2024", "10-01-2024"), "first")
+    cache.put(URL, params("A", "08-01-2024", "20-01-2024"), "second")
+    cache.put(URL, params("B", "01-01-2024", "31-01-2024"), "other symbol")
+
+    replay = ResponseCache(str(tmp_path), offline=True)
+    assert replay.covering(URL, params("A", "05-01-2024", "16-01-2024"), "from", "to") == ["first", "second"]
+    with pytest.raises(OfflineCacheMiss):
+        replay.covering(URL, params("A", "05-01-2024", "25-01-2024"), "from", "to")
+
+
+def test_covering_reads_the_params_index_not_the_entries(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path))
+    cache.put(URL, params("A", "01-01-2024", "10-01-2024"), "first")
+    # The first lookup builds the index from the entries; later puts append to it.
+    assert cache.covering(URL, params("A", "01-01-2024", "10-01-2024"), "from", "to") == ["first"]
+    cache.put(URL, params("A", "11-01-2024", "20-01-2024"), "second")
+    with open(os.path.join(str(tmp_path), PARAMS_INDEX), encoding="utf-8") as f:
+        assert [json.loads(line)["params"]["to"] for line in f] == ["10-01-2024", "20-01-2024"]
+
+    opened = []
+    real_open = response_cache.gzip.open
+    monkeypatch.setattr(response_cache.gzip, "open", lambda path, *a, **k: opened.append(path) or real_open(path, *a, **k))
+    replay = ResponseCache(str(tmp_path), offline=True)
+    assert replay.covering(URL, params("A", "11-01-2024", "15-01-2024"), "from", "to") == ["second"]
+    assert len(opened) == 1
+
+
+def test_eviction_drops_the_index(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=1)
+    cache.put(URL, params("A", "01-01-2024", "10-01-2024"), "x" * 1000)
+    assert not os.path.exists(os.path.join(str(tmp_path), PARAMS_INDEX))
+    with pytest.raises(OfflineCacheMiss):
+        cache.covering(URL, params("A", "01-01-2024", "10-01-2024"), "from", "to")
@@ -0,0 +1,256 @@
+import time
+import random
+import threading
+from datetime import timedelta
+
+import requests
+
+from nse_client import HostLimiter
+from metrics import METRICS
+
+# Requests per second per host used by the command-line downloaders.
+DEFAULT_RATE = 3.0
+# Failed attempts a whole run may spend before it stops issuing requests.
+FAILURE_BUDGET = 100
+# Statuses worth retrying: throttling and server-side failures.
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Statuses (besides timeouts) that a smaller window may avoid.
+SPLIT_STATUS_CODES = (413, 500, 504)
+
+# Window sizing per endpoint, in days: where to start, the bounds, and the number of
+# rows per response beyond which the window is scaled down (NSE truncates long ranges).
+WINDOW_DEFAULTS = {
+    "equity": {"initial": 60, "minimum": 7, "maximum": 365, "target_rows": 250},
+    "index": {"initial": 365, "minimum": 30, "maximum": 3650, "target_rows": 2500},
+}
+
+
+class FailureBudgetExceeded(RuntimeError):
+    """Raised once a run has spent its failure budget."""
+
+
+def _status(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(error):
+    """Network errors, timeouts, 429 and 5xx are retried; other HTTP errors are not."""
+    if not isinstance(error, requests.exceptions.RequestException):
+        return False
+    status = _status(error)
+    return status is None or status in RETRY_STATUS_CODES
+
+
+def is_split_failure(error):
+    """True for failures a smaller window may avoid: timeouts, 413 and 500/504."""
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return True
+    return isinstance(error, requests.exceptions.RequestException) and _status(error) in SPLIT_STATUS_CODES
+
+
+class AdaptiveWindow:
+    """
+    Learns how many days one request to an endpoint can cover.
+
+    The window doubles after a response that came back with well under `target_rows`
+    rows, is scaled down after one close to it, and halves after a failure a smaller
+    window could avoid. A size that failed becomes a ceiling, probed again only after
+    `probe_after` clean responses. One instance is shared by every worker.
+    """
+
+    def __init__(self, initial, minimum, maximum, target_rows=None, probe_after=20, adaptive=True):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_rows = target_rows
+        self.probe_after = probe_after
+        self.adaptive = adaptive
+        self._days = initial
+        self._ceiling = maximum
+        self._streak = 0
+        self._lock = threading.Lock()
+
+    @property
+    def days(self):
+        return self._days
+
+    def looks_truncated(self, rows):
+        """True when a response came back so close to `target_rows` that NSE may have cut it short."""
+        return bool(self.target_rows) and rows > self.target_rows * 0.9
+
+    def success(self, days, rows):
+        if not self.adaptive:
+            return
+        with self._lock:
+            self._streak += 1
+            if self._streak >= self.probe_after and self._ceiling < self.maximum:
+                self._ceiling = min(self.maximum, int(self._ceiling * 1.25) + 1)
+                self._streak = 0
+            if self.looks_truncated(rows):
+                self._days = max(self.minimum, min(self._days, int(days * self.target_rows * 0.75 / rows)))
+            elif days >= self._days and (not self.target_rows or rows < self.target_rows / 2):
+                self._days = min(self._ceiling, days * 2)
+
+    def failure(self, days):
+        if not self.adaptive:
+            return
+        with self._lock:
+            self._streak = 0
+            self._ceiling = max(self.minimum, min(self._ceiling, days - 1))
+            self._days = max(self.minimum, min(self._days, days // 2))
+
+
+class RequestScheduler:
+    """
+    Retries, paces and sizes the requests of one run.
+
+    Every call goes through `call`, which retries transient failures with jittered
+    exponential backoff (honouring Retry-After), slows a host's token bucket on 429 and
+    charges each failed attempt to a run-wide failure budget. `iter_windows` covers a
+    date range with windows sized by the endpoint's AdaptiveWindow.
+    """
+
+    def __init__(self, limiter=None, retries=3, backoff=1.0, max_backoff=60.0,
+                 failure_budget=FAILURE_BUDGET, adaptive=True):
+        """
+        Args:
+            limiter (HostLimiter, optional): Per-host concurrency and rate limits. Defaults
+                to an unpaced HostLimiter().
+            retries (int): Retries per request after the first attempt.
+            backoff (float): Base delay in seconds of the exponential backoff.
+            max_backoff (float): Upper bound of a single delay.
+            failure_budget (int, optional): Failed attempts allowed in the run; None for no limit.
+            adaptive (bool): Resize windows from responses. When False every window keeps its
+                initial size, which keeps window boundaries stable for offline cache replays.
+        """
+        self.limiter = limiter if limiter is not None else HostLimiter()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_budget = failure_budget
+        self.adaptive = adaptive
+        self.failures = 0
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def window(self, endpoint):
+        """The shared AdaptiveWindow of an endpoint ("equity" or "index")."""
+        with self._lock:
+            if endpoint not in self._windows:
+                self._windows[endpoint] = AdaptiveWindow(**WINDOW_DEFAULTS[endpoint], adaptive=self.adaptive)
+            return self._windows[endpoint]
+
+    @property
+    def exhausted(self):
+        return self.failure_budget is not None and self.failures >= self.failure_budget
+
+    def _charge(self):
+        with self._lock:
+            self.failures += 1
+
+    def delay(self, attempt, error=None):
+        """Seconds to wait before retry number `attempt` (0-based)."""
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.5)
+        retry_after = getattr(getattr(error, "response", None), "headers", {}).get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def call(self, fn, *args, url=None, source="nse", split_failures=False, **kwargs):
+        """
+        Calls fn(*args, **kwargs), retrying transient failures.
+
+        Args:
+            url (str, optional): Host the call talks to, so a 429 throttles that host.
+            source (str): Label of the retry counter.
+            split_failures (bool): Raise failures a smaller window could avoid at once
+                instead of retrying them at the same size.
+
+        Raises:
+            FailureBudgetExceeded: If the run's failure budget is already spent.
+        """
+        for attempt in range(self.retries + 1):
+            if self.exhausted:
+                raise FailureBudgetExceeded(f"Failure budget of {self.failure_budget} attempts spent.")
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e) and not is_split_failure(e):
+                    raise
+                self._charge()
+                if url is not None and _status(e) == 429:
+                    self.limiter.throttle(url)
+                if attempt == self.retries or self.exhausted or (split_failures and is_split_failure(e)) or not is_retryable(e):
+                    raise
+                delay = self.delay(attempt, e)
+                METRICS.inc("nse_retries_total", source=source)
+                print(f"Retrying in {delay:.1f}s after error: {e}")
+                time.sleep(delay)
+            else:
+                if url is not None:
+                    self.limiter.recover(url)
+                return result
+
+    def iter_windows(self, endpoint, start, end, fetch, url=None):
+        """
+        Covers [start, end] with adaptively sized windows.
+
+        A window that fails in a way a smaller window may avoid is split and retried;
+        any other failure is yielded so the caller can report the hole. A response that
+        looks truncated is discarded and its range fetched again with the smaller window,
+        so days cut off by the API are never skipped.
+
+        Args:
+            endpoint (str): Key of the AdaptiveWindow to use ("equity" or "index").
+            start, end (datetime): Inclusive range to cover.
+            fetch (callable): fetch(window_start, window_end) -> list of rows.
+            url (str, optional): Host the fetches talk to.
+
+        Yields:
+            tuple: (window_start, window_end, rows, error); rows is None when error is set.
+            After FailureBudgetExceeded the rest of the range is yielded as one failed window.
+        """
+        sizer = self.window(endpoint)
+        cursor = start
+        while cursor <= end:
+            days = sizer.days
+            stop = min(cursor + timedelta(days=days), end)
+            try:
+                rows = self.call(fetch, cursor, stop, url=url, source=endpoint,
+                                 split_failures=sizer.adaptive and days > sizer.minimum)
+            except FailureBudgetExceeded as e:
+                METRICS.inc("nse_windows_failed_total", endpoint=endpoint)
+                yield cursor, end, None, e
+                return
+            except Exception as e:
+                if sizer.adaptive and days > sizer.minimum and is_split_failure(e):
+                    print(f"Shrinking {endpoint} window from {days} days after error: {e}")
+                    sizer.failure(days)
+                    continue
+                METRICS.inc("nse_windows_failed_total", endpoint=endpoint)
+                yield cursor, stop, None, e
+            else:
+                span = (stop - cursor).days
+                sizer.success(span, len(rows))
+                if sizer.adaptive and sizer.looks_truncated(len(rows)) and sizer.days < span:
+                    print(f"Refetching {endpoint} window of {span} days with {sizer.days} days: "
+                          f"{len(rows)} rows may be truncated.")
+                    METRICS.inc("nse_windows_refetched_total", endpoint=endpoint)
+                    continue
+                yield cursor, stop, rows, None
+            cursor = stop + timedelta(days=1)
+
+
+def add_arguments(parser):
+    """Adds --rate, --retries and --failure-budget options to a downloader's parser."""
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Requests per second per host (0 disables pacing).")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per request for transient errors.")
+    parser.add_argument("--failure-budget", type=int, default=FAILURE_BUDGET, help="Failed attempts allowed before the run stops requesting.")
+
+
+def scheduler_from_args(args, per_host=4):
+    """Builds the RequestScheduler described by the options from `add_arguments`."""
+    limiter = HostLimiter(default_limit=per_host, default_rate=args.rate or None)
+    # Offline replays must ask for exactly the windows that were cached, so sizes stay fixed.
+    return RequestScheduler(limiter, retries=args.retries, failure_budget=args.failure_budget,
+                            adaptive=not getattr(args, "offline", False))
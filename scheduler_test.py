@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import requests
+
+from scheduler import AdaptiveWindow, RequestScheduler
+
+
+def fetcher(rows_per_day, calls):
+    def fetch(start, end):
+        calls.append((start, end))
+        return [None] * (((end - start).days + 1) * rows_per_day)
+    return fetch
+
+
+def covered_days(windows):
+    days = set()
+    for start, end, rows, error in windows:
+        assert error is None
+        days.update(start + timedelta(days=i) for i in range((end - start).days + 1))
+    return days
+
+
+def test_truncated_looking_response_is_refetched_before_advancing():
+    scheduler = RequestScheduler(retries=0)
+    calls = []
+    start, end = datetime(2024, 1, 1), datetime(2024, 12, 31)
+    windows = list(scheduler.iter_windows("equity", start, end, fetcher(5, calls)))
+
+    # 61 days x 5 rows is over the 250-row target: that response is dropped and the same
+    # start is asked for again with a smaller window.
+    assert calls[0] == (start, start + timedelta(days=60))
+    assert calls[1][0] == start and calls[1][1] < calls[0][1]
+    assert windows[0][0] == start and windows[0][1] == calls[1][1]
+    assert covered_days(windows) == {start + timedelta(days=i) for i in range((end - start).days + 1)}
+    assert all(len(rows) <= 250 * 0.9 for _, _, rows, _ in windows)
+
+
+def test_fixed_windows_are_never_refetched():
+    scheduler = RequestScheduler(retries=0, adaptive=False)
+    calls = []
+    list(scheduler.iter_windows("equity", datetime(2024, 1, 1), datetime(2024, 3, 31), fetcher(5, calls)))
+    assert [start for start, _ in calls] == [datetime(2024, 1, 1), datetime(2024, 3, 2)]
+
+
+def test_sizer_learns_from_the_clamped_span():
+    sizer = AdaptiveWindow(initial=60, minimum=7, maximum=365, target_rows=250)
+    # A 3-day tail window with few rows must not count as a 60-day success.
+    sizer.success(3, 2)
+    assert sizer.days == 60
+    sizer.success(60, 40)
+    assert sizer.days == 120
+
+
+def test_split_failures_shrink_the_window_and_retry_the_range():
+    scheduler = RequestScheduler(retries=0)
+    calls = []
+
+    def fetch(start, end):
+        calls.append((end - start).days)
+        if (end - start).days > 30:
+            raise requests.exceptions.Timeout("slow")
+        return []
+
+    start, end = datetime(2024, 1, 1), datetime(2024, 3, 31)
+    windows = list(scheduler.iter_windows("equity", start, end, fetch))
+    assert calls[:2] == [60, 30]
+    assert covered_days(windows) == {start + timedelta(days=i) for i in range((end - start).days + 1)}
@@ -0,0 +1,376 @@
+import os
+import sqlite3
+import argparse
+from datetime import datetime
+
+from create_db import INDEX_TABLE_DDL, COMPANY_TABLE_DDL
+
+DB_PATH = "stock.db"
+# v3 added index_membership_day; v4 added dim_date, through which the compatibility views
+# resolve text dates so that date filters reach the integer keys.
+SCHEMA_VERSION = 4
+
+# Dates are stored as YYYYMMDD integers; symbols, indices and their memberships live in
+# dimension tables, and the fact tables are clustered on (instrument, date).
+V2_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS dim_index (
+        index_id INTEGER PRIMARY KEY,
+        index_name TEXT NOT NULL UNIQUE,
+        index_type TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dim_symbol (
+        symbol_id INTEGER PRIMARY KEY,
+        symbol TEXT NOT NULL UNIQUE
+    )
+    """,
+    # One row per stored date with its text forms, so the views never format dates per
+    # row and a filter on a text date becomes a range over this table's unique index.
+    """
+    CREATE TABLE IF NOT EXISTS dim_date (
+        date_key INTEGER PRIMARY KEY,
+        date TEXT NOT NULL UNIQUE,
+        timestamp TEXT NOT NULL,
+        m_timestamp TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS index_membership (
+        index_id INTEGER NOT NULL,
+        symbol_id INTEGER NOT NULL,
+        PRIMARY KEY (index_id, symbol_id)
+    ) WITHOUT ROWID
+    """,
+    # The (index, symbol, date) triples v1 stored a row for. Prices are kept once per
+    # symbol in equity_price; this keeps each index's view of a symbol to the dates
+    # actually written under it.
+    """
+    CREATE TABLE IF NOT EXISTS index_membership_day (
+        index_id INTEGER NOT NULL,
+        symbol_id INTEGER NOT NULL,
+        date_key INTEGER NOT NULL,
+        PRIMARY KEY (index_id, symbol_id, date_key)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS index_price (
+        index_id INTEGER NOT NULL,
+        date_key INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        PRIMARY KEY (index_id, date_key)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS equity_price (
+        symbol_id INTEGER NOT NULL,
+        date_key INTEGER NOT NULL,
+        series TEXT NOT NULL,
+        prev_close REAL,
+        open REAL,
+        high REAL,
+        low REAL,
+        last REAL,
+        close REAL,
+        vwap REAL,
+        volume INTEGER,
+        traded_value REAL,
+        trades INTEGER,
+        high_52w REAL,
+        low_52w REAL,
+        slbm_value REAL,
+        PRIMARY KEY (symbol_id, date_key, series)
+    ) WITHOUT ROWID
+    """,
+    # Cross-sectional date-range scans (all instruments between two dates) are answered
+    # from these indexes alone.
+    "CREATE INDEX IF NOT EXISTS index_price_by_date ON index_price (date_key, index_id, close)",
+    "CREATE INDEX IF NOT EXISTS equity_price_by_date ON equity_price (date_key, symbol_id, close, volume)",
+    # Per-symbol date ranges across every index the symbol is stored under.
+    "CREATE INDEX IF NOT EXISTS index_membership_day_by_symbol ON index_membership_day (symbol_id, date_key, index_id)",
+)
+
+_TEXT_DATE = "printf('%04d-%02d-%02d', {0} / 10000, {0} / 100 % 100, {0} % 100)"
+_MONTHS = "'JanFebMarAprMayJunJulAugSepOctNovDec'"
+
+# Fills dim_date for the integer dates `source` selects as `k`. TIMESTAMP and mTIMESTAMP
+# are derived from the date exactly as the NSE API formats them.
+DIM_DATE_FILL_SQL = f"""
+    INSERT OR IGNORE INTO dim_date (date_key, date, timestamp, m_timestamp)
+    SELECT k, {_TEXT_DATE.format('k')},
+           strftime('%Y-%m-%dT18:30:00.000Z', {_TEXT_DATE.format('k')}, '-1 day'),
+           printf('%02d-%s-%04d', k % 100, substr({_MONTHS}, (k / 100 % 100) * 3 - 2, 3), k / 10000)
+    FROM ({{source}}) WHERE k IS NOT NULL
+"""
+DIM_DATE_INSERT_SQL = DIM_DATE_FILL_SQL.format(source="SELECT ? AS k")
+
+# The v1 tables become read-only views with identical columns, so every existing
+# reader keeps working after the migration. Their text dates come from dim_date, whose
+# unique index turns a date filter into a range of integer keys for the fact tables.
+V1_VIEWS = (
+    """
+    CREATE VIEW IF NOT EXISTS stock_index_price_daily AS
+    SELECT i.index_name, p.open, p.high, p.low, p.close, d.date AS date_key, i.index_type
+    FROM index_price p
+    JOIN dim_index i USING (index_id)
+    JOIN dim_date d USING (date_key)
+    """,
+    """
+    CREATE VIEW IF NOT EXISTS stock_company_price_daily AS
+    SELECT s.symbol AS CH_SYMBOL, e.series AS CH_SERIES, d.date AS CH_TIMESTAMP,
+           d.timestamp AS TIMESTAMP, d.m_timestamp AS mTIMESTAMP,
+           e.prev_close AS CH_PREVIOUS_CLS_PRICE, e.open AS CH_OPENING_PRICE, e.high AS CH_TRADE_HIGH_PRICE,
+           e.low AS CH_TRADE_LOW_PRICE, e.last AS CH_LAST_TRADED_PRICE, e.close AS CH_CLOSING_PRICE,
+           e.vwap AS VWAP, e.volume AS CH_TOT_TRADED_QTY, e.traded_value AS CH_TOT_TRADED_VAL,
+           e.trades AS CH_TOTAL_TRADES, e.high_52w AS CH_52WEEK_HIGH_PRICE, e.low_52w AS CH_52WEEK_LOW_PRICE,
+           e.slbm_value AS SLBMH_TOT_VAL, i.index_type, i.index_name
+    FROM index_membership_day m
+    JOIN dim_index i USING (index_id)
+    JOIN dim_symbol s USING (symbol_id)
+    JOIN dim_date d USING (date_key)
+    JOIN equity_price e USING (symbol_id, date_key)
+    """,
+)
+
+EQUITY_PRICE_COLUMNS = [
+    'date_key', 'series', 'prev_close', 'open', 'high', 'low', 'last', 'close', 'vwap',
+    'volume', 'traded_value', 'trades', 'high_52w', 'low_52w', 'slbm_value'
+]
+
+EQUITY_INSERT_SQL = f"""
+    INSERT INTO equity_price (symbol_id, {', '.join(EQUITY_PRICE_COLUMNS)})
+    SELECT symbol_id, {', '.join('?' * len(EQUITY_PRICE_COLUMNS))} FROM dim_symbol WHERE symbol = ?
+    ON CONFLICT DO NOTHING
+"""
+
+INDEX_PRICE_INSERT_SQL = """
+    INSERT INTO index_price (index_id, date_key, open, high, low, close)
+    SELECT index_id, ?, ?, ?, ?, ? FROM dim_index WHERE index_name = ?
+    ON CONFLICT DO NOTHING
+"""
+
+MEMBERSHIP_INSERT_SQL = """
+    INSERT OR IGNORE INTO index_membership (index_id, symbol_id)
+    SELECT i.index_id, s.symbol_id FROM dim_index i, dim_symbol s WHERE i.index_name = ? AND s.symbol = ?
+"""
+
+MEMBERSHIP_DAY_INSERT_SQL = """
+    INSERT OR IGNORE INTO index_membership_day (index_id, symbol_id, date_key)
+    SELECT i.index_id, s.symbol_id, ? FROM dim_index i, dim_symbol s WHERE i.index_name = ? AND s.symbol = ?
+"""
+
+
+def schema_version(conn):
+    """Returns the schema version recorded in PRAGMA user_version (0 or 1 mean the original layout)."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def date_int(date_key):
+    """'2025-11-21' -> 20251121."""
+    return int(date_key.replace('-', '')) if date_key else None
+
+
+def write_company_rows(conn, rows):
+    """
+    Inserts stock_company_price_daily tuples (db_writer.COMPANY_COLUMNS order) into the
+    v2 tables, creating symbols, indices and memberships as needed.
+
+    Returns:
+        int: Number of new rows in the stock_company_price_daily view, i.e. new
+        (index, symbol, date) memberships, as the v1 table would have counted them.
+    """
+    conn.executemany("INSERT OR IGNORE INTO dim_symbol (symbol) VALUES (?)", {(row[0],) for row in rows})
+    conn.executemany("INSERT OR IGNORE INTO dim_index (index_name, index_type) VALUES (?, ?)",
+                     {(row[19], row[18]) for row in rows})
+    conn.executemany(MEMBERSHIP_INSERT_SQL, {(row[19], row[0]) for row in rows})
+    facts = [
+        (date_int(row[2]), row[1] or '', *row[5:18], row[0])
+        for row in rows if row[2]
+    ]
+    conn.executemany(DIM_DATE_INSERT_SQL, {(fact[0],) for fact in facts})
+    conn.executemany(EQUITY_INSERT_SQL, facts)
+    before = conn.total_changes
+    conn.executemany(MEMBERSHIP_DAY_INSERT_SQL, {(date_int(row[2]), row[19], row[0]) for row in rows if row[2]})
+    return conn.total_changes - before
+
+
+def write_index_rows(conn, rows):
+    """
+    Inserts stock_index_price_daily tuples (db_writer.INDEX_COLUMNS order) into the v2 tables.
+
+    Returns:
+        int: Number of new index_price rows.
+    """
+    conn.executemany("INSERT OR IGNORE INTO dim_index (index_name, index_type) VALUES (?, ?)",
+                     {(row[0], row[6]) for row in rows})
+    facts = [(date_int(row[5]), row[1], row[2], row[3], row[4], row[0]) for row in rows if row[5]]
+    conn.executemany(DIM_DATE_INSERT_SQL, {(fact[0],) for fact in facts})
+    before = conn.total_changes
+    conn.executemany(INDEX_PRICE_INSERT_SQL, facts)
+    return conn.total_changes - before
+
+
+def _file_size(db_path):
+    return sum(os.path.getsize(path) for path in (db_path, f"{db_path}-wal") if os.path.exists(path))
+
+
+def upgrade(conn):
+    """
+    Brings a database migrated to v2 or v3 up to the current version in one transaction.
+
+    v2 did not record which index each equity row was written under, so every
+    membership is given all of its symbol's stored dates (what the v2 view returned).
+    v3 databases get dim_date filled from the stored dates and the views recreated.
+    """
+    version = schema_version(conn)
+    with conn:
+        for ddl in V2_DDL:
+            conn.execute(ddl)
+        if version == 2:
+            conn.execute("""
+                INSERT OR IGNORE INTO index_membership_day (index_id, symbol_id, date_key)
+                SELECT DISTINCT m.index_id, m.symbol_id, e.date_key
+                FROM index_membership m JOIN equity_price e USING (symbol_id)
+                ORDER BY 1, 2, 3
+            """)
+        conn.execute(DIM_DATE_FILL_SQL.format(
+            source="SELECT date_key AS k FROM equity_price UNION SELECT date_key FROM index_price"))
+        conn.execute("DROP VIEW IF EXISTS stock_index_price_daily")
+        conn.execute("DROP VIEW IF EXISTS stock_company_price_daily")
+        for view in V1_VIEWS:
+            conn.execute(view)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.execute("ANALYZE")
+
+
+def migrate(db_path=DB_PATH, vacuum=True):
+    """
+    Converts a database from the original text-keyed tables to the v2 schema in place.
+
+    The copy, the drop of the old tables and the creation of the compatibility views
+    run in one transaction, so an interrupted migration leaves the original intact.
+
+    Args:
+        db_path (str): Path to the SQLite database.
+        vacuum (bool): Rebuild the file afterwards to return the freed pages.
+
+    Returns:
+        bool: True if the database was migrated.
+    """
+    start_time = datetime.now()
+    size_before = _file_size(db_path)
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        if schema_version(conn) >= SCHEMA_VERSION:
+            print(f"{db_path} already uses schema v{schema_version(conn)}.")
+            return False
+        if schema_version(conn) >= 2:
+            version = schema_version(conn)
+            upgrade(conn)
+            print(f"Upgraded {db_path} from schema v{version} to v{SCHEMA_VERSION} in {datetime.now() - start_time}.")
+            return True
+
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(INDEX_TABLE_DDL)
+        conn.execute(COMPANY_TABLE_DDL)
+        for ddl in V2_DDL:
+            conn.execute(ddl)
+
+        conn.execute("""
+            INSERT OR IGNORE INTO dim_index (index_name, index_type)
+            SELECT index_name, MIN(index_type) FROM (
+                SELECT index_name, index_type FROM stock_index_price_daily
+                UNION ALL
+                SELECT index_name, index_type FROM stock_company_price_daily
+            ) GROUP BY index_name ORDER BY index_name
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO dim_symbol (symbol)
+            SELECT DISTINCT CH_SYMBOL FROM stock_company_price_daily WHERE CH_SYMBOL IS NOT NULL ORDER BY CH_SYMBOL
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO index_membership (index_id, symbol_id)
+            SELECT DISTINCT i.index_id, s.symbol_id
+            FROM stock_company_price_daily c
+            JOIN dim_index i ON i.index_name = c.index_name
+            JOIN dim_symbol s ON s.symbol = c.CH_SYMBOL
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO index_membership_day (index_id, symbol_id, date_key)
+            SELECT DISTINCT i.index_id, s.symbol_id, CAST(replace(c.CH_TIMESTAMP, '-', '') AS INTEGER)
+            FROM stock_company_price_daily c
+            JOIN dim_index i ON i.index_name = c.index_name
+            JOIN dim_symbol s ON s.symbol = c.CH_SYMBOL
+            WHERE c.CH_TIMESTAMP IS NOT NULL
+            ORDER BY 1, 2, 3
+        """)
+        conn.execute("""
+            INSERT OR IGNORE INTO index_price (index_id, date_key, open, high, low, close)
+            SELECT i.index_id, CAST(replace(p.date_key, '-', '') AS INTEGER), p.open, p.high, p.low, p.close
+            FROM stock_index_price_daily p JOIN dim_index i USING (index_name)
+            WHERE p.date_key IS NOT NULL
+            ORDER BY i.index_id, p.date_key
+        """)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO equity_price (symbol_id, {', '.join(EQUITY_PRICE_COLUMNS)})
+            SELECT s.symbol_id, CAST(replace(c.CH_TIMESTAMP, '-', '') AS INTEGER), COALESCE(c.CH_SERIES, ''),
+                   c.CH_PREVIOUS_CLS_PRICE, c.CH_OPENING_PRICE, c.CH_TRADE_HIGH_PRICE, c.CH_TRADE_LOW_PRICE,
+                   c.CH_LAST_TRADED_PRICE, c.CH_CLOSING_PRICE, c.VWAP, c.CH_TOT_TRADED_QTY, c.CH_TOT_TRADED_VAL,
+                   c.CH_TOTAL_TRADES, c.CH_52WEEK_HIGH_PRICE, c.CH_52WEEK_LOW_PRICE, c.SLBMH_TOT_VAL
+            FROM stock_company_price_daily c JOIN dim_symbol s ON s.symbol = c.CH_SYMBOL
+            WHERE c.CH_TIMESTAMP IS NOT NULL
+            ORDER BY s.symbol_id, c.CH_TIMESTAMP
+        """)
+
+        conn.execute(DIM_DATE_FILL_SQL.format(
+            source="SELECT date_key AS k FROM equity_price UNION SELECT date_key FROM index_price"))
+
+        index_rows = conn.execute("SELECT COUNT(*) FROM stock_index_price_daily").fetchone()[0]
+        company_rows = conn.execute("SELECT COUNT(*) FROM stock_company_price_daily").fetchone()[0]
+        conn.execute("DROP TABLE stock_index_price_daily")
+        conn.execute("DROP TABLE stock_company_price_daily")
+        for view in V1_VIEWS:
+            conn.execute(view)
+        migrated_company = conn.execute("SELECT COUNT(*) FROM stock_company_price_daily").fetchone()[0]
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+        print(f"Migrated {index_rows} index rows and {company_rows} company rows "
+              f"({company_rows - migrated_company} duplicate rows dropped).")
+
+        conn.execute("ANALYZE")
+        if vacuum:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"Migration finished in {datetime.now() - start_time}: "
+              f"{size_before / 1e6:.1f} MB -> {_file_size(db_path) / 1e6:.1f} MB.")
+        return True
+
+    except sqlite3.Error as e:
+        print(f"Database error during migration: {e}")
+        if conn is not None and conn.in_transaction:
+            conn.execute("ROLLBACK")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate stock.db to the compact v2 schema.")
+    parser.add_argument("command", choices=["migrate", "version"], help="'migrate' converts the database in place.")
+    parser.add_argument("--db", type=str, default=DB_PATH, help="Path to the SQLite database.")
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip the VACUUM after migrating.")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate(args.db, vacuum=not args.no_vacuum)
+    else:
+        conn = sqlite3.connect(args.db)
+        print(f"{args.db}: schema v{max(schema_version(conn), 1)}")
+        conn.close()
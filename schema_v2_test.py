@@ -0,0 +1,84 @@
+import sqlite3
+from datetime import date, timedelta
+
+from db_writer import BulkWriter, company_rows
+from schema_v2 import migrate, schema_version, SCHEMA_VERSION
+
+
+def records(days):
+    return [{'CH_SYMBOL': 'INFY', 'CH_SERIES': 'EQ', 'CH_TIMESTAMP': day, 'CH_CLOSING_PRICE': 10.0} for day in days]
+
+
+def view_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT index_name, CH_TIMESTAMP, CH_CLOSING_PRICE FROM stock_company_price_daily ORDER BY 1, 2"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_migrated_view_keeps_each_index_to_its_own_dates(tmp_path):
+    db_path = str(tmp_path / "stock.db")
+    with BulkWriter(db_path) as writer:
+        writer.stage_company_rows(company_rows(records(['2024-01-01', '2024-01-02']), 'NIFTY IT'))
+        writer.stage_company_rows(company_rows(records(['2024-01-02']), 'NIFTY 50'))
+    before = view_rows(db_path)
+
+    assert migrate(db_path, vacuum=False)
+    assert view_rows(db_path) == before == [
+        ('NIFTY 50', '2024-01-02', 10.0), ('NIFTY IT', '2024-01-01', 10.0), ('NIFTY IT', '2024-01-02', 10.0),
+    ]
+
+    # A date already priced under one index is still a new row under another, as in v1.
+    with BulkWriter(db_path) as writer:
+        writer.stage_company_rows(company_rows(records(['2024-01-01']), 'NIFTY 50'))
+        writer.stage_company_rows(company_rows(records(['2024-01-01']), 'NIFTY IT'))
+    assert (writer.inserted, writer.skipped) == (1, 1)
+    assert ('NIFTY 50', '2024-01-01', 10.0) in view_rows(db_path)
+
+    conn = sqlite3.connect(db_path)
+    assert schema_version(conn) == SCHEMA_VERSION
+    conn.close()
+
+
+def test_migrated_date_filters_search_the_integer_keys(tmp_path):
+    db_path = str(tmp_path / "stock.db")
+    days = [f'2024-0{month}-{day:02d}' for month in (1, 2, 3) for day in range(1, 29)]
+    rows = records(days)
+    for row in rows:
+        day = date.fromisoformat(row['CH_TIMESTAMP'])
+        row['TIMESTAMP'] = f"{day - timedelta(days=1):%Y-%m-%d}T18:30:00.000Z"
+        row['mTIMESTAMP'] = f"{day:%d-%b-%Y}"
+    with BulkWriter(db_path) as writer:
+        for index_name in ('NIFTY 50', 'NIFTY IT'):
+            writer.stage_company_rows(company_rows(rows, index_name))
+            writer.stage_index_rows([(index_name, 1.0, 1.0, 1.0, 1.0, day, 'sectoral') for day in days])
+    conn = sqlite3.connect(db_path)
+    before = [conn.execute(f"SELECT * FROM {view} ORDER BY 1, 2, 3").fetchall()
+              for view in ('stock_company_price_daily', 'stock_index_price_daily')]
+    conn.close()
+
+    assert migrate(db_path, vacuum=False)
+    conn = sqlite3.connect(db_path)
+    after = [conn.execute(f"SELECT * FROM {view} ORDER BY 1, 2, 3").fetchall()
+             for view in ('stock_company_price_daily', 'stock_index_price_daily')]
+    assert after == before
+
+    # The readers' date bounds must become an index range, and the fact tables (e, p, m)
+    # must be reached through their keys rather than scanned, so that migrating does not
+    # make range queries slower than v1.
+    queries = [
+        "SELECT * FROM stock_company_price_daily WHERE CH_SYMBOL = 'INFY' "
+        "AND CH_TIMESTAMP BETWEEN '2024-02-01' AND '2024-02-29'",
+        "SELECT * FROM stock_index_price_daily WHERE index_name = 'NIFTY IT' "
+        "AND date_key BETWEEN '2024-02-01' AND '2024-02-29'",
+        "SELECT CH_SYMBOL, CH_CLOSING_PRICE FROM stock_company_price_daily "
+        "WHERE CH_TIMESTAMP BETWEEN '2024-02-01' AND '2024-02-29'",
+    ]
+    for query in queries:
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}")]
+        assert any('date>? AND date<?' in step for step in plan), plan
+        assert not [step for step in plan if step.split()[:2] in (['SCAN', 'e'], ['SCAN', 'p'], ['SCAN', 'm'])], plan
+    conn.close()
@@ -0,0 +1,240 @@
+import os
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db_writer import DB_PATH
+from indicators import YEAR_SESSIONS
+
+# Rolling window (sessions) for tracking error and beta; roughly one quarter.
+TRACKING_WINDOW = 63
+CACHE_ENTRIES = 128
+
+TRACKING_COLUMNS = [
+    'official', 'official_ret', 'ew_level', 'ew_ret', 'vw_level', 'vw_ret',
+    'te_ew', 'te_vw', 'beta_ew', 'beta_vw'
+]
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _fingerprint(db_path):
+    """Cheap change detector for the database: size and mtime of the file and its WAL."""
+    stamp = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            info = os.stat(path)
+            stamp.append((info.st_mtime_ns, info.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def load_sector_frames(conn, index_names=None, start=None, end=None):
+    """
+    Loads official index closes and constituent closes/traded values for many sectors at once.
+
+    Constituent closes come from stock_company_price_adjusted when it exists so splits and
+    bonuses do not show up as returns. Each symbol is read once even if it belongs to
+    several indices; membership only fans the columns out afterwards.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection.
+        index_names (list, optional): Restrict to these indices. Defaults to every index
+            present in both tables.
+        start, end (str, optional): Inclusive date_key bounds (YYYY-MM-DD).
+
+    Returns:
+        tuple: (official, close, value) DataFrames indexed by date_key. `official` has one
+        column per index; `close` and `value` have (index_name, CH_SYMBOL) columns.
+    """
+    bounds, params = "", []
+    if start is not None:
+        bounds += " AND {date} >= ?"
+        params.append(start)
+    if end is not None:
+        bounds += " AND {date} <= ?"
+        params.append(end)
+
+    official = pd.read_sql_query(
+        "SELECT index_name, date_key, close FROM stock_index_price_daily WHERE 1 = 1" + bounds.format(date='date_key'),
+        conn, params=params)
+    membership = pd.read_sql_query("SELECT DISTINCT index_name, CH_SYMBOL FROM stock_company_price_daily", conn)
+    names = set(official['index_name']) & set(membership['index_name'])
+    if index_names is not None:
+        names &= set(index_names)
+    names = sorted(names)
+    membership = membership[membership['index_name'].isin(names)].sort_values(['index_name', 'CH_SYMBOL'])
+    official = official[official['index_name'].isin(names)].pivot(index='date_key', columns='index_name', values='close')
+
+    symbols = sorted(set(membership['CH_SYMBOL']))
+    if not symbols:
+        empty = pd.DataFrame(index=official.index)
+        return official, empty, empty
+    placeholders = ', '.join('?' * len(symbols))
+    has_adjusted = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stock_company_price_adjusted'").fetchone()
+    prices = pd.read_sql_query(
+        f"""SELECT CH_SYMBOL, CH_TIMESTAMP AS date_key, CH_CLOSING_PRICE AS close, CH_TOT_TRADED_VAL AS value
+            FROM stock_company_price_daily WHERE CH_SYMBOL IN ({placeholders})""" + bounds.format(date='CH_TIMESTAMP'),
+        conn, params=symbols + params).drop_duplicates(subset=['CH_SYMBOL', 'date_key'])
+    if has_adjusted:
+        adjusted = pd.read_sql_query(
+            f"""SELECT CH_SYMBOL, date_key, close AS adj_close FROM stock_company_price_adjusted
+                WHERE CH_SYMBOL IN ({placeholders})""" + bounds.format(date='date_key'),
+            conn, params=symbols + params)
+        prices = prices.merge(adjusted, on=['CH_SYMBOL', 'date_key'], how='left')
+        prices['close'] = prices['adj_close'].fillna(prices['close'])
+
+    dates = official.index.union(pd.Index(prices['date_key'].unique())).sort_values()
+    official = official.reindex(dates)
+    columns = pd.MultiIndex.from_frame(membership[['index_name', 'CH_SYMBOL']])
+    matrices = []
+    for field in ('close', 'value'):
+        matrix = prices.pivot(index='date_key', columns='CH_SYMBOL', values=field).reindex(index=dates)
+        fanned = matrix.reindex(columns=columns.get_level_values('CH_SYMBOL'))
+        fanned.columns = columns
+        matrices.append(fanned)
+    return official, matrices[0], matrices[1]
+
+
+def _by_index(matrix):
+    """Sums (index_name, CH_SYMBOL) columns per index_name."""
+    return matrix.T.groupby(level='index_name').sum(min_count=1).T
+
+
+def synthetic_returns(close, value):
+    """
+    Equal-weight and traded-value-weighted sector returns from constituent closes.
+
+    Weights use the previous session's traded value (CH_TOT_TRADED_VAL) so a day's
+    weight never depends on that day's own trading.
+
+    Returns:
+        tuple: (ew_ret, vw_ret) DataFrames with one column per index.
+    """
+    returns = close.pct_change(fill_method=None)
+    present = returns.notna()
+    ew_ret = _by_index(returns) / _by_index(present.astype(float)).replace(0.0, np.nan)
+    weights = value.shift(1).where(present & (value.shift(1) > 0))
+    vw_ret = _by_index(returns * weights) / _by_index(weights).replace(0.0, np.nan)
+    return ew_ret, vw_ret
+
+
+def tracking_frames(official, close, value, window=TRACKING_WINDOW):
+    """
+    Computes synthetic series, rolling tracking error and beta for every sector at once.
+
+    Every operation works on dates x indices matrices, so adding sectors adds columns
+    rather than loop iterations.
+
+    Returns:
+        dict: TRACKING_COLUMNS name -> DataFrame (dates x indices).
+    """
+    ew_ret, vw_ret = synthetic_returns(close, value)
+    official_ret = official.pct_change(fill_method=None)
+    ew_ret = ew_ret.reindex(columns=official.columns)
+    vw_ret = vw_ret.reindex(columns=official.columns)
+    base = official.bfill().iloc[0] if len(official) else None
+
+    result = {'official': official, 'official_ret': official_ret, 'ew_ret': ew_ret, 'vw_ret': vw_ret}
+    official_var = official_ret.rolling(window, min_periods=window).var()
+    for name, synthetic in (('ew', ew_ret), ('vw', vw_ret)):
+        result[f'{name}_level'] = (1.0 + synthetic.fillna(0.0)).cumprod() * base
+        active = synthetic - official_ret
+        result[f'te_{name}'] = active.rolling(window, min_periods=window).std() * np.sqrt(YEAR_SESSIONS)
+        covariance = synthetic.rolling(window, min_periods=window).cov(official_ret)
+        result[f'beta_{name}'] = covariance / official_var.replace(0.0, np.nan)
+    return result
+
+
+def _to_long(frames, index_name):
+    out = pd.DataFrame({column: frames[column][index_name] for column in TRACKING_COLUMNS})
+    out.index.name = 'date_key'
+    return out.reset_index()
+
+
+def sector_tracking(index_names=None, start=None, end=None, window=TRACKING_WINDOW, db_path=DB_PATH):
+    """
+    Returns synthetic sector series with rolling tracking error and beta against the
+    official index, cached per (index, date range, window).
+
+    Cached entries are reused until the database file changes. Indices missing from the
+    cache are computed together in one vectorized pass.
+
+    Args:
+        index_names (list, optional): Indices to report (e.g., ["NIFTY METAL"]). Defaults to all.
+        start, end (str, optional): Inclusive date_key bounds (YYYY-MM-DD).
+        window (int): Rolling window in sessions.
+        db_path (str): Path to the SQLite database.
+
+    Returns:
+        dict: index_name -> DataFrame with date_key and TRACKING_COLUMNS.
+    """
+    fingerprint = _fingerprint(db_path)
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        if index_names is None:
+            index_names = [row[0] for row in conn.execute(
+                "SELECT DISTINCT index_name FROM stock_index_price_daily ORDER BY index_name")]
+
+        results, missing = {}, []
+        with _cache_lock:
+            for name in index_names:
+                entry = _cache.get((db_path, name, start, end, window))
+                if entry is not None and entry[0] == fingerprint:
+                    _cache.move_to_end((db_path, name, start, end, window))
+                    results[name] = entry[1]
+                else:
+                    missing.append(name)
+        if not missing:
+            return results
+
+        official, close, value = load_sector_frames(conn, missing, start, end)
+        frames = tracking_frames(official, close, value, window)
+        with _cache_lock:
+            for name in official.columns:
+                results[name] = _to_long(frames, name)
+                _cache[(db_path, name, start, end, window)] = (fingerprint, results[name])
+            while len(_cache) > CACHE_ENTRIES:
+                _cache.popitem(last=False)
+        for name in set(missing) - set(official.columns):
+            print(f"No constituent or index data found for {name}.")
+        return results
+
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        print(f"Database error while computing sector tracking: {e}")
+        return {}
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild sector indices from constituents and measure tracking error.")
+    parser.add_argument("--index", type=str, nargs="+", help="Index names, e.g. 'NIFTY METAL'. Defaults to all.")
+    parser.add_argument("--start", type=str, help="First date (YYYY-MM-DD).")
+    parser.add_argument("--end", type=str, help="Last date (YYYY-MM-DD).")
+    parser.add_argument("--window", type=int, default=TRACKING_WINDOW, help="Rolling window in sessions.")
+    parser.add_argument("--db", type=str, default=DB_PATH, help="Path to the SQLite database.")
+    args = parser.parse_args()
+
+    start_time = datetime.now()
+    names = [name.upper() for name in args.index] if args.index else None
+    report = sector_tracking(names, args.start, args.end, args.window, args.db)
+    for name, df in sorted(report.items()):
+        last = df.dropna(subset=['te_ew']).tail(1)
+        if last.empty:
+            print(f"{name}: not enough history for a {args.window}-session window.")
+            continue
+        row = last.iloc[0]
+        print(f"{name} ({row['date_key']}): TE equal-weight {row['te_ew']:.2%}, value-weighted {row['te_vw']:.2%}; "
+              f"beta {row['beta_ew']:.2f} / {row['beta_vw']:.2f}")
+    print(f"Computed in {datetime.now() - start_time}.")
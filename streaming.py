@@ -0,0 +1,211 @@
+import os
+import csv
+import json
+import heapq
+import codecs
+import pickle
+import tempfile
+
+# Records held in memory by ExternalSorter before a sorted run is spilled to disk.
+RUN_ROWS = 50000
+# Consumed text kept in front of the JSON decoder's position before it is dropped.
+COMPACT_CHARS = 1 << 16
+
+_WHITESPACE = " \t\r\n"
+
+
+class _TextBuffer:
+    """
+    Text fed from an iterator of chunks, consumed from the front.
+
+    Bytes chunks go through one incremental UTF-8 decoder, so a character split across
+    two chunks is decoded once both have arrived.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.text = ""
+        self.pos = 0
+        self.exhausted = False
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    def fill(self):
+        """Appends the next chunk; returns False when the input is exhausted."""
+        if self.pos > COMPACT_CHARS:
+            self.text, self.pos = self.text[self.pos:], 0
+        for chunk in self.chunks:
+            text = chunk if isinstance(chunk, str) else self._utf8.decode(chunk)
+            if text:
+                self.text += text
+                return True
+        # Raises if the input ended inside a multibyte character.
+        self._utf8.decode(b"", final=True)
+        self.exhausted = True
+        return False
+
+    def peek(self):
+        """Skips whitespace and returns the next character ('' at end of input)."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of the JSON stream.")
+        self.pos += 1
+
+    def decode(self, decoder):
+        """Decodes the next complete JSON value, reading more chunks while it is truncated."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number at the very end of the buffer may continue in the next chunk.
+            if end == len(self.text) and not self.exhausted and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(chunks, key="data"):
+    """
+    Yields the elements of the `key` array of a JSON object as its text arrives.
+
+    Only one element at a time is materialised, so memory depends on the size of an
+    element rather than of the response. Members before `key` are decoded and
+    discarded; anything after the array is never read.
+
+    Args:
+        chunks (iterable): str or bytes chunks of the body, e.g. response.iter_content().
+        key (str): Member of the top-level object holding the array.
+    """
+    buffer = _TextBuffer(chunks)
+    decoder = json.JSONDecoder()
+    buffer.expect("{")
+    while buffer.peek() not in ("}", ""):
+        name = buffer.decode(decoder)
+        buffer.expect(":")
+        if name != key:
+            buffer.decode(decoder)
+        elif buffer.peek() != "[":
+            # null (or anything but an array) means no rows.
+            value = buffer.decode(decoder)
+            if isinstance(value, list):
+                yield from value
+            return
+        else:
+            buffer.expect("[")
+            if buffer.peek() == "]":
+                return
+            while True:
+                yield buffer.decode(decoder)
+                if buffer.peek() == "]":
+                    return
+                buffer.expect(",")
+        if buffer.peek() == ",":
+            buffer.pos += 1
+
+
+class ExternalSorter:
+    """
+    Sorts more rows than fit in memory.
+
+    Rows are buffered up to `run_rows`, sorted and spilled as a run to a temporary file;
+    iterating merges the runs lazily with heapq.merge, so memory stays at one buffer plus
+    one row per run.
+    """
+
+    def __init__(self, key, reverse=False, run_rows=RUN_ROWS, tmp_dir=None):
+        self.key = key
+        self.reverse = reverse
+        self.run_rows = run_rows
+        self.tmp_dir = tmp_dir
+        self.count = 0
+        self._buffer = []
+        self._runs = []
+
+    def add(self, rows):
+        for row in rows:
+            self._buffer.append(row)
+            self.count += 1
+            if len(self._buffer) >= self.run_rows:
+                self._spill()
+
+    def _spill(self):
+        self._buffer.sort(key=self.key, reverse=self.reverse)
+        run = tempfile.TemporaryFile(dir=self.tmp_dir)
+        for row in self._buffer:
+            pickle.dump(row, run, protocol=pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+        self._runs.append(run)
+        self._buffer = []
+
+    @staticmethod
+    def _read_run(run):
+        try:
+            while True:
+                yield pickle.load(run)
+        except EOFError:
+            run.close()
+
+    def __iter__(self):
+        """Yields every added row in sorted order; the sorter is consumed."""
+        self._buffer.sort(key=self.key, reverse=self.reverse)
+        runs = [self._read_run(run) for run in self._runs] + [iter(self._buffer)]
+        self._runs = []
+        return heapq.merge(*runs, key=self.key, reverse=self.reverse)
+
+    def close(self):
+        for run in self._runs:
+            run.close()
+        self._runs, self._buffer = [], []
+
+
+class CsvAppendWriter:
+    """
+    Appends dict rows to a CSV file, writing the header only when the file is new.
+
+    The columns are fixed by the first row (or `columns`); later keys outside them are
+    ignored, as pandas' to_csv would have done for a frame built from the first batch.
+    """
+
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.columns = list(columns) if columns else None
+        self.rows = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, rows):
+        for row in rows:
+            if self._writer is None:
+                self._open(row)
+            self._writer.writerow(row)
+            self.rows += 1
+
+    def _open(self, first_row):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        if self.columns is None:
+            if new:
+                self.columns = list(first_row)
+            else:
+                with open(self.path, newline="", encoding="utf-8") as f:
+                    self.columns = next(csv.reader(f))
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=self.columns, extrasaction="ignore")
+        if new:
+            self._writer.writeheader()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,56 @@
+import csv
+import json
+
+import pytest
+
+from streaming import iter_json_array, ExternalSorter, CsvAppendWriter
+
+
+def split(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_iter_json_array_across_chunk_boundaries(size):
+    body = json.dumps({"meta": {"x": [1, 2]}, "data": [{"v": 12345, "s": "a,b]"}, {"v": 6.5, "s": "é"}], "tail": 1})
+    assert list(iter_json_array(split(body, size))) == [{"v": 12345, "s": "a,b]"}, {"v": 6.5, "s": "é"}]
+
+
+def test_iter_json_array_accepts_bytes_chunks():
+    body = json.dumps({"data": ["₹"]}, ensure_ascii=False).encode("utf-8")
+    # Offsets 12 and 13 split the three bytes of "₹" across chunks.
+    for size in range(1, len(body) + 1):
+        assert list(iter_json_array(split(body, size))) == ["₹"]
+    assert list(iter_json_array([body[:12], body[12:]])) == ["₹"]
+    with pytest.raises(UnicodeDecodeError):
+        list(iter_json_array([body[:12]]))
+
+
+@pytest.mark.parametrize("body", ['{"data": []}', '{"data": null}', '{"other": 1}', '{}'])
+def test_iter_json_array_without_rows(body):
+    assert list(iter_json_array([body])) == []
+
+
+def test_iter_json_array_rejects_malformed_input():
+    with pytest.raises(ValueError):
+        list(iter_json_array(['{"data": [1 2]}']))
+
+
+def test_external_sorter_merges_spilled_runs(tmp_path):
+    sorter = ExternalSorter(key=lambda row: row["d"], reverse=True, run_rows=3, tmp_dir=str(tmp_path))
+    sorter.add({"d": day} for day in [5, 1, 9, 3, 7, 2, 8])
+    assert sorter.count == 7
+    assert [row["d"] for row in sorter] == [9, 8, 7, 5, 3, 2, 1]
+    sorter.close()
+
+
+def test_csv_append_writer_keeps_the_existing_header(tmp_path):
+    path = str(tmp_path / "out" / "rows.csv")
+    first = CsvAppendWriter(path)
+    first.write([{"a": 1, "b": 2}])
+    first.close()
+    second = CsvAppendWriter(path)
+    second.write([{"b": 4, "a": 3, "c": 5}])
+    second.close()
+    with open(path, newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f)) == [["a", "b"], ["1", "2"], ["3", "4"]]
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+from storage import read_frame, STORAGE_ERRORS
+
+DB_PATH = "stock.db"
+
+# National holidays on which NSE is closed every year. Moving holidays (Holi, Diwali,
+# Eid, ...) are learnt from the index history already stored in the database.
+FIXED_HOLIDAYS = ((1, 26), (8, 15), (10, 2), (12, 25))
+
+# NSE has never been shut for more than a few consecutive weekdays; a longer run of
+# weekdays without rows is history nobody has fetched yet, not a closure.
+MAX_HOLIDAY_RUN = 3
+
+# Every stored table contributes its dates, so a database holding only equity rows
+# still yields a calendar.
+OBSERVED_SESSIONS_QUERY = """
+    SELECT date_key FROM stock_index_price_daily
+    UNION
+    SELECT CH_TIMESTAMP FROM stock_company_price_daily
+"""
+
+
+class TradingCalendar:
+    """
+    NSE trading sessions: weekdays minus exchange holidays, plus any special sessions
+    (e.g. Muhurat or budget-day trading on a weekend).
+    """
+
+    def __init__(self, holidays=(), special_sessions=()):
+        """
+        Args:
+            holidays (iterable): Dates (date, datetime or 'YYYY-MM-DD') on which the exchange is closed.
+            special_sessions (iterable): Weekend dates on which the exchange traded.
+        """
+        self.holidays = pd.DatetimeIndex(pd.to_datetime(list(holidays))).normalize()
+        self.special_sessions = pd.DatetimeIndex(pd.to_datetime(list(special_sessions))).normalize()
+
+    @classmethod
+    def from_db(cls, db_path=DB_PATH):
+        """
+        Builds a calendar from the sessions observed in the index and equity tables.
+
+        Within the stored history, a short run of weekdays on which no index or symbol has
+        a row is treated as a holiday and any weekend day with rows as a special session.
+        Beyond it, only FIXED_HOLIDAYS are known.
+        """
+        try:
+            observed = read_frame(db_path, OBSERVED_SESSIONS_QUERY).iloc[:, 0]
+        except STORAGE_ERRORS as e:
+            print(f"Could not read trading sessions from the database: {e}")
+            observed = pd.Series([], dtype=str)
+        return cls.from_sessions(observed)
+
+    @classmethod
+    def from_sessions(cls, observed):
+        """Builds a calendar from a list of dates on which the market is known to have traded."""
+        observed = pd.DatetimeIndex(pd.to_datetime(pd.Series(observed), errors="coerce").dropna()).normalize().unique()
+        if observed.empty:
+            return cls()
+        weekdays = pd.bdate_range(observed.min(), observed.max())
+        gaps = weekdays.get_indexer(weekdays.difference(observed))
+        # Split the missing weekdays into runs of consecutive weekdays and keep the short ones.
+        runs = np.split(gaps, np.flatnonzero(np.diff(gaps) != 1) + 1)
+        holidays = weekdays[np.concatenate([run for run in runs if len(run) <= MAX_HOLIDAY_RUN] or [gaps[:0]])]
+        special_sessions = observed[observed.dayofweek >= 5]
+        return cls(holidays, special_sessions)
+
+    def _fixed_holidays(self, start, end):
+        years = range(start.year, end.year + 1)
+        days = pd.DatetimeIndex([pd.Timestamp(year, month, day) for year in years for month, day in FIXED_HOLIDAYS])
+        return days[(days >= start) & (days <= end)]
+
+    def sessions(self, start, end):
+        """
+        Returns the trading sessions between `start` and `end` (inclusive) as a DatetimeIndex.
+        """
+        start = pd.Timestamp(start).normalize()
+        end = pd.Timestamp(end).normalize()
+        days = pd.bdate_range(start, end)
+        days = days.difference(self.holidays).difference(self._fixed_holidays(start, end))
+        extra = self.special_sessions[(self.special_sessions >= start) & (self.special_sessions <= end)]
+        return days.union(extra)
+
+    def is_session(self, day):
+        """Returns True if the exchange trades on `day`."""
+        day = pd.Timestamp(day).normalize()
+        return len(self.sessions(day, day)) == 1
@@ -0,0 +1,446 @@
+import os
+import sqlite3
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from db_writer import connect, DB_PATH
+from adjustments import EVENT_TOLERANCE, event_ratios, action_ratios, with_action_ratios
+from bulk_load import discover_files, _read_csvs
+from trading_calendar import TradingCalendar
+
+# Largest plausible one-day move per table before a return is reported as an outlier
+# (20% is NSE's widest equity price band; indices rarely move more than 10%).
+OUTLIER_RETURNS = {
+    "stock_company_price_daily": 0.20,
+    "stock_index_price_daily": 0.10,
+}
+
+CHECKS = ("ohlc", "missing_sessions", "zero_volume", "prev_close_mismatch", "outlier_return", "csv_parity")
+
+# Columns read per table, renamed to a common layout; instrument keys follow data_summary
+# (index rows use '' as CH_SYMBOL).
+TABLE_COLUMNS = {
+    "stock_company_price_daily": """
+        c.index_name, c.CH_SYMBOL, c.CH_TIMESTAMP AS date_key, c.CH_PREVIOUS_CLS_PRICE AS prev_close,
+        c.CH_OPENING_PRICE AS open, c.CH_TRADE_HIGH_PRICE AS high, c.CH_TRADE_LOW_PRICE AS low,
+        c.CH_CLOSING_PRICE AS close, c.CH_TOT_TRADED_QTY AS volume
+    """,
+    "stock_index_price_daily": """
+        c.index_name, '' AS CH_SYMBOL, c.date_key, NULL AS prev_close,
+        c.open, c.high, c.low, c.close, NULL AS volume
+    """,
+}
+DATE_COLUMNS = {"stock_company_price_daily": "CH_TIMESTAMP", "stock_index_price_daily": "date_key"}
+
+FINDINGS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS validation_findings (
+        table_name TEXT,
+        index_name TEXT,
+        CH_SYMBOL TEXT,
+        date_key TEXT,
+        check_name TEXT,
+        value REAL,
+        detail TEXT,
+        PRIMARY KEY (table_name, index_name, CH_SYMBOL, date_key, check_name)
+    ) WITHOUT ROWID
+"""
+
+# What each instrument looked like in data_summary when it was last validated.
+VALIDATION_STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS validation_state (
+        table_name TEXT,
+        index_name TEXT,
+        CH_SYMBOL TEXT,
+        record_count INTEGER,
+        last_date_key TEXT,
+        PRIMARY KEY (table_name, index_name, CH_SYMBOL)
+    ) WITHOUT ROWID
+"""
+
+KEYS = ['table_name', 'index_name', 'CH_SYMBOL']
+FINDING_COLUMNS = KEYS + ['date_key', 'check_name', 'value', 'detail']
+
+
+def pending_partitions(conn):
+    """
+    Compares data_summary with validation_state.
+
+    Returns:
+        pandas.DataFrame: One row per instrument with new rows: its keys, the summary's
+        record_count and to_date, and `since`, the last validated date (None when the
+        instrument was never validated).
+    """
+    return pd.read_sql_query("""
+        SELECT d.table_name, d.index_name, d.CH_SYMBOL, d.record_count, d.to_date,
+               s.record_count AS validated_count, s.last_date_key AS since
+        FROM data_summary d
+        LEFT JOIN validation_state s USING (table_name, index_name, CH_SYMBOL)
+        WHERE s.record_count IS NULL OR s.record_count != d.record_count OR s.last_date_key != d.to_date
+    """, conn)
+
+
+def _read_partitions(conn, table_name, pending):
+    """Reads each pending instrument's rows from its `since` date on (all rows when None)."""
+    conn.execute("DROP TABLE IF EXISTS temp.validation_pending")
+    conn.execute("CREATE TEMP TABLE validation_pending (index_name TEXT, CH_SYMBOL TEXT, since TEXT)")
+    conn.executemany("INSERT INTO temp.validation_pending VALUES (?, ?, ?)",
+                     pending[['index_name', 'CH_SYMBOL', 'since']].astype(object)
+                     .where(pending[['index_name', 'CH_SYMBOL', 'since']].notna(), None)
+                     .itertuples(index=False, name=None))
+    join = "USING (index_name, CH_SYMBOL)" if table_name == "stock_company_price_daily" else "USING (index_name)"
+    df = pd.read_sql_query(f"""
+        SELECT {TABLE_COLUMNS[table_name]}, p.since
+        FROM {table_name} c JOIN temp.validation_pending p {join}
+        WHERE p.since IS NULL OR c.{DATE_COLUMNS[table_name]} >= p.since
+    """, conn)
+    df = df.drop_duplicates(subset=['index_name', 'CH_SYMBOL', 'date_key'], keep='first')
+    return df.sort_values(['index_name', 'CH_SYMBOL', 'date_key'], ignore_index=True)
+
+
+def _finding(df, mask, check_name, value, template=None, *columns):
+    """
+    Builds findings for the rows of `df` selected by `mask`; the detail text is formatted
+    from `columns` (arrays aligned with `df`) for the selected rows only.
+    """
+    out = df.loc[mask, ['table_name', 'index_name', 'CH_SYMBOL', 'date_key']].copy()
+    out['check_name'] = check_name
+    out['value'] = np.asarray(value, dtype=float)[mask]
+    selected = [np.asarray(column)[mask] for column in columns]
+    out['detail'] = [template.format(*values) for values in zip(*selected)] if template else None
+    return out
+
+
+def check_rows(df, sessions, table_name):
+    """
+    Runs every row-level check over a table slice in one vectorized pass.
+
+    Rows are sorted by (index_name, CH_SYMBOL, date_key); a row at or before its
+    instrument's `since` date only serves as the anchor of the next row's comparisons
+    and is never reported itself.
+
+    Args:
+        df (pandas.DataFrame): Output of `_read_partitions` with a table_name column and,
+            for equity rows, the ca_ratio column of `adjustments.with_action_ratios`.
+        sessions (numpy.ndarray): Sorted datetime64[D] trading sessions covering `df`.
+        table_name (str): The table the rows come from.
+
+    Returns:
+        pandas.DataFrame: Findings with FINDING_COLUMNS.
+    """
+    open_, high, low, close, prev_close, volume = (
+        df[column].to_numpy(dtype=float) for column in ('open', 'high', 'low', 'close', 'prev_close', 'volume'))
+    dates = pd.to_datetime(df['date_key']).to_numpy().astype('datetime64[D]')
+    new = (df['since'].isna() | (df['date_key'] > df['since'].fillna(''))).to_numpy()
+
+    instrument = (df['index_name'] + '\x00' + df['CH_SYMBOL']).to_numpy()
+    has_prior = np.zeros(len(df), dtype=bool)
+    has_prior[1:] = instrument[1:] == instrument[:-1]
+    prior_close = np.full(len(df), np.nan)
+    prior_close[1:] = close[:-1]
+    prior_close[~has_prior] = np.nan
+    prior_dates = np.roll(dates, 1)
+
+    findings = []
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # OHLC consistency: missing or non-positive prices, or a high/low that does not
+        # bound the other prices.
+        top = np.fmax(np.fmax(open_, close), low)
+        bottom = np.fmin(np.fmin(open_, close), high)
+        incomplete = ~(np.isfinite(open_) & np.isfinite(high) & np.isfinite(low) & np.isfinite(close))
+        non_positive = (open_ <= 0) | (high <= 0) | (low <= 0) | (close <= 0)
+        breach = np.fmax(top - high, low - bottom)
+        findings.append(_finding(df, new & (incomplete | non_positive | (breach > 0)), "ohlc", breach,
+                                 "O={} H={} L={} C={}", open_, high, low, close))
+
+        # Sessions the calendar has strictly between two consecutive stored rows.
+        after_prior = np.searchsorted(sessions, prior_dates, side='right')
+        before_row = np.searchsorted(sessions, dates, side='left')
+        gap = np.where(has_prior, before_row - after_prior, 0)
+        last = max(len(sessions) - 1, 0)
+        findings.append(_finding(df, new & (gap > 0), "missing_sessions", gap, "{} to {}",
+                                 sessions[np.clip(after_prior, 0, last)], sessions[np.clip(before_row - 1, 0, last)]))
+
+        if table_name == "stock_company_price_daily":
+            findings.append(_finding(df, new & ~(volume > 0), "zero_volume", volume))
+
+        # The reported previous close should equal the stored close of the prior session.
+        # NSE reports the unadjusted close on ex-dates as well, so a mismatch means a wrong
+        # or missing stored row rather than a corporate action.
+        ratio = prev_close / prior_close
+        mismatch = new & (gap == 0) & np.isfinite(ratio) & (np.abs(ratio - 1.0) > EVENT_TOLERANCE)
+        findings.append(_finding(df, mismatch, "prev_close_mismatch", ratio,
+                                 "reported {}, stored {}", prev_close, prior_close))
+
+        # Returns are taken against the prior close adjusted for any split or bonus the
+        # adjustments module recognises on that day (from the stored corporate actions in
+        # df's ca_ratio column), so corporate actions are not outliers.
+        events = event_ratios(pd.DataFrame({'CH_SYMBOL': instrument, 'date_key': df['date_key'], 'close': close,
+                                            'prev_close': prev_close, 'open': open_,
+                                            'ca_ratio': df['ca_ratio'] if 'ca_ratio' in df else 1.0}), sessions)
+        reference = np.where(events != 1.0, prior_close * events, np.where(prev_close > 0, prev_close, prior_close))
+        returns = close / reference - 1.0
+        outlier = new & np.isfinite(returns) & (np.abs(returns) > OUTLIER_RETURNS[table_name])
+        findings.append(_finding(df, outlier, "outlier_return", returns, "close {} vs {:.2f}", close, reference))
+
+    return pd.concat(findings, ignore_index=True)[FINDING_COLUMNS]
+
+
+def csv_folders(data_dir):
+    """
+    Groups the CSV tree by folder.
+
+    Returns:
+        dict: (table_name, index_name, folder) -> list of paths, where folder is the
+        symbol folder of equity files and '' for index files. A symbol folder is named
+        after the current symbol and may hold rows of its former names (e.g. TMPV holds
+        TATAMOTORS history), so it is not the CH_SYMBOL of every row.
+    """
+    folders = {}
+    for kind, path, index_name in discover_files(data_dir):
+        if kind == "equity":
+            key = ("stock_company_price_daily", index_name, os.path.basename(os.path.dirname(path)))
+        else:
+            key = ("stock_index_price_daily", index_name, "")
+        folders.setdefault(key, []).append(path)
+    return folders
+
+
+def csv_counts(folders):
+    """
+    Counts distinct CSV dates per instrument and year.
+
+    Equity rows are attributed to the CH_SYMBOL inside the files, as bulk_load stores
+    them, not to the folder they sit in.
+
+    Args:
+        folders (dict): Output of `csv_folders`, or a subset of it.
+
+    Returns:
+        pandas.DataFrame with KEYS, year and csv_rows.
+    """
+    frames = []
+    # Where the year sits in each layout's date column (YYYY-MM-DD or DD Mon YYYY).
+    year_slices = {"CH_TIMESTAMP": slice(0, 4), "date_key": slice(0, 4), "Date": slice(-4, None)}
+    for (table_name, index_name, folder), paths in folders.items():
+        df = _read_csvs(paths, usecols=lambda column: column in year_slices or column == 'CH_SYMBOL', dtype=str)
+        column = next(column for column in year_slices if column in df)
+        symbols = df['CH_SYMBOL'].fillna(folder) if table_name == "stock_company_price_daily" and 'CH_SYMBOL' in df else folder
+        frames.append(pd.DataFrame({'table_name': table_name, 'index_name': index_name, 'CH_SYMBOL': symbols,
+                                    'date': df[column], 'year': df[column].str[year_slices[column]]}))
+    if not frames:
+        return pd.DataFrame(columns=KEYS + ['year', 'csv_rows'])
+    rows = pd.concat(frames, ignore_index=True).dropna(subset=['date']).drop_duplicates(KEYS + ['date'])
+    rows = rows[rows['year'].str.isdigit()]
+    return rows.groupby(KEYS + ['year']).size().reset_index(name='csv_rows')[KEYS + ['year', 'csv_rows']]
+
+
+def check_parity(conn, keys, csv):
+    """
+    Compares per-year row counts of the database with those of the CSV tree.
+
+    Args:
+        conn (sqlite3.Connection): Open database connection.
+        keys (list): (table_name, index_name, CH_SYMBOL) instruments to compare.
+        csv (pandas.DataFrame): Output of `csv_counts` for those instruments.
+
+    Returns:
+        pandas.DataFrame: Findings with FINDING_COLUMNS; date_key holds the year and value
+        the database rows minus the CSV rows.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.validation_parity")
+    conn.execute("CREATE TEMP TABLE validation_parity (table_name TEXT, index_name TEXT, CH_SYMBOL TEXT)")
+    conn.executemany("INSERT INTO temp.validation_parity VALUES (?, ?, ?)", keys)
+    db = pd.read_sql_query("""
+        SELECT p.table_name, index_name, CH_SYMBOL, substr(CH_TIMESTAMP, 1, 4) AS year,
+               COUNT(DISTINCT CH_TIMESTAMP) AS db_rows
+        FROM stock_company_price_daily JOIN temp.validation_parity p USING (index_name, CH_SYMBOL)
+        WHERE p.table_name = 'stock_company_price_daily'
+        GROUP BY index_name, CH_SYMBOL, year
+        UNION ALL
+        SELECT p.table_name, index_name, '', substr(date_key, 1, 4), COUNT(*)
+        FROM stock_index_price_daily JOIN temp.validation_parity p USING (index_name)
+        WHERE p.table_name = 'stock_index_price_daily'
+        GROUP BY index_name, substr(date_key, 1, 4)
+    """, conn)
+    both = db.merge(csv, on=KEYS + ['year'], how='outer').fillna({'db_rows': 0, 'csv_rows': 0})
+    both = both[both['db_rows'] != both['csv_rows']]
+    out = both[KEYS].copy()
+    out['date_key'] = both['year']
+    out['check_name'] = "csv_parity"
+    out['value'] = both['db_rows'] - both['csv_rows']
+    out['detail'] = "db " + both['db_rows'].astype(int).astype(str) + ", csv " + both['csv_rows'].astype(int).astype(str)
+    return out[FINDING_COLUMNS]
+
+
+def _find_backfills(table_pending, df):
+    """
+    Returns a boolean mask of pending instruments whose count grew by more than their new
+    tail, i.e. rows were also inserted before `since`.
+    """
+    tail = df[df['since'].isna() | (df['date_key'] > df['since'].fillna(''))]
+    new_rows = tail.groupby(['index_name', 'CH_SYMBOL']).size()
+    keys = pd.MultiIndex.from_frame(table_pending[['index_name', 'CH_SYMBOL']])
+    grown = table_pending['validated_count'].to_numpy(dtype=float) + new_rows.reindex(keys, fill_value=0).to_numpy()
+    return (table_pending['since'].notna() & (grown != table_pending['record_count'])).to_numpy()
+
+
+def _write(conn, pending, findings, parity_keys=()):
+    """Replaces the findings of the revalidated ranges and advances validation_state."""
+    with conn:
+        conn.executemany("""
+            DELETE FROM validation_findings
+            WHERE table_name = ? AND index_name = ? AND CH_SYMBOL = ? AND check_name != 'csv_parity'
+            AND date_key > coalesce(?, '')
+        """, list(pending[KEYS + ['since']].astype(object).where(pending[KEYS + ['since']].notna(), None)
+                  .itertuples(index=False, name=None)))
+        conn.executemany("""
+            DELETE FROM validation_findings
+            WHERE table_name = ? AND index_name = ? AND CH_SYMBOL = ? AND check_name = 'csv_parity'
+        """, parity_keys)
+        conn.executemany(
+            "INSERT OR REPLACE INTO validation_findings VALUES (?, ?, ?, ?, ?, ?, ?)",
+            findings.astype(object).where(findings.notna(), None).itertuples(index=False, name=None),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO validation_state VALUES (?, ?, ?, ?, ?)",
+            list(pending[KEYS + ['record_count', 'to_date']].itertuples(index=False, name=None)),
+        )
+
+
+def validate(db_path=DB_PATH, data_dir=None, rebuild=False):
+    """
+    Validates the price rows inserted since the last run and records what is wrong with them.
+
+    Instruments are picked from data_summary: those whose row count or last date changed
+    since they were validated. Only rows after the last validated date are checked (plus
+    the row before them as the anchor of the gap, previous-close and return checks); an
+    instrument that was backfilled before that date is checked again in full. Each check
+    runs once over the whole batch rather than symbol by symbol.
+
+    Args:
+        db_path (str): Path to the SQLite database.
+        data_dir (str, optional): Root of the CSV tree. When given, per-year row counts of
+            the changed instruments, and of every instrument of an index with a file
+            modified since the last parity run, are compared with the database.
+        rebuild (bool): Forget all findings and state and validate everything.
+
+    Returns:
+        dict: Validated instruments, checked rows and findings per check.
+    """
+    start_time = datetime.now()
+    conn = None
+    try:
+        conn = connect(db_path)
+        conn.execute(FINDINGS_TABLE_DDL)
+        conn.execute(VALIDATION_STATE_DDL)
+        if rebuild:
+            with conn:
+                conn.execute("DELETE FROM validation_findings")
+                conn.execute("DELETE FROM validation_state")
+                conn.execute("DELETE FROM db_meta WHERE key = 'validation_csv_mtime'")
+
+        pending = pending_partitions(conn)
+        pending = pending[pending['table_name'].isin(list(TABLE_COLUMNS))].reset_index(drop=True)
+        findings, rows = [pd.DataFrame(columns=FINDING_COLUMNS)], 0
+        calendar = TradingCalendar.from_db(db_path) if len(pending) else None
+        for table_name in TABLE_COLUMNS:
+            table_pending = pending[pending['table_name'] == table_name]
+            if table_pending.empty:
+                continue
+            df = _read_partitions(conn, table_name, table_pending)
+            backfilled = _find_backfills(table_pending, df)
+            if backfilled.any():
+                pending.loc[table_pending.index[backfilled], 'since'] = None
+                df = _read_partitions(conn, table_name, pending.loc[table_pending.index])
+            if df.empty:
+                continue
+            df.insert(0, 'table_name', table_name)
+            if table_name == "stock_company_price_daily":
+                df = with_action_ratios(df, action_ratios(conn))
+            sessions = calendar.sessions(df['date_key'].min(), df['date_key'].max())
+            findings.append(check_rows(df, sessions.values.astype('datetime64[D]'), table_name))
+            rows += len(df)
+
+        parity_keys = []
+        if data_dir is not None:
+            scanned_at = int(datetime.now().timestamp())
+            row = conn.execute("SELECT value FROM db_meta WHERE key = 'validation_csv_mtime'").fetchone()
+            folders = csv_folders(data_dir)
+            changed = set(pending[KEYS].itertuples(index=False, name=None))
+            folders = {key: paths for key, paths in folders.items()
+                       if row is None or key in changed or max(map(os.path.getmtime, paths)) > row[0]}
+            if folders:
+                csv = csv_counts(folders)
+                # Every stored instrument of the rescanned indices is compared too, so rows
+                # that vanished from the CSVs (or moved to another symbol) are reported.
+                indices = sorted({key[:2] for key in folders})
+                stored = conn.execute(f"""
+                    SELECT table_name, index_name, CH_SYMBOL FROM data_summary
+                    WHERE (table_name, index_name) IN (VALUES {', '.join(['(?, ?)'] * len(indices))})
+                """, [value for key in indices for value in key]).fetchall()
+                parity_keys = sorted(set(csv[KEYS].itertuples(index=False, name=None)) | set(stored))
+                findings.append(check_parity(conn, parity_keys, csv))
+
+        findings = pd.concat(findings, ignore_index=True)
+        _write(conn, pending, findings, parity_keys)
+        if data_dir is not None:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO db_meta (key, value) VALUES ('validation_csv_mtime', ?)", (scanned_at,))
+
+        per_check = findings['check_name'].value_counts().reindex(list(CHECKS), fill_value=0).astype(int).to_dict()
+        summary = ", ".join(f"{count} {check}" for check, count in per_check.items() if count) or "no findings"
+        print(f"Validated {len(pending)} instruments ({rows} rows) in {datetime.now() - start_time}: {summary}.")
+        return {"instruments": len(pending), "rows": rows, "findings": per_check}
+
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        print(f"Database error while validating prices: {e}")
+        return {"instruments": 0, "rows": 0, "findings": {}}
+    finally:
+        if conn:
+            conn.close()
+
+
+def print_findings(db_path=DB_PATH, check_name=None, limit=50):
+    """Prints finding counts per check and table, then the most recent findings."""
+    conn = None
+    try:
+        conn = connect(db_path)
+        conn.execute(FINDINGS_TABLE_DDL)
+        where, params = ("WHERE check_name = ?", (check_name,)) if check_name else ("", ())
+        counts = pd.read_sql_query(f"""
+            SELECT check_name, table_name, COUNT(*) AS findings, COUNT(DISTINCT index_name || CH_SYMBOL) AS instruments
+            FROM validation_findings {where} GROUP BY check_name, table_name ORDER BY check_name, table_name
+        """, conn, params=params)
+        if counts.empty:
+            print("No findings.")
+            return
+        print(counts.to_string(index=False))
+        latest = pd.read_sql_query(f"""
+            SELECT date_key, check_name, index_name, CH_SYMBOL, value, detail
+            FROM validation_findings {where} ORDER BY date_key DESC LIMIT ?
+        """, conn, params=params + (limit,))
+        print()
+        print(latest.to_string(index=False))
+    except (sqlite3.Error, pd.errors.DatabaseError) as e:
+        print(f"Database error while reading findings: {e}")
+    finally:
+        if conn:
+            conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate stored prices and record data-quality findings.")
+    parser.add_argument("--db", type=str, default=DB_PATH, help="Path to the SQLite database.")
+    parser.add_argument("--data-dir", type=str, help="Also compare per-year row counts with this CSV tree (e.g. data).")
+    parser.add_argument("--rebuild", action="store_true", help="Forget previous findings and validate everything.")
+    parser.add_argument("--show", action="store_true", help="Print the recorded findings instead of validating.")
+    parser.add_argument("--check", type=str, choices=CHECKS, help="With --show, only this check.")
+    args = parser.parse_args()
+
+    if args.show:
+        print_findings(args.db, args.check)
+    else:
+        validate(args.db, args.data_dir, args.rebuild)
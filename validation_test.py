@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+
+from bulk_load import load_directory
+from db_writer import BulkWriter, connect, company_rows, corporate_action_rows
+from validation import validate
+
+# HDFCBANK around its 1:2 split, as the equity API returned it: the ex-date row carries
+# the action in CA but reports the unadjusted 2187.75 as its previous close.
+HDFCBANK_SPLIT = "[{'symbol': 'HDFCBANK', 'series': 'EQ', 'faceVal': '1', " \
+    "'subject': ' Face Value Split (Sub-Division) - From Rs 2 Per Share To Rs 1 Per Share', 'exDate': '19-Sep-2019'}]"
+HDFCBANK_ROWS = [
+    # date, previous close, open, high, low, close, volume, CA
+    ('2019-09-17', 2244.15, 2247.9, 2248.5, 2198.1, 2211.35, 2664139, None),
+    ('2019-09-18', 2211.35, 2217.3, 2224.15, 2180.0, 2187.75, 3239971, None),
+    ('2019-09-19', 2187.75, 1099.9, 1107.05, 1084.0, 1101.05, 5311655, HDFCBANK_SPLIT),
+    ('2019-09-20', 1101.05, 1108.0, 1209.9, 1105.4, 1199.6, 23075017, None),
+]
+
+
+def hdfcbank_records():
+    return [{'CH_SYMBOL': 'HDFCBANK', 'CH_SERIES': 'EQ', 'CH_TIMESTAMP': day, 'CH_PREVIOUS_CLS_PRICE': prev,
+             'CH_OPENING_PRICE': open_, 'CH_TRADE_HIGH_PRICE': high, 'CH_TRADE_LOW_PRICE': low,
+             'CH_CLOSING_PRICE': close, 'CH_TOT_TRADED_QTY': volume, 'CA': ca}
+            for day, prev, open_, high, low, close, volume, ca in HDFCBANK_ROWS]
+
+
+def findings(db_path, check_name):
+    conn = connect(db_path)
+    try:
+        return conn.execute("SELECT CH_SYMBOL, date_key FROM validation_findings WHERE check_name = ?",
+                            (check_name,)).fetchall()
+    finally:
+        conn.close()
+
+
+def test_unrestated_split_is_not_an_outlier(tmp_path):
+    db_path = str(tmp_path / "stock.db")
+    records = hdfcbank_records()
+    with BulkWriter(db_path) as writer:
+        writer.stage_company_rows(company_rows(records, 'NIFTY FINANCIAL SERVICES'))
+    validate(db_path)
+    # Without the corporate action the -50% day is an outlier (and the next +9% is not).
+    assert findings(db_path, "outlier_return") == [('HDFCBANK', '2019-09-19')]
+
+    with BulkWriter(db_path) as writer:
+        writer.record_corporate_actions(corporate_action_rows(records))
+    validate(db_path, rebuild=True)
+    assert findings(db_path, "outlier_return") == []
+    assert findings(db_path, "prev_close_mismatch") == []
+
+
+def test_csv_parity_counts_rows_under_the_symbol_inside_the_files(tmp_path):
+    # A renamed symbol: the TMPV folder holds TATAMOTORS history and then TMPV rows.
+    folder = tmp_path / "data" / "NIFTY_AUTO" / "TMPV"
+    os.makedirs(folder)
+    days = pd.bdate_range("2025-10-06", "2025-10-17").strftime("%Y-%m-%d")
+    pd.DataFrame({
+        'CH_SYMBOL': ['TATAMOTORS'] * 6 + ['TMPV'] * 4, 'CH_SERIES': 'EQ', 'CH_TIMESTAMP': days,
+        'CH_PREVIOUS_CLS_PRICE': 400.0, 'CH_OPENING_PRICE': 400.0, 'CH_TRADE_HIGH_PRICE': 400.0,
+        'CH_TRADE_LOW_PRICE': 400.0, 'CH_CLOSING_PRICE': 400.0, 'CH_TOT_TRADED_QTY': 10,
+    }).to_csv(folder / "TMPV_01-01-2025_to_31-12-2025.csv", index=False)
+
+    db_path = str(tmp_path / "stock.db")
+    load_directory(str(tmp_path / "data"), db_path, workers=1)
+    validate(db_path, data_dir=str(tmp_path / "data"))
+    assert findings(db_path, "csv_parity") == []
+
+    os.remove(folder / "TMPV_01-01-2025_to_31-12-2025.csv")
+    pd.DataFrame({'CH_SYMBOL': ['TMPV'] * 3, 'CH_TIMESTAMP': days[-3:]}).to_csv(folder / "TMPV_2025.csv", index=False)
+    validate(db_path, data_dir=str(tmp_path / "data"))
+    assert sorted(findings(db_path, "csv_parity")) == [('TATAMOTORS', '2025'), ('TMPV', '2025')]